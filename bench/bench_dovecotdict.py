@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+#
+# Fuzz test and benchmark of the dovecot dict framing (FLSUnixAuthHandler):
+# the traffic (a capture of what dovecot sent, or generated lookups) is
+# split at random points and has to give the same requests and replies in
+# order (iterations are streamed in chunks). Afterwards it is replayed over
+# one and several connections, sequential and with a pool; the requests
+# take LATENCY seconds (database).
+#
+#   bench_dovecotdict.py [capture file]
+import os, os.path, sys
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'flscp'))
+import dovecotdict
+
+LOOKUPS = 2000
+FUZZ_ROUNDS = 200
+CONNECTIONS = 8
+POOL = 8
+LATENCY = 0.001
+# users of an iteration (I line) and lines per chunk
+ITERATE_USERS = 2500
+ITERATE_CHUNK = 1000
+
+def generateTraffic(count):
+	rnd = random.Random(1)
+	lines = ['H2\t1\t0\t\tflscp']
+	for i in range(count):
+		user = 'user%05i@example.org' % (i,)
+		if i % 500 == 250:
+			# doveadm -A
+			lines.append('I0\t0\tshared/userdb/')
+		elif rnd.random() < 0.5:
+			lines.append('Lshared/userdb/%s' % (user,))
+		else:
+			# passdb lookups with a client certificate are long.
+			cert = 'valid' if rnd.random() < 0.8 else 'x' * rnd.randint(2000, 8000)
+			lines.append('Lshared/passdb/%s/secret%i/PLAIN/%s' % (user, i, cert))
+
+	return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def iterate(count):
+	for start in range(0, count, ITERATE_CHUNK):
+		yield ['Oshared/userdb/user%05i@example.org\t' % (i,) for i in range(start, min(start + ITERATE_CHUNK, count))]
+	yield ['']
+
+def handler(line, latency = 0):
+	if line[:1] == 'H':
+		return None
+	if latency > 0:
+		time.sleep(latency * random.random() * 2)
+	if line[:1] == 'I':
+		return iterate(ITERATE_USERS)
+
+	return 'O%s' % (line[1:60],)
+
+def expectedReplies(data):
+	replies = []
+	for f in data.decode('utf-8').split('\n'):
+		reply = handler(f) if len(f) > 0 else None
+		if isinstance(reply, str):
+			replies.append(reply)
+		elif reply is not None:
+			replies.extend(line for chunk in reply for line in chunk)
+
+	return replies
+
+def fuzzReader(data, rounds):
+	rnd = random.Random(2)
+	lines = data.split(b'\n')[:-1]
+	for i in range(rounds):
+		reader = dovecotdict.LineReader()
+		got = []
+		pos = 0
+		while pos < len(data):
+			size = rnd.choice([1, 2, 7, 100, 2048, 65536])
+			got.extend(reader.feed(data[pos:pos + size]))
+			pos += size
+		assert got == lines, 'framing differs in round %i' % (i,)
+		assert reader.buffer == b''
+
+def runSession(data, pool, latency, chunked):
+	(client, server) = socket.socketpair()
+	session = dovecotdict.DictSession(server, lambda line: handler(line, latency), pool)
+
+	def serve():
+		# like socketserver, which closes the request after handle().
+		session.serve()
+		server.shutdown(socket.SHUT_WR)
+
+	t = threading.Thread(target=serve)
+	t.start()
+
+	def send():
+		rnd = random.Random(3)
+		pos = 0
+		while pos < len(data):
+			size = rnd.randint(1, 4096) if chunked else len(data)
+			client.sendall(data[pos:pos + size])
+			pos += size
+		client.shutdown(socket.SHUT_WR)
+
+	sender = threading.Thread(target=send)
+	sender.start()
+	received = []
+	while True:
+		buf = client.recv(65536)
+		if not buf:
+			break
+		received.append(buf)
+	sender.join()
+	t.join()
+	client.close()
+	server.close()
+
+	return b''.join(received).decode('utf-8').split('\n')[:-1]
+
+def replay(data, connections, pool, latency):
+	start = time.time()
+	with ThreadPoolExecutor(max_workers=connections) as executor:
+		list(executor.map(lambda i: runSession(data, pool, latency, False), range(connections)))
+	elapsed = time.time() - start
+	count = connections * len([f for f in data.split(b'\n') if len(f) > 0 and f[:1] != b'H'])
+
+	return (count, elapsed)
+
+def main():
+	if len(sys.argv) > 1:
+		with open(sys.argv[1], 'rb') as f:
+			data = f.read()
+	else:
+		data = generateTraffic(LOOKUPS)
+	expected = expectedReplies(data)
+
+	start = time.time()
+	fuzzReader(data, FUZZ_ROUNDS)
+	print('framing: %i rounds with random splits ok (%.3fs)' % (FUZZ_ROUNDS, time.time() - start))
+
+	pool = ThreadPoolExecutor(max_workers=POOL)
+	for (name, p) in [('sequential', None), ('pool', pool)]:
+		assert runSession(data, p, 0, True) == expected, '%s: replies differ' % (name,)
+	print('pipelined replies in order: ok (sequential and pool)')
+
+	for connections in (1, CONNECTIONS):
+		for (name, p) in [('sequential', None), ('pool of %i' % (POOL,), pool)]:
+			(count, elapsed) = replay(data, connections, p, LATENCY)
+			print('%-12s %i requests over %i connection(s): %.3fs (%.0f requests/s)' % (
+				name, count, connections, elapsed, count / elapsed
+			))
+	pool.shutdown()
+
+if __name__ == '__main__':
+	main()
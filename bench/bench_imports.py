@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+#
+# Import time of the client (flscp.py) and the server (flscpserver.py):
+# the module level imports of each entry point are run in a fresh
+# interpreter (the scripts itself read their config when imported). For
+# the client all loaded server-only modules are listed.
+import os, os.path, sys
+import ast
+import json
+import subprocess
+
+SRCDIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'flscp')
+ENTRIES = [('client', 'flscp.py'), ('server', 'flscpserver.py')]
+RUNS = 5
+# modules the client must not load
+SERVER_ONLY = [
+	'database', 'mysql.connector', 'bsddb3', 'saltencryption', 'mailer', 'pwgen', 'tools', 'OpenSSL', 'bcrypt',
+	'modules.mailstore', 'modules.domainstore', 'modules.dnsstore'
+]
+
+RUNNER = '''
+import sys, time, json
+sys.path.insert(0, %r)
+failed = []
+start = time.perf_counter()
+for stmt in %r:
+	try:
+		exec(stmt, {})
+	except ImportError as e:
+		failed.append(str(e))
+print(json.dumps({'time': time.perf_counter() - start, 'modules': sorted(sys.modules), 'failed': failed}))
+'''
+
+def getImports(path):
+	with open(path, 'r', encoding='utf-8') as f:
+		src = f.read()
+
+	stmts = []
+	for node in ast.parse(src).body:
+		if isinstance(node, (ast.Import, ast.ImportFrom)):
+			stmts.append(ast.get_source_segment(src, node))
+		elif isinstance(node, ast.Try):
+			stmts.extend(ast.get_source_segment(src, f) for f in node.body if isinstance(f, (ast.Import, ast.ImportFrom)))
+
+	return stmts
+
+def measure(stmts):
+	result = None
+	for i in range(RUNS):
+		out = subprocess.check_output([sys.executable, '-c', RUNNER % (SRCDIR, stmts)], cwd=SRCDIR)
+		# the modules may print warnings (e.g. database.py).
+		data = json.loads(out.decode('utf-8').strip().split('\n')[-1])
+		if result is None or data['time'] < result['time']:
+			result = data
+
+	return result
+
+def main():
+	for (name, script) in ENTRIES:
+		result = measure(getImports(os.path.join(SRCDIR, script)))
+		print('%s (%s): %.3fs (best of %i), %i modules' % (name, script, result['time'], RUNS, len(result['modules'])))
+		for f in sorted(set(result['failed'])):
+			print('\tnot importable here (%ix): %s' % (result['failed'].count(f), f))
+		if name == 'client':
+			loaded = [f for f in SERVER_ONLY if f in result['modules']]
+			print('\tserver-only modules loaded: %s' % (', '.join(loaded) if len(loaded) > 0 else 'none',))
+
+if __name__ == '__main__':
+	main()
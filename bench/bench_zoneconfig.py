@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+#
+# Benchmark of the named.conf.flscp handling with 10k zones:
+# one batch of domain changes written with ZoneConfig compared to the old
+# read / scan / rewrite per domain.
+import os, os.path, sys
+import tempfile
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'flscp'))
+from bindconfig import ZoneConfig
+
+ZONES = 10000
+BATCH = 200
+
+def oldAdd(path, fqdn, zoneFile):
+	with open(path, 'rb') as f:
+		content = f.read().decode('utf-8').replace('\r\n', '\n').split('\n')
+	pattern = '// dmn [%s] cfg entry BEGIN.' % (fqdn,)
+	if not any(pattern in f for f in content):
+		content.extend(['\n', pattern, 'zone "%s" {' % (fqdn,), '\ttype master;', '\tfile "%s";' % (zoneFile,),
+			'\tnotify YES;', '};', '// dmn [%s] cfg entry END.' % (fqdn,)])
+		with open(path, 'wb') as f:
+			f.write('\n'.join(content).encode('utf-8'))
+
+def main():
+	tmpDir = tempfile.mkdtemp()
+	path = os.path.join(tmpDir, 'named.conf.flscp')
+	cfg = ZoneConfig(path)
+	for i in range(ZONES):
+		cfg.add('zone%05i.example.org' % (i,), '/var/cache/bind/zone%05i.example.org.db' % (i,))
+	cfg.save()
+
+	cfg = ZoneConfig(path)
+	start = time.time()
+	cfg.load()
+	print('parse %i zones: %.3fs' % (len(cfg), time.time() - start))
+
+	start = time.time()
+	for i in range(BATCH):
+		cfg.remove('zone%05i.example.org' % (i * 7,))
+		cfg.add('new%05i.example.org' % (i,), '/var/cache/bind/new%05i.example.org.db' % (i,))
+	cfg.save()
+	print('batch of %i removes + %i adds (one rewrite): %.3fs' % (BATCH, BATCH, time.time() - start))
+
+	start = time.time()
+	for i in range(BATCH):
+		oldAdd(path, 'old%05i.example.org' % (i,), '/var/cache/bind/old%05i.example.org.db' % (i,))
+	print('%i adds with a rewrite per domain (previous behaviour): %.3fs' % (BATCH, time.time() - start))
+
+if __name__ == '__main__':
+	main()
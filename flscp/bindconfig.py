@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import os, os.path
+import re
+import ipaddress
+import time
+import shlex
+import hashlib
+import logging
+import threading
+from tools import runCommand
+
+MARKER = re.compile(r'// dmn \[(.+?)\] cfg entry (BEGIN|END)\.')
+LABEL = re.compile(r'^(\*|[A-Za-z0-9_]([A-Za-z0-9_-]{0,61}[A-Za-z0-9_])?)$')
+TTL = re.compile(r'^([0-9]+[smhdwSMHDW]?)+$')
+RECORD_TYPES = ['A', 'AAAA', 'CNAME', 'MX', 'NS', 'SOA', 'SPF', 'SRV', 'TXT']
+
+class ZoneConfig:
+	"""
+	Index of the zone stanzas in named.conf.flscp. Every stanza is enclosed
+	by "// dmn [<fqdn>] cfg entry BEGIN." and "... END.". Changes are
+	collected per request in a `ZoneChanges` (see `begin`) and written with
+	one atomic rewrite.
+	"""
+	__instances = {}
+	__lock = threading.Lock()
+
+	def __init__(self, path):
+		self.path = path
+		self.log = logging.getLogger('flscp')
+		self.lock = threading.RLock()
+		self.key = None
+		self.lines = []
+		# fqdn -> (first line, last line)
+		self.zones = {}
+
+	@staticmethod
+	def getInstance(path):
+		with ZoneConfig.__lock:
+			if path not in ZoneConfig.__instances:
+				ZoneConfig.__instances[path] = ZoneConfig(path)
+
+			return ZoneConfig.__instances[path]
+
+	def begin(self):
+		return ZoneChanges(self)
+
+	def getKey(self):
+		try:
+			st = os.stat(self.path)
+		except OSError:
+			return None
+
+		return (st.st_mtime, st.st_size, st.st_ino)
+
+	def load(self):
+		"""
+		(Re-)reads the file if it changed since the last parse.
+		"""
+		with self.lock:
+			key = self.getKey()
+			if key is not None and key == self.key:
+				return
+
+			content = ''
+			if key is not None:
+				with open(self.path, 'rb') as f:
+					content = f.read().decode('utf-8').replace('\r\n', '\n')
+
+			self.parse(content)
+			self.key = key
+
+	def parse(self, content):
+		self.lines = content.split('\n') if len(content) > 0 else []
+		self.zones = {}
+		begin = {}
+		for (nr, line) in enumerate(self.lines):
+			m = MARKER.search(line)
+			if m is None:
+				continue
+			if m.group(2) == 'BEGIN':
+				begin[m.group(1)] = nr
+			elif m.group(1) in begin:
+				self.zones[m.group(1)] = (begin.pop(m.group(1)), nr)
+
+		for fqdn in begin:
+			self.log.warning('Zone entry of %s in %s is not terminated!' % (fqdn, self.path))
+
+	def __contains__(self, fqdn):
+		with self.lock:
+			self.load()
+			return fqdn in self.zones
+
+	def __len__(self):
+		with self.lock:
+			self.load()
+			return len(self.zones)
+
+	def generateEntry(self, fqdn, zoneFile):
+		return [
+			'',
+			'// dmn [%s] cfg entry BEGIN.' % (fqdn,),
+			'zone "%s" {' % (fqdn,),
+			'\ttype master;',
+			'\tfile "%s";' % (zoneFile,),
+			'\tnotify YES;',
+			'};',
+			'// dmn [%s] cfg entry END.' % (fqdn,)
+		]
+
+	def apply(self, added, removed):
+		"""
+		Writes the given changes (fqdn -> zone file, set of fqdn) with one
+		write. Entries which are already added / removed are skipped. Returns
+		False if the file could not be written.
+		"""
+		with self.lock:
+			# the file could be changed by someone else in the meantime.
+			self.load()
+			added = dict((fqdn, zoneFile) for (fqdn, zoneFile) in added.items() if fqdn not in self.zones or fqdn in removed)
+			removed = set(fqdn for fqdn in removed if fqdn in self.zones)
+			if len(added) <= 0 and len(removed) <= 0:
+				return True
+
+			skip = set()
+			for fqdn in removed:
+				(start, end) = self.zones[fqdn]
+				# the empty line in front of the entry belongs to it.
+				if start > 0 and len(self.lines[start - 1].strip()) <= 0:
+					start -= 1
+				skip.update(range(start, end + 1))
+
+			lines = [line for (nr, line) in enumerate(self.lines) if nr not in skip]
+			for (fqdn, zoneFile) in added.items():
+				lines.extend(self.generateEntry(fqdn, zoneFile))
+
+			content = '\n'.join(lines)
+			tmpPath = '%s.tmp' % (self.path,)
+			try:
+				with open(tmpPath, 'wb') as f:
+					f.write(content.encode('utf-8'))
+				if os.path.exists(self.path):
+					st = os.stat(self.path)
+					os.chmod(tmpPath, st.st_mode & 0o7777)
+					try:
+						os.chown(tmpPath, st.st_uid, st.st_gid)
+					except OSError:
+						pass
+				os.replace(tmpPath, self.path)
+			except OSError as e:
+				self.log.error('Could not write the zone configuration file (%s)!' % (e,))
+				return False
+
+			self.parse(content)
+			self.key = self.getKey()
+			return True
+
+class ZoneChanges:
+	"""
+	Pending changes of one request to a `ZoneConfig`. They are only
+	visible to this request and written with `save`; changes which are not
+	saved are simply dropped with the object.
+	"""
+
+	def __init__(self, config):
+		self.config = config
+		self.added = {}
+		self.removed = set()
+
+	def __contains__(self, fqdn):
+		if fqdn in self.added:
+			return True
+		elif fqdn in self.removed:
+			return False
+		else:
+			return fqdn in self.config
+
+	def add(self, fqdn, zoneFile):
+		if fqdn in self:
+			return False
+
+		self.added[fqdn] = zoneFile
+		return True
+
+	def remove(self, fqdn):
+		self.added.pop(fqdn, None)
+		if fqdn in self.config:
+			self.removed.add(fqdn)
+
+	def hasChanges(self):
+		return len(self.added) > 0 or len(self.removed) > 0
+
+	def save(self):
+		"""
+		Applies the pending changes with one write. Returns False if the file
+		could not be written (the changes stay pending in this object).
+		"""
+		if not self.hasChanges():
+			return True
+
+		if not self.config.apply(self.added, self.removed):
+			return False
+
+		self.added = {}
+		self.removed = set()
+		return True
+
+class ZoneFiles:
+	"""
+	Writes zone files only if the rendered content changed. The hashes of
+	the files are kept with their mtime and size, so unchanged zones only
+	cost a stat; files which were deleted or changed outside are read (and
+	written) again.
+	"""
+	__instance = None
+
+	def __init__(self):
+		ZoneFiles.__instance = self
+		self.log = logging.getLogger('flscp')
+		self.lock = threading.Lock()
+		# path -> (mtime, size, sha256 of the content)
+		self.hashes = {}
+
+	@staticmethod
+	def getInstance():
+		if ZoneFiles.__instance is None:
+			ZoneFiles()
+
+		return ZoneFiles.__instance
+
+	def getHash(self, path):
+		try:
+			st = os.stat(path)
+		except OSError:
+			self.forget(path)
+			return None
+
+		with self.lock:
+			cached = self.hashes.get(path)
+			if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+				return cached[2]
+
+		try:
+			with open(path, 'rb') as f:
+				digest = hashlib.sha256(f.read()).hexdigest()
+		except OSError:
+			self.forget(path)
+			return None
+
+		with self.lock:
+			self.hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+
+		return digest
+
+	def write(self, path, content):
+		"""
+		Returns True if the file was written, False if it is unchanged.
+		Raises OSError if it could not be written.
+		"""
+		data = content.encode('utf-8')
+		digest = hashlib.sha256(data).hexdigest()
+		if self.getHash(path) == digest:
+			return False
+
+		tmpPath = '%s.tmp' % (path,)
+		with open(tmpPath, 'wb') as f:
+			f.write(data)
+		os.replace(tmpPath, path)
+
+		st = os.stat(path)
+		with self.lock:
+			self.hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+
+		return True
+
+	def forget(self, path):
+		with self.lock:
+			self.hashes.pop(path, None)
+
+class DnsReloader:
+	"""
+	Collects the zones which have to be reloaded and reloads them after a
+	short delay, so rapid saves result in one reload per zone. The zone
+	command gets the zone as "{zone}". Without it, the whole dns service is
+	reloaded once.
+	"""
+	__instance = None
+
+	def __init__(self, reloadCmd, zoneCmd = None, reconfigCmd = None, delay = 2):
+		DnsReloader.__instance = self
+		self.log = logging.getLogger('flscp')
+		self.lock = threading.Lock()
+		self.reloadCmd = reloadCmd
+		self.zoneCmd = zoneCmd
+		self.reconfigCmd = reconfigCmd
+		self.delay = delay
+		# a reload is postponed at most this time
+		self.maxDelay = delay * 5
+		self.zones = set()
+		self.reconfig = False
+		self.timer = None
+		self.firstScheduled = None
+
+	@staticmethod
+	def getInstance():
+		return DnsReloader.__instance
+
+	def schedule(self, zones = (), reconfig = False):
+		with self.lock:
+			self.zones.update(zones)
+			self.reconfig = self.reconfig or reconfig
+			if len(self.zones) <= 0 and not self.reconfig:
+				return
+
+			now = time.time()
+			if self.firstScheduled is None:
+				self.firstScheduled = now
+			elif now - self.firstScheduled >= self.maxDelay and self.timer is not None:
+				# do not postpone any longer.
+				return
+
+			if self.timer is not None:
+				self.timer.cancel()
+			self.timer = threading.Timer(self.delay, self.flush)
+			self.timer.daemon = True
+			self.timer.start()
+
+	def flush(self):
+		with self.lock:
+			zones = sorted(self.zones)
+			reconfig = self.reconfig
+			self.zones = set()
+			self.reconfig = False
+			self.timer = None
+			self.firstScheduled = None
+
+		if len(zones) <= 0 and not reconfig:
+			return True
+
+		state = True
+		try:
+			if self.zoneCmd is None or (reconfig and self.reconfigCmd is None):
+				state = runCommand(self.reloadCmd)
+				self.log.info('DNS-Service reloaded (%i zones changed)' % (len(zones),))
+			else:
+				if reconfig:
+					state = runCommand(self.reconfigCmd)
+					self.log.info('DNS-Service configuration reloaded')
+				for zone in zones:
+					state = runCommand(self.zoneCmd.format(zone = shlex.quote(zone))) and state
+				if len(zones) > 0:
+					self.log.info('Reloaded DNS zones: %s' % (', '.join(zones),))
+		except Exception as e:
+			self.log.critical('Could not reload the DNS-Service because of %s!' % (str(e),))
+			state = False
+
+		return state
+
+def tokenizeZone(content):
+	"""
+	Splits a zone file into records: yields (line number, starts with
+	blank, tokens). Comments are removed and records in parentheses are
+	joined. Quoted strings keep their quotes.
+	"""
+	record = []
+	recordLine = 0
+	blank = False
+	depth = 0
+	for (nr, line) in enumerate(content.split('\n'), 1):
+		if depth == 0:
+			record = []
+			recordLine = nr
+			blank = len(line) > 0 and line[0] in ' \t'
+
+		i = 0
+		while i < len(line):
+			c = line[i]
+			if c == ';':
+				break
+			elif c in ' \t\r':
+				i += 1
+			elif c == '(':
+				depth += 1
+				i += 1
+			elif c == ')':
+				depth -= 1
+				if depth < 0:
+					raise ValueError('%i: unexpected ")"' % (nr,))
+				i += 1
+			elif c == '"':
+				end = i + 1
+				while end < len(line) and line[end] != '"':
+					end += 2 if line[end] == '\\' else 1
+				if end >= len(line):
+					raise ValueError('%i: unterminated string' % (nr,))
+				record.append(line[i:end + 1])
+				i = end + 1
+			else:
+				end = i
+				while end < len(line) and line[end] not in ' \t\r;()"':
+					end += 1
+				record.append(line[i:end])
+				i = end
+
+		if depth == 0 and len(record) > 0:
+			yield (recordLine, blank, record)
+
+	if depth > 0:
+		raise ValueError('%i: missing ")"' % (recordLine,))
+
+def checkName(name, origin):
+	"""
+	Returns the absolute name (lower case, with trailing dot) or raises
+	ValueError.
+	"""
+	if name == '@':
+		if origin is None:
+			raise ValueError('"@" without $ORIGIN')
+		return origin
+
+	if not name.endswith('.'):
+		if origin is None:
+			raise ValueError('relative name "%s" without $ORIGIN' % (name,))
+		name = '%s.%s' % (name, origin) if origin != '.' else '%s.' % (name,)
+
+	if name == '.':
+		return name
+
+	if len(name) > 254:
+		raise ValueError('name "%s" is too long' % (name,))
+
+	for label in name[:-1].split('.'):
+		if LABEL.match(label) is None:
+			raise ValueError('invalid label "%s" in "%s"' % (label, name))
+
+	return name.lower()
+
+def checkInt(value, maximum):
+	if not value.isdigit() or int(value) > maximum:
+		raise ValueError('"%s" is not a number between 0 and %i' % (value, maximum))
+
+def checkTtl(value):
+	if TTL.match(value) is None:
+		raise ValueError('invalid ttl "%s"' % (value,))
+
+def checkZone(content, zone = None):
+	"""
+	Syntax check of a zone file (the subset of RFC 1035 which is used
+	here). Returns a list of error messages ("<line>: <message>"); an
+	empty list means the zone is valid.
+	"""
+	errors = []
+	origin = None
+	owner = None
+	apex = checkName(zone if zone.endswith('.') else zone + '.', None) if zone is not None else None
+	soaCount = 0
+	nsCount = 0
+	# owner -> set of types
+	owners = {}
+	try:
+		records = list(tokenizeZone(content))
+	except ValueError as e:
+		return [str(e)]
+
+	for (nr, blank, tokens) in records:
+		try:
+			if tokens[0] == '$ORIGIN':
+				if len(tokens) != 2 or not tokens[1].endswith('.'):
+					raise ValueError('$ORIGIN needs an absolute name')
+				origin = checkName(tokens[1], None)
+				continue
+			elif tokens[0] == '$TTL':
+				if len(tokens) != 2:
+					raise ValueError('$TTL needs one value')
+				checkTtl(tokens[1])
+				continue
+			elif tokens[0].startswith('$'):
+				raise ValueError('unsupported directive %s' % (tokens[0],))
+
+			if not blank:
+				owner = checkName(tokens[0], origin)
+				tokens = tokens[1:]
+			elif owner is None:
+				raise ValueError('record without owner')
+
+			# optional ttl and class in any order
+			while len(tokens) > 0 and tokens[0].upper() not in RECORD_TYPES:
+				if tokens[0].upper() != 'IN':
+					checkTtl(tokens[0])
+				tokens = tokens[1:]
+			if len(tokens) <= 0:
+				raise ValueError('missing record type')
+
+			rtype = tokens[0].upper()
+			rdata = tokens[1:]
+			if rtype == 'SOA':
+				if len(rdata) != 7:
+					raise ValueError('SOA needs 7 values, got %i' % (len(rdata),))
+				soaCount += 1
+				if soaCount > 1:
+					raise ValueError('more than one SOA record')
+				if len(owners) > 0:
+					raise ValueError('SOA has to be the first record')
+				if apex is None:
+					apex = owner
+				elif owner != apex:
+					raise ValueError('SOA owner %s does not match zone %s' % (owner, apex))
+				checkName(rdata[0], origin)
+				checkName(rdata[1], origin)
+				checkInt(rdata[2], 4294967295)
+				for f in rdata[3:]:
+					checkTtl(f)
+			elif soaCount <= 0:
+				raise ValueError('%s record before the SOA record' % (rtype,))
+			elif rtype == 'A':
+				if len(rdata) != 1:
+					raise ValueError('A needs one address')
+				ipaddress.IPv4Address(rdata[0])
+			elif rtype == 'AAAA':
+				if len(rdata) != 1:
+					raise ValueError('AAAA needs one address')
+				ipaddress.IPv6Address(rdata[0])
+			elif rtype in ['NS', 'CNAME']:
+				if len(rdata) != 1:
+					raise ValueError('%s needs one name' % (rtype,))
+				checkName(rdata[0], origin)
+				if rtype == 'NS' and owner == apex:
+					nsCount += 1
+			elif rtype == 'MX':
+				if len(rdata) != 2:
+					raise ValueError('MX needs a priority and a name')
+				checkInt(rdata[0], 65535)
+				checkName(rdata[1], origin)
+			elif rtype == 'SRV':
+				if len(rdata) != 4:
+					raise ValueError('SRV needs priority, weight, port and target')
+				for f in rdata[:3]:
+					checkInt(f, 65535)
+				checkName(rdata[3], origin)
+			elif rtype in ['TXT', 'SPF']:
+				if len(rdata) <= 0:
+					raise ValueError('%s needs a value' % (rtype,))
+				for f in rdata:
+					if len(f.strip('"')) > 255:
+						raise ValueError('%s strings are limited to 255 characters' % (rtype,))
+
+			if apex is not None and owner != apex and not owner.endswith('.' + apex):
+				raise ValueError('%s is out of zone %s' % (owner, apex))
+
+			types = owners.setdefault(owner, set())
+			if (rtype == 'CNAME' and len(types) > 0) or 'CNAME' in types:
+				raise ValueError('CNAME and other data at %s' % (owner,))
+			types.add(rtype)
+		except ValueError as e:
+			errors.append('%i: %s' % (nr, e))
+
+	if soaCount <= 0:
+		errors.append('missing SOA record')
+	if nsCount <= 0:
+		errors.append('missing NS record at the zone apex')
+
+	return errors
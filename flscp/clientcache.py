@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import os, os.path, re
+import sqlite3
+import pickle
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class ClientCache:
+	"""
+	The last synced lists of one server (mails, domains, dns entries,
+	certificates) with their revision - the client shows them at start
+	and only loads the changes. Every list is a dataset of rows (id ->
+	dict as sent by the server). All writes are done by one thread in the
+	order they were requested.
+	"""
+	__instance = None
+
+	def __init__(self, cacheDir):
+		ClientCache.__instance = self
+		self.log = logging.getLogger()
+		self.cacheDir = cacheDir
+		self.lock = threading.Lock()
+		self.executor = ThreadPoolExecutor(max_workers=1)
+		self.path = None
+		self.host = None
+
+	@staticmethod
+	def getInstance():
+		if ClientCache.__instance is None:
+			ClientCache(os.path.expanduser('~/.config/flscp/cache'))
+
+		return ClientCache.__instance
+
+	def getPath(self, host):
+		return os.path.join(self.cacheDir, '%s.sqlite' % (re.sub(r'[^A-Za-z0-9_.-]', '_', host),))
+
+	def connect(self):
+		db = sqlite3.connect(self.path, timeout=30)
+		db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+		db.execute('CREATE TABLE IF NOT EXISTS dataset (name TEXT PRIMARY KEY, revision TEXT)')
+		db.execute(
+			'CREATE TABLE IF NOT EXISTS item (dataset TEXT, id INTEGER, data BLOB, PRIMARY KEY (dataset, id))'
+		)
+
+		return db
+
+	def open(self, host, address):
+		"""
+		Uses the cache of the given host (name of the config section). The
+		cache is cleared if the address of the host changed.
+		"""
+		self.flush()
+		with self.lock:
+			if not os.path.exists(self.cacheDir):
+				os.makedirs(self.cacheDir, 0o700)
+			self.path = self.getPath(host)
+			self.host = host
+
+		if self.getMeta('address') != address:
+			self.clear()
+			self.setMeta('address', address)
+
+	def close(self):
+		self.flush()
+		with self.lock:
+			self.path = None
+			self.host = None
+
+	def flush(self):
+		# waits for all pending writes.
+		self.executor.submit(lambda: None).result()
+
+	def isOpen(self):
+		return self.path is not None
+
+	def getMeta(self, name):
+		with self.lock:
+			db = self.connect()
+			try:
+				row = db.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+			finally:
+				db.close()
+
+		return row[0] if row is not None else None
+
+	def setMeta(self, name, value):
+		with self.lock:
+			db = self.connect()
+			try:
+				with db:
+					db.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+			finally:
+				db.close()
+
+	def checkVersion(self, version):
+		"""
+		Clears the cache if it was written for another server version.
+		Returns False in this case.
+		"""
+		if self.getMeta('version') == version:
+			return True
+
+		self.flush()
+		self.clear()
+		self.setMeta('version', version)
+		self.log.info('Cleared the local cache (server version %s)' % (version,))
+
+		return False
+
+	def clear(self):
+		with self.lock:
+			db = self.connect()
+			try:
+				with db:
+					db.execute('DELETE FROM item')
+					db.execute('DELETE FROM dataset')
+					db.execute('DELETE FROM meta WHERE name = ?', ('version',))
+			finally:
+				db.close()
+
+	def load(self, name):
+		"""
+		Returns (revision, {id: row}) of the dataset. The revision is None if
+		the dataset is not cached.
+		"""
+		with self.lock:
+			db = self.connect()
+			try:
+				row = db.execute('SELECT revision FROM dataset WHERE name = ?', (name,)).fetchone()
+				if row is None:
+					return (None, {})
+				items = dict(
+					(itemId, pickle.loads(data))
+					for (itemId, data) in db.execute('SELECT id, data FROM item WHERE dataset = ?', (name,))
+				)
+			finally:
+				db.close()
+
+		return (row[0], items)
+
+	def listDatasets(self, prefix):
+		with self.lock:
+			db = self.connect()
+			try:
+				return [
+					f for (f,) in db.execute(
+						'SELECT name FROM dataset WHERE name LIKE ?', (prefix.replace('%', '') + '%',)
+					)
+				]
+			finally:
+				db.close()
+
+	def applyChanges(self, name, changes):
+		"""
+		Writes the changes of get*Since (revision, full, items, deleted) in
+		the background. A revision of None marks the dataset as incomplete.
+		"""
+		if self.path is None:
+			return
+
+		self.executor.submit(self.__apply, self.path, name, changes)
+
+	def __apply(self, path, name, changes):
+		with self.lock:
+			if path != self.path:
+				# host was switched meanwhile.
+				return
+
+			try:
+				db = self.connect()
+				try:
+					with db:
+						if changes['full']:
+							db.execute('DELETE FROM item WHERE dataset = ?', (name,))
+						db.executemany(
+							'INSERT OR REPLACE INTO item (dataset, id, data) VALUES (?, ?, ?)',
+							[(name, f['id'], pickle.dumps(f)) for f in changes['items']]
+						)
+						db.executemany(
+							'DELETE FROM item WHERE dataset = ? AND id = ?',
+							[(name, f) for f in changes['deleted']]
+						)
+						if changes['revision'] is None:
+							db.execute('DELETE FROM dataset WHERE name = ?', (name,))
+						else:
+							db.execute(
+								'INSERT OR REPLACE INTO dataset (name, revision) VALUES (?, ?)',
+								(name, changes['revision'])
+							)
+				finally:
+					db.close()
+			except sqlite3.Error as e:
+				self.log.warning('Could not write dataset %s to the local cache: %s' % (name, e))
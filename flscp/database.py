@@ -8,6 +8,7 @@ except:
 	print('There is no database connection possible (server)')
 
 import logging
+import threading
 from flsconfig import FLSConfig
 try:
 	import bsddb3 as bsddb
@@ -129,20 +130,31 @@ class SaslDatabase(Database):
 		SaslDatabase.__instance = None
 
 class MailDatabase(Database):
-	__instance = None
+	# one connection per thread - the rpc server handles requests in parallel.
+	# Request threads hand their connection back with release().
+	__local = threading.local()
+	# connections of finished requests, which can be reused.
+	__pool = []
+	__poolLock = threading.Lock()
+	POOL_SIZE = 8
 
 	def __init__(self):
 		super().__init__()
-		MailDatabase.__instance = self
+		MailDatabase.__local.instance = self
 		self.conf = FLSConfig.getInstance()
 		self.log = logging.getLogger('flscp')
 
+		with MailDatabase.__poolLock:
+			if len(MailDatabase.__pool) > 0:
+				self.db = MailDatabase.__pool.pop()
+				self.connected = True
+
 	@staticmethod
 	def getInstance():
-		if MailDatabase.__instance is None:
+		if getattr(MailDatabase.__local, 'instance', None) is None:
 			MailDatabase()
 
-		return MailDatabase.__instance
+		return MailDatabase.__local.instance
 
 	def getCursor(self):
 		if not self.connected or not self.db.is_connected():
@@ -164,6 +176,9 @@ class MailDatabase(Database):
 	def commit(self):
 		self.db.commit()
 
+	def rollback(self):
+		self.db.rollback()
+
 	def connect(self):
 		if self.db is not None and self.db.is_connected() and self.connected:
 			return True
@@ -210,6 +225,35 @@ class MailDatabase(Database):
 
 		self.log.info('Disconnected from mysql database!')
 
+	@staticmethod
+	def release():
+		"""
+		Ends the use of the connection of the current thread (at the end of a
+		request): an open transaction is rolled back and the connection is
+		kept for the next request (or closed if enough are kept).
+		"""
+		self = getattr(MailDatabase.__local, 'instance', None)
+		if self is None:
+			return
+
+		MailDatabase.__local.instance = None
+		if self.connected and self.db is not None:
+			try:
+				self.db.rollback()
+			except Exception:
+				pass
+			else:
+				with MailDatabase.__poolLock:
+					if len(MailDatabase.__pool) < MailDatabase.POOL_SIZE:
+						MailDatabase.__pool.append(self.db)
+						self.db = None
+						self.connected = False
+						return
+
+		self.close()
+		self.connected = False
+
 	def __del__(self):
-		super().__del__()
-		MailDatabase.__instance = None
+		# released connections are kept for the next request.
+		if self.connected:
+			self.close()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import logging
+from concurrent.futures import Future
+
+# bytes read from the socket at once
+RECV_SIZE = 64 * 1024
+# longest accepted request line
+MAX_LINE = 1024 * 1024
+
+class LineReader:
+	"""
+	Splits the received data into lines. Incomplete lines are kept until
+	the rest is received.
+	"""
+
+	def __init__(self, maxLine = MAX_LINE):
+		self.maxLine = maxLine
+		self.buffer = b''
+
+	def feed(self, data):
+		"""
+		Returns the complete lines (without newline). Raises ValueError if a
+		line exceeds maxLine.
+		"""
+		self.buffer += data
+		if b'\n' not in data:
+			if len(self.buffer) > self.maxLine:
+				raise ValueError('request line too long (%i bytes)' % (len(self.buffer),))
+			return []
+
+		lines = self.buffer.split(b'\n')
+		self.buffer = lines.pop()
+		if len(self.buffer) > self.maxLine or any(len(f) > self.maxLine for f in lines):
+			raise ValueError('request line too long')
+
+		return lines
+
+class DictSession:
+	"""
+	One connection of the dovecot dict protocol. Every complete request
+	line is passed to handler(line), which returns the reply (without
+	newline), None (e.g. for the hello) or an iterable of chunks (lists of
+	reply lines) which are sent one after another (iterate). Pipelined
+	requests are run in the pool if given; the replies are always sent in
+	the order of the requests. Hello lines are handled in order, because
+	they change the session.
+	"""
+
+	def __init__(self, sock, handler, pool = None):
+		self.sock = sock
+		self.handler = handler
+		self.pool = pool
+		self.log = logging.getLogger('flscp')
+
+	def call(self, line):
+		try:
+			return self.handler(line)
+		except Exception as e:
+			self.log.error('Dict request failed: %s' % (e,))
+			return 'F'
+
+	def serve(self):
+		reader = LineReader()
+		while True:
+			try:
+				data = self.sock.recv(RECV_SIZE)
+			except OSError as e:
+				self.log.debug('Dict connection closed: %s' % (e,))
+				break
+
+			if not data:
+				break
+
+			try:
+				lines = reader.feed(data)
+			except ValueError as e:
+				self.log.warning('Dict connection closed: %s' % (e,))
+				self.sock.sendall(b'F\n')
+				break
+
+			replies = []
+			for raw in lines:
+				try:
+					line = raw.decode('utf-8').rstrip('\r')
+				except UnicodeDecodeError:
+					replies.append('F')
+					continue
+
+				if len(line) <= 0:
+					continue
+				elif self.pool is None or line[:1] == 'H':
+					replies.append(self.call(line))
+				else:
+					replies.append(self.pool.submit(self.call, line))
+
+			out = []
+			for f in replies:
+				reply = f.result() if isinstance(f, Future) else f
+				if reply is None:
+					continue
+				elif isinstance(reply, str):
+					out.append(reply + '\n')
+				else:
+					# the replies before are sent first.
+					self.send(out)
+					out = []
+					self.stream(reply)
+
+			self.send(out)
+
+	def send(self, lines):
+		if len(lines) > 0:
+			self.sock.sendall(''.join(lines).encode('utf-8'))
+
+	def stream(self, chunks):
+		"""
+		Sends the chunks as they are produced; 'F' ends the reply if the
+		iteration fails.
+		"""
+		it = iter(chunks)
+		while True:
+			try:
+				chunk = next(it)
+			except StopIteration:
+				break
+			except Exception as e:
+				self.log.error('Dict iteration failed: %s' % (e,))
+				self.send(['F\n'])
+				break
+
+			self.send([f + '\n' for f in chunk])
@@ -14,29 +14,27 @@ from ui.ui_changelog import Ui_ReSTViewer
 from translator import CPTranslator
 from PyQt5 import QtCore
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, QRunnable, QThreadPool, QObject, QSettings
-from PyQt5.QtGui import QIcon, QPixmap, QColor, QPalette, QBrush, QFont, QTextDocument
+from PyQt5.QtCore import QAbstractTableModel, QSortFilterProxyModel, QModelIndex
+from PyQt5.QtGui import QIcon, QPixmap, QColor, QPalette, QBrush, QFont, QTextDocument, QTextCursor
 from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QWidget, QDialog, QListWidgetItem, QMainWindow, QApplication
 from PyQt5.QtWidgets import QHeaderView, QProgressBar, QLabel, QAction, QMessageBox, QDialogButtonBox
 from PyQt5.QtWidgets import QLineEdit, QInputDialog, QTreeWidget, QFileDialog, QComboBox, QWhatsThis
 from PyQt5.QtWidgets import QVBoxLayout, QAbstractItemView, QTreeWidgetItem
-from Printer import Printer
-import logging, os, sys, copy, xmlrpc.client, http.client, ssl, socket, datetime
-import tempfile, zipfile, base64
+import logging, os, sys, copy, xmlrpc.client, http.client, ssl, socket, datetime, importlib.util
+import tempfile, zipfile, base64, hashlib, threading, weakref, sqlite3
 from flsconfig import FLSConfig, DEFAULT_CLIENT_CONFIGS
 from flssplash import CpSplashScreen
 from modules import flscertification
 from modules.domain import DomainList, Domain
 from modules.dns import DNSList, Dns
 from modules.mail import MailAccountList, MailAccount, MailValidator
-try:
-	import OpenSSL
-except ImportError:
-	pass
+from searchindex import SearchIndex, SearchCancelled
+from clientcache import ClientCache
 
 __author__  = 'Lukas Schreiner'
 __copyright__ = 'Copyright (C) 2013 - 2016 Website-Team Friedrich-List-Schule Wiesbaden'
-__version__ = '0.9'
-__min_server__ = '0.9'
+__version__ = '0.10'
+__min_server__ = '0.10'
 
 FORMAT = '%(asctime)-15s %(levelname)s: %(funcName)s %(message)s'
 formatter = logging.Formatter(FORMAT, datefmt='%b %d %H:%M:%S')
@@ -55,6 +53,22 @@ CERTFILE 		= 'certs/clientCert.pem'
 CACERT 			= 'certs/cacert.pem'
 SETTINGS_ORG 	= 'Friedrich-List-Schule Wiesbaden'
 SETTINGS_APP	= 'FLS Control Panel'
+# log viewer
+LOG_CHUNK_SIZE		= 256 * 1024
+LOG_DIRECTION_HEAD	= 'head'
+LOG_DIRECTION_TAIL	= 'tail'
+# has to be lower than the timeout of the connection
+LOG_FOLLOW_TIMEOUT	= 3
+# update download
+UPDATE_CHUNK_SIZE	= 512 * 1024
+# mails in the first page (start) and in the pages loaded in parallel
+MAIL_PAGE_SIZE		= 1000
+# calls sent with one system.multicall request
+RPC_BATCH_SIZE		= 20
+# mail search: wait for this time (ms) after the last key press
+MAIL_SEARCH_DELAY	= 200
+MAIL_SEARCH_FIELDS	= ['mail', 'alt', 'forward', 'domain', 'type']
+MAIL_SEARCH_ALIASES	= {'address': 'mail', 'fwd': 'forward', 'dom': 'domain', 'typ': 'type'}
 ### CONFIGURE END ###
 cpTranslator = CPTranslator(os.path.join(workDir, 'l18n'))
 
@@ -78,6 +92,31 @@ else:
 def _translate(context, text, disambig = None, param = None):
 	return cpTranslator.pyTranslate(context, text, disambig, param)
 
+def getMailKey(account):
+	# new accounts have no id until they are saved - the rows and the search
+	# index use the object itself.
+	return id(account)
+
+def getDomainKey(domain):
+	# like getMailKey: the items of the domain tree belong to the object.
+	return id(domain)
+
+def getMailSearchDocument(account, typeLabels):
+	# the type is searchable by its name and by the displayed text.
+	return {
+		'mail': [account.getMailAddress()], 'alt': [account.altMail], 'forward': list(account.forward),
+		'domain': [account.domain], 'type': [account.type, typeLabels.get(account.type, '')]
+	}
+
+def getChanges(rpc, name, revision):
+	# get<name>Since - or the full list (get<name>) from servers without
+	# revisions.
+	try:
+		return getattr(rpc, 'get%sSince' % (name,))(revision)
+	except xmlrpc.client.Fault as e:
+		log.info('Server does not support get%sSince (%s)' % (name, e))
+		return {'revision': None, 'full': True, 'items': getattr(rpc, 'get%s' % (name,))(), 'deleted': []}
+
 ###### START LOADER ######
 class DataLoaderObject(QObject):
 	dataLoaded = pyqtSignal(list)
@@ -153,7 +192,7 @@ class LogFileListLoader(DataLoader):
 
 	def runChild(self):
 		try:
-			data = self.rpc.getListOfLogs()
+			data = self.rpc.getLogInventory()
 		except ssl.CertificateError as e:
 			self.certError.emit(e)
 		except socket.error as e:
@@ -167,15 +206,73 @@ class LogFileListLoader(DataLoader):
 
 class LogFileLoader(DataLoader):
 
+	def __init__(self, rpc, fname = None, offset = None, direction = LOG_DIRECTION_TAIL, **kwds):
+		super().__init__(rpc, **kwds)
+		self.fname = fname
+		self.offset = offset
+		self.direction = direction
+
 	def setFile(self, fname):
 		self.fname = fname
 
+	def setRange(self, offset, direction = LOG_DIRECTION_TAIL):
+		self.offset = offset
+		self.direction = direction
+
 	def runChild(self):
 		if not hasattr(self, 'fname') or self.fname is None:
 			return
 
 		try:
-			data = self.rpc.getLogFile(self.fname)
+			# offsets are transferred as string (xml-rpc integers are limited to 32 bit)
+			data = self.rpc.getLogChunk(
+				self.fname, None if self.offset is None else str(self.offset), LOG_CHUNK_SIZE, self.direction
+			)
+		except ssl.CertificateError as e:
+			self.certError.emit(e)
+		except socket.error as e:
+			self.socketError.emit(e)
+		except xmlrpc.client.ProtocolError as e:
+			self.protocolError.emit(e)
+		except Exception as e:
+			self.unknownError.emit(e)
+		else:
+			data['direction'] = self.direction
+			self.dataLoadedDict.emit(data)
+
+class LogFollowLoader(DataLoader):
+
+	def __init__(self, rpc, fname, offset, inode = None, **kwds):
+		super().__init__(rpc, **kwds)
+		self.fname = fname
+		self.offset = offset
+		self.inode = inode
+
+	def runChild(self):
+		try:
+			data = self.rpc.followLog(self.fname, str(self.offset), self.inode, LOG_FOLLOW_TIMEOUT)
+		except ssl.CertificateError as e:
+			self.certError.emit(e)
+		except socket.error as e:
+			self.socketError.emit(e)
+		except xmlrpc.client.ProtocolError as e:
+			self.protocolError.emit(e)
+		except Exception as e:
+			self.unknownError.emit(e)
+		else:
+			self.dataLoadedDict.emit(data)
+
+class LogSearchLoader(DataLoader):
+
+	def __init__(self, rpc, pattern, files = None, options = None, **kwds):
+		super().__init__(rpc, **kwds)
+		self.pattern = pattern
+		self.files = files
+		self.options = options if options is not None else {}
+
+	def runChild(self):
+		try:
+			data = self.rpc.searchLogs(self.pattern, self.files, self.options)
 		except ssl.CertificateError as e:
 			self.certError.emit(e)
 		except socket.error as e:
@@ -185,15 +282,17 @@ class LogFileLoader(DataLoader):
 		except Exception as e:
 			self.unknownError.emit(e)
 		else:
-			for i in range(0, len(data), 4000):
-				self.dataLoaded.emit([data[i:i + 4000]])
-				QtCore.QThread.msleep(50)
+			self.dataLoadedDict.emit(data)
 
 class MailListLoader(DataLoader):
 
+	def __init__(self, rpc, revision = None, **kwds):
+		super().__init__(rpc, **kwds)
+		self.revision = revision
+
 	def runChild(self):
 		try:
-			data = self.rpc.getMails()
+			data = getChanges(self.rpc, 'Mails', self.revision)
 		except ssl.CertificateError as e:
 			self.certError.emit(e)
 		except socket.error as e:
@@ -203,7 +302,50 @@ class MailListLoader(DataLoader):
 		except Exception as e:
 			self.unknownError.emit(e)
 		else:
-			self.dataLoaded.emit(data)
+			self.dataLoadedDict.emit(data)
+
+class BootstrapLoader(DataLoader):
+
+	def __init__(self, rpc, revisions = None, **kwds):
+		super().__init__(rpc, **kwds)
+		self.revisions = revisions
+
+	def runChild(self):
+		try:
+			data = self.rpc.bootstrap(__version__, __min_server__, MAIL_PAGE_SIZE, self.revisions)
+		except ssl.CertificateError as e:
+			self.certError.emit(e)
+		except socket.error as e:
+			self.socketError.emit(e)
+		except xmlrpc.client.ProtocolError as e:
+			self.protocolError.emit(e)
+		except Exception as e:
+			self.unknownError.emit(e)
+		else:
+			self.dataLoadedDict.emit(data)
+
+class MailPageLoader(DataLoader):
+
+	def __init__(self, rpc, after, limit, **kwds):
+		super().__init__(rpc, **kwds)
+		self.after = after
+		self.limit = limit
+
+	def runChild(self):
+		# the page is always reported (items is None on errors) - the main
+		# window waits for all pages.
+		data = None
+		try:
+			data = self.rpc.getMailsPage(self.after, self.limit)
+		except ssl.CertificateError as e:
+			self.certError.emit(e)
+		except socket.error as e:
+			self.socketError.emit(e)
+		except xmlrpc.client.ProtocolError as e:
+			self.protocolError.emit(e)
+		except Exception as e:
+			self.unknownError.emit(e)
+		self.dataLoadedDict.emit({'after': self.after, 'items': data})
 
 class CertListLoader(DataLoader):
 
@@ -223,9 +365,13 @@ class CertListLoader(DataLoader):
 
 class DomainListLoader(DataLoader):
 
+	def __init__(self, rpc, revision = None, **kwds):
+		super().__init__(rpc, **kwds)
+		self.revision = revision
+
 	def runChild(self):
 		try:
-			data = self.rpc.getDomains()
+			data = getChanges(self.rpc, 'Domains', self.revision)
 		except ssl.CertificateError as e:
 			self.certError.emit(e)
 		except socket.error as e:
@@ -235,17 +381,18 @@ class DomainListLoader(DataLoader):
 		except Exception as e:
 			self.unknownError.emit(e)
 		else:
-			self.dataLoaded.emit(data)
+			self.dataLoadedDict.emit(data)
 
 class DnsListLoader(DataLoader):
 
-	def __init__(self, rpc, domainId = None, **kwds):
+	def __init__(self, rpc, domainId = None, revision = None, **kwds):
 		super().__init__(rpc, **kwds)
 		self.domainId = domainId
+		self.revision = revision
 
 	def runChild(self):
 		try:
-			data = self.rpc.getDns(self.domainId)
+			data = self.rpc.getDnsSince(self.domainId, self.revision)
 		except ssl.CertificateError as e:
 			self.certError.emit(e)
 		except socket.error as e:
@@ -257,9 +404,49 @@ class DnsListLoader(DataLoader):
 		else:
 			self.dataLoadedDict.emit({self.domainId: data})
 
+class MailIndexLoader(DataLoader):
+
+	def __init__(self, accounts, typeLabels, generation, **kwds):
+		super().__init__(None, **kwds)
+		self.accounts = accounts
+		self.typeLabels = typeLabels
+		self.generation = generation
+
+	def runChild(self):
+		index = SearchIndex(MAIL_SEARCH_FIELDS, MAIL_SEARCH_ALIASES)
+		for account in self.accounts:
+			index.add(getMailKey(account), getMailSearchDocument(account, self.typeLabels))
+
+		self.dataLoadedDict.emit({'index': index, 'generation': self.generation})
+
+class MailSearchLoader(DataLoader):
+
+	def __init__(self, index, query, seq, cancelled, **kwds):
+		super().__init__(None, **kwds)
+		self.index = index
+		self.query = query
+		self.seq = seq
+		# threading.Event - set if a newer query was started
+		self.cancelled = cancelled
+
+	def runChild(self):
+		try:
+			ids = self.index.search(self.query, self.cancelled.is_set)
+		except SearchCancelled:
+			return
+
+		if not self.cancelled.is_set():
+			self.dataLoadedDict.emit({'seq': self.seq, 'ids': ids})
+
 ###### END LOADER ######
 
 ###### START NOTIFIER ######
+class ListChangeNotifier(QtCore.QObject):
+	# Emitted for a single element of a list (mail account, certificate, domain)
+	itemAdded = pyqtSignal(object)
+	itemChanged = pyqtSignal(object)
+	itemRemoved = pyqtSignal(object)
+
 class CellChangeNotifier(QtCore.QObject):
 	# Emitted when a widget changed: <table>, <id (dns, domain,..)>, <widget>
 	tableWidgetChanged = pyqtSignal(QTableWidget, str, QWidget)
@@ -367,6 +554,196 @@ class DnsStateChangeObserver(QtCore.QObject):
 
 ###### END NOTIFIER ######
 
+###### START MODELS ######
+class MailTableModel(QAbstractTableModel):
+	# numerical values for sorting instead of the displayed text
+	SortRole = QtCore.Qt.UserRole + 1
+	COLUMNS = 7
+	__icons = {}
+
+	def __init__(self, parent = None):
+		super().__init__(parent)
+		self.accounts = []
+		# id -> row
+		self.rows = {}
+		# id -> displayed texts, only filled for rows which were shown
+		self.texts = {}
+		self.headers = [
+			'#', _translate('MainWindow', 'E-Mail', None), _translate('MainWindow', 'Typ', None),
+			_translate('MainWindow', 'Quota', None), _translate('MainWindow', 'Verbraucht', None),
+			_translate('MainWindow', 'Aktiviert', None), _translate('MainWindow', 'Status', None)
+		]
+		self.alignments = [
+			QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter, QtCore.Qt.AlignLeft|QtCore.Qt.AlignVCenter,
+			QtCore.Qt.AlignLeft|QtCore.Qt.AlignVCenter, QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter,
+			QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter, QtCore.Qt.AlignCenter|QtCore.Qt.AlignVCenter,
+			QtCore.Qt.AlignLeft|QtCore.Qt.AlignVCenter
+		]
+		self.headerFont = QFont()
+		self.headerFont.setBold(True)
+
+	@staticmethod
+	def getIcon(path):
+		# the icons are shared by all rows.
+		if path not in MailTableModel.__icons:
+			icon = QIcon()
+			icon.addPixmap(QPixmap(path), QIcon.Normal, QIcon.Off)
+			MailTableModel.__icons[path] = icon
+
+		return MailTableModel.__icons[path]
+
+	def setAccounts(self, mailList):
+		self.beginResetModel()
+		self.accounts = list(mailList)
+		self.rows = dict((getMailKey(f), row) for (row, f) in enumerate(self.accounts))
+		self.texts = {}
+		self.endResetModel()
+
+	def getAccount(self, row):
+		return self.accounts[row]
+
+	@pyqtSlot(object)
+	def addAccount(self, account):
+		row = len(self.accounts)
+		self.beginInsertRows(QModelIndex(), row, row)
+		self.accounts.append(account)
+		self.rows[getMailKey(account)] = row
+		self.endInsertRows()
+
+	@pyqtSlot(object)
+	def updateAccount(self, account):
+		row = self.rows.get(getMailKey(account))
+		if row is None:
+			return
+
+		self.texts.pop(getMailKey(account), None)
+		self.dataChanged.emit(self.index(row, 0), self.index(row, MailTableModel.COLUMNS - 1))
+
+	@pyqtSlot(object)
+	def removeAccount(self, account):
+		row = self.rows.get(getMailKey(account))
+		if row is None:
+			return
+
+		self.beginRemoveRows(QModelIndex(), row, row)
+		del(self.accounts[row])
+		del(self.rows[getMailKey(account)])
+		self.texts.pop(getMailKey(account), None)
+		for f in self.accounts[row:]:
+			self.rows[getMailKey(f)] -= 1
+		self.endRemoveRows()
+
+	def rowCount(self, parent = QModelIndex()):
+		return 0 if parent.isValid() else len(self.accounts)
+
+	def columnCount(self, parent = QModelIndex()):
+		return 0 if parent.isValid() else MailTableModel.COLUMNS
+
+	def headerData(self, section, orientation, role = QtCore.Qt.DisplayRole):
+		if orientation != QtCore.Qt.Horizontal:
+			return None
+
+		if role == QtCore.Qt.DisplayRole:
+			return self.headers[section]
+		elif role == QtCore.Qt.FontRole:
+			return self.headerFont
+		elif role == QtCore.Qt.TextAlignmentRole:
+			return self.alignments[section]
+
+		return None
+
+	def getType(self, account):
+		return self.getTypeInfo(account.type)
+
+	def getTypeInfo(self, mailType):
+		if mailType == MailAccount.TYPE_ACCOUNT:
+			return (':/typ/account.png', _translate("MainWindow", "Konto", None))
+		elif mailType == MailAccount.TYPE_FWDSMTP:
+			return (':/typ/fwdsmtp.png', _translate("MainWindow", "Weiterleitung mit SMTP", None))
+		else:
+			return (':/typ/forward.png', _translate("MainWindow", "Weiterleitung", None))
+
+	def getState(self, account):
+		if account.state == MailAccount.STATE_OK:
+			return (':/status/ok.png', _translate("MainWindow", "OK", None))
+		elif account.state == MailAccount.STATE_CHANGE:
+			return (':/status/waiting.png', _translate("MainWindow", "wird geändert", None))
+		elif account.state == MailAccount.STATE_CREATE:
+			return (':/status/state_add.png', _translate("MainWindow", "wird hinzugefügt", None))
+		elif account.state == MailAccount.STATE_DELETE:
+			return (':/status/trash.png', _translate("MainWindow", "wird gelöscht", None))
+		elif account.state == MailAccount.STATE_QUOTA:
+			return (':/status/general_process.png', _translate("MainWindow", "Quota wird neuberechnet", None))
+		else:
+			return (':/status/warning.png', _translate("MainWindow", "Unbekannt", None))
+
+	def getTexts(self, row):
+		account = self.accounts[row]
+		key = getMailKey(account)
+		if key not in self.texts:
+			self.texts[key] = (
+				'%s' % (account.id,),
+				account.getMailAddress(),
+				self.getType(account)[1],
+				account.getQuotaReadable(),
+				account.getQuotaStatus(),
+				_translate('MainWindow', 'Ja') if account.enabled else _translate('MainWindow', 'Nein'),
+				self.getState(account)[1]
+			)
+
+		return self.texts[key]
+
+	def data(self, index, role = QtCore.Qt.DisplayRole):
+		if not index.isValid():
+			return None
+
+		row = index.row()
+		col = index.column()
+		if role == QtCore.Qt.DisplayRole:
+			return self.getTexts(row)[col]
+		elif role == QtCore.Qt.DecorationRole:
+			if col == 2:
+				return MailTableModel.getIcon(self.getType(self.accounts[row])[0])
+			elif col == 6:
+				return MailTableModel.getIcon(self.getState(self.accounts[row])[0])
+		elif role == QtCore.Qt.TextAlignmentRole:
+			return self.alignments[col]
+		elif role == MailTableModel.SortRole:
+			account = self.accounts[row]
+			if col == 0:
+				return account.id if type(account.id) == int else 0
+			elif col == 3:
+				return account.quota if account.quota is not None else 0
+			elif col == 4:
+				return account.quotaSts if account.quotaSts is not None else 0.0
+			else:
+				return self.getTexts(row)[col]
+		elif role == QtCore.Qt.UserRole:
+			return self.accounts[row].id
+
+		return None
+
+class MailFilterProxyModel(QSortFilterProxyModel):
+
+	def __init__(self, parent = None):
+		super().__init__(parent)
+		# keys (getMailKey) of the matching accounts (result of the search index) or None
+		self.matches = None
+		self.setSortRole(MailTableModel.SortRole)
+
+	def setMatches(self, matches):
+		self.matches = matches
+		self.invalidateFilter()
+
+	def filterAcceptsRow(self, row, parent):
+		# inserted and changed rows are checked again by the proxy itself.
+		if self.matches is None:
+			return True
+
+		return getMailKey(self.sourceModel().getAccount(row)) in self.matches
+
+###### END MODELS ######
+
 ###### START WINDOWS ######
 class FlsCpAbout(QDialog):
 	def __init__(self, parentMain):
@@ -502,6 +879,11 @@ class MailForm(QDialog):
 		self.initFields()
 
 	def getFeatures(self):
+		# the main window got them already with the bootstrap.
+		if getattr(self.parent(), 'features', None) is not None:
+			self._features = self.parent().features
+			return
+
 		log.debug('Get list of features....')
 		try:
 			self._features = self.rpc.getFeatures()
@@ -1227,56 +1609,128 @@ class HostSelectionForm(QDialog):
 		super().reject()
 
 ###### END WINDOWS ######
+class FLSHTTPSConnection(http.client.HTTPSConnection):
+	"""HTTPS connection which resumes the given TLS session."""
+
+	def __init__(self, host, port = None, session = None, **kwds):
+		super().__init__(host, port, **kwds)
+		self.session = session
+
+	def connect(self):
+		http.client.HTTPConnection.connect(self)
+		self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host, session=self.session)
+		if self.session is not None and self.sock.session_reused:
+			log.debug('Resumed TLS session with %s' % (self.host,))
+		self.session = self.sock.session
+
 class FLSSafeTransport(xmlrpc.client.Transport):
 	"""Handles an HTTPS transaction to an XML-RPC server."""
 
-	def __init__(self, use_datetime=False, use_builtin_types=False):
+	def __init__(self, pool, use_datetime=False, use_builtin_types=False):
 		super().__init__(use_datetime, use_builtin_types)
+		self.pool = pool
 
 		self._extra_headers.append(('Connection', 'keep-alive'))		
 
 	def make_connection(self, host):
-		if not hasattr(self, 'timeout'):
-			self.timeout = 5
-
 		if self._connection and host == self._connection[0]:
-			return self._connection[1]
+			connection = self._connection[1]
+			if connection.timeout != self.pool.timeout:
+				connection.timeout = self.pool.timeout
+				if connection.sock is not None:
+					connection.sock.settimeout(self.pool.timeout)
+			return connection
 
-		if not hasattr(http.client, "HTTPSConnection"):
-			raise NotImplementedError(
-			"your version of http.client doesn't support HTTPS")
 		# create a HTTPS connection object from a host descriptor
 		# host may be a string, or a (host, x509-dict) tuple
-		#context = ssl.SSLContext(ssl.PROTOCOL_SSLv3)
-		context = ssl.SSLContext(ssl.PROTOCOL_TLSv1)
-		context.verify_mode = ssl.CERT_REQUIRED
-		context.load_verify_locations(CACERT)
-		log.debug('Timeout is: %s' % (self.timeout,))
-
-		chost, self._extra_headers, x509 = self.get_host_info(host)
-		self._connection = host, http.client.HTTPSConnection(
+		log.debug('Timeout is: %s' % (self.pool.timeout,))
+		chost, extraHeaders, x509 = self.get_host_info(host)
+		self._connection = host, FLSHTTPSConnection(
 			chost,
 			None, 
-			key_file=KEYFILE,
-			cert_file=CERTFILE,
-			context=context,
-			timeout=self.timeout,
-			check_hostname=False
+			session=self.pool.getSession(chost),
+			context=self.pool.getContext(),
+			timeout=self.pool.timeout
 		)
 
 		return self._connection[1]
 
+	def send_request(self, host, handler, request_body, debug):
+		connection = super().send_request(host, handler, request_body, debug)
+		# the session is known after the (first) handshake.
+		self.pool.setSession(self.get_host_info(host)[0], connection.session)
+
+		return connection
+
+class FLSTransportPool:
+	"""
+	Transport of FlsServer for all threads: every thread gets its own
+	FLSSafeTransport (with a persistent connection). All of them share
+	one ssl context and resume the last TLS session of the host.
+	"""
+
+	def __init__(self, timeout = 5):
+		self.timeout = timeout
+		self.local = threading.local()
+		self.lock = threading.Lock()
+		# transports of finished threads are closed by the garbage collector.
+		self.transports = weakref.WeakSet()
+		self.context = None
+		# host -> ssl.SSLSession
+		self.sessions = {}
+
+	def getContext(self):
+		with self.lock:
+			if self.context is None:
+				context = ssl.SSLContext(ssl.PROTOCOL_TLSv1)
+				context.verify_mode = ssl.CERT_REQUIRED
+				context.check_hostname = False
+				context.load_verify_locations(CACERT)
+				context.load_cert_chain(CERTFILE, KEYFILE)
+				self.context = context
+
+			return self.context
+
+	def getSession(self, host):
+		with self.lock:
+			return self.sessions.get(host)
+
+	def setSession(self, host, session):
+		if session is not None:
+			with self.lock:
+				self.sessions[host] = session
+
+	def getTransport(self):
+		transport = getattr(self.local, 'transport', None)
+		if transport is None:
+			transport = FLSSafeTransport(self)
+			self.local.transport = transport
+			with self.lock:
+				self.transports.add(transport)
+
+		return transport
+
+	def request(self, host, handler, request_body, verbose = False):
+		return self.getTransport().request(host, handler, request_body, verbose)
+
+	def close(self):
+		with self.lock:
+			transports = list(self.transports)
+		for transport in transports:
+			transport.close()
+
 class FlsServer(xmlrpc.client.ServerProxy):
 	__instance = None
 
 	def __init__(self):
+		self.__pool = FLSTransportPool()
 		super().__init__(
 			'https://%s:%i/%s' % (
 				conf.get(conf.get('options', 'currenthost'), 'host'), 
 				conf.getint(conf.get('options', 'currenthost'), 'port'), 
 				conf.get(conf.get('options', 'currenthost'), 'rpcpath')
 			), 
-			FLSSafeTransport(), allow_none=True
+			self.__pool, allow_none=True
 		)
 		FlsServer.__instance = self
 
@@ -1284,6 +1738,68 @@ class FlsServer(xmlrpc.client.ServerProxy):
 	def getInstance():
 		return FlsServer.__instance if FlsServer.__instance is not None else FlsServer()
 
+	def getPool(self):
+		# the proxy can be used by all threads (DataLoader).
+		return self.__pool
+
+class RpcBatch:
+	"""
+	Collects calls and sends them with system.multicall (chunkSize calls
+	per request). Every call has its own result: a failed call does not
+	stop the others. Servers without system.multicall get single calls.
+	"""
+
+	def __init__(self, rpc, chunkSize = RPC_BATCH_SIZE):
+		self.rpc = rpc
+		self.chunkSize = chunkSize
+		self.calls = []
+
+	def add(self, key, title, method, *params):
+		self.calls.append((key, title, method, params))
+
+	def __len__(self):
+		return len(self.calls)
+
+	def run(self, progress = None):
+		"""
+		Returns a list of (key, title, result, fault) - fault is None or the
+		xmlrpc.client.Fault of the call. Connection errors are raised.
+		"""
+		results = []
+		total = len(self.calls)
+		for start in range(0, total, self.chunkSize):
+			chunk = self.calls[start:start + self.chunkSize]
+			if len(chunk) == 1:
+				answers = [self.call(chunk[0])]
+			else:
+				try:
+					answers = self.rpc.system.multicall(
+						[{'methodName': method, 'params': list(params)} for (key, title, method, params) in chunk]
+					)
+				except xmlrpc.client.Fault as e:
+					log.info('Server does not support system.multicall (%s)' % (e,))
+					answers = [self.call(f) for f in chunk]
+
+			for ((key, title, method, params), answer) in zip(chunk, answers):
+				if isinstance(answer, dict):
+					log.warning('Call %s failed: %s' % (method, answer['faultString']))
+					results.append((key, title, None, xmlrpc.client.Fault(answer['faultCode'], answer['faultString'])))
+				else:
+					results.append((key, title, answer[0], None))
+
+			if progress is not None:
+				progress(start + len(chunk), total)
+
+		return results
+
+	def call(self, call):
+		# single call with the answer in the format of system.multicall
+		(key, title, method, params) = call
+		try:
+			return [getattr(self.rpc, method)(*params)]
+		except xmlrpc.client.Fault as e:
+			return {'faultCode': e.faultCode, 'faultString': e.faultString}
+
 class FLScpMainWindow(QMainWindow):
 	execInit = pyqtSignal()
 	sigCancelStart = pyqtSignal()
@@ -1296,6 +1812,37 @@ class FLScpMainWindow(QMainWindow):
 		self.app = app
 		self.ui = Ui_MainWindow()
 		self.ui.setupUi(self)
+		self.mailModel = MailTableModel(self)
+		self.mailProxy = MailFilterProxyModel(self)
+		self.mailProxy.setSourceModel(self.mailModel)
+		self.ui.mailTable.setModel(self.mailProxy)
+		self.mailNotifier = ListChangeNotifier(self)
+		self.mailNotifier.itemAdded.connect(self.mailModel.addAccount)
+		self.mailNotifier.itemChanged.connect(self.mailModel.updateAccount)
+		self.mailNotifier.itemRemoved.connect(self.mailModel.removeAccount)
+		self.mailNotifier.itemAdded.connect(self.indexMail)
+		self.mailNotifier.itemChanged.connect(self.indexMail)
+		self.mailNotifier.itemRemoved.connect(self.unindexMail)
+		# search index of the mail list: built and queried in the thread pool.
+		self.mailIndex = None
+		self.mailIndexGeneration = 0
+		# changes while the index is built: id -> account (None = removed)
+		self.mailIndexPending = {}
+		self.mailSearchSeq = 0
+		self.mailSearchCancel = None
+		self.mailSearchTimer = QtCore.QTimer(self)
+		self.mailSearchTimer.setSingleShot(True)
+		self.mailSearchTimer.setInterval(MAIL_SEARCH_DELAY)
+		self.mailSearchTimer.timeout.connect(self.searchMail)
+		self.certNotifier = ListChangeNotifier(self)
+		self.certNotifier.itemAdded.connect(self.insertCertRow)
+		self.certNotifier.itemChanged.connect(self.updateCertRow)
+		self.certNotifier.itemRemoved.connect(self.removeCertRow)
+		self.domainNotifier = ListChangeNotifier(self)
+		self.domainNotifier.itemAdded.connect(self.insertDomainItem)
+		self.domainNotifier.itemChanged.connect(self.updateDomainItem)
+		self.domainNotifier.itemRemoved.connect(self.removeDomainItem)
+		self.domainItems = {}
 		self.ui.mailTable.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 		self.ui.adminTable.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 		self.ui.adminTable.hideColumn(0)
@@ -1308,13 +1855,34 @@ class FLScpMainWindow(QMainWindow):
 		self.stateProgressBar = False
 		self.loginNeeded = True
 		self.fd = None
+		self.logFile = None
+		self.logStart = 0
+		self.logEnd = None
+		self.logSize = 0
+		self.logInode = None
+		self.logLoading = False
+		self.logFollowing = False
+		self.logSearchPending = None
 
 		self.version = ''
 
 		self.mails = MailAccountList()
 		self.domains = DomainList()
 		self.dns = DNSList()
+		# last state of the server (id -> dict) and its revision, only the
+		# changes are loaded again.
+		self.mailData = {}
+		self.mailRevision = None
+		self.domainData = {}
+		self.domainRevision = None
+		self.dnsData = {}
+		self.dnsRevision = {}
 		self.certs = flscertification.FLSCertificateList()
+		# features of the server (None: not known yet) and the pages of
+		# the mail list which are still loaded.
+		self.features = None
+		self.mailPages = set()
+		self.mailPagesFailed = False
 		self.splash = CpSplashScreen(self, QPixmap(":/logo/splash.png"), 10)
 
 		# connect to xml-rpc
@@ -1332,6 +1900,7 @@ class FLScpMainWindow(QMainWindow):
 		self.versionChanged.connect(self.changelog)
 
 		# menu
+		self.ui.actionSaveAll.triggered.connect(self.commitAll)
 		self.ui.actionExit.triggered.connect(self.quitApp)
 		self.ui.actionWhatsThis.triggered.connect(self.triggerWhatsThis)
 		self.ui.actionChangelog.triggered.connect(self.changelog)
@@ -1364,7 +1933,7 @@ class FLScpMainWindow(QMainWindow):
 		self.ui.butQuotaCalc.clicked.connect(self.calculateMailQuota)
 		self.ui.butReload.clicked.connect(self.reloadMailTable)
 		self.ui.butSave.clicked.connect(self.commitMailData)
-		self.ui.mailTable.cellDoubleClicked.connect(self.selectedMail)
+		self.ui.mailTable.doubleClicked.connect(self.selectedMail)
 		self.ui.search.textChanged.connect(self.filterMail)
 		self.setupMailTable()
 
@@ -1372,14 +1941,14 @@ class FLScpMainWindow(QMainWindow):
 		self.ui.butLogLoad.clicked.connect(self.loadLog)
 		self.ui.butLogReload.clicked.connect(self.reloadLogFileList)
 		self.ui.butLogTrash.clicked.connect(self.clearLogFile)
+		self.ui.logText.verticalScrollBar().valueChanged.connect(self.logScrolled)
+		self.ui.butLogFollow.toggled.connect(self.followLog)
 		self.ui.logSearch.textChanged.connect(self.searchLog)
 		self.ui.butLogSearchBack.clicked.connect(self.searchLogBack)
 		self.ui.butLogSearchForw.clicked.connect(self.searchLogForward)
 
-		# certs tab
-		try:
-			import OpenSSL
-		except ImportError:
+		# certs tab (pyOpenSSL is imported only when a certificate is added)
+		if importlib.util.find_spec('OpenSSL') is None:
 			self.ui.butAdminAdd.setEnabled(False)
 		else:
 			self.ui.butAdminAdd.clicked.connect(self.addCertificate)
@@ -1399,6 +1968,11 @@ class FLScpMainWindow(QMainWindow):
 		except:
 			return False
 
+		try:
+			import OpenSSL
+		except ImportError:
+			return False
+
 		try:
 			pk = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_PEM, content)
 		except OpenSSL.crypto.Error as err:
@@ -1491,11 +2065,33 @@ class FLScpMainWindow(QMainWindow):
 
 	@pyqtSlot(list)
 	def logFileListLoaded(self, data):
+		current = self.ui.fldLogFile.currentText()
+		self.ui.fldLogFile.clear()
 		for f in data:
-			self.ui.fldLogFile.addItem(f)
+			self.ui.fldLogFile.addItem(f['file'], f)
+			self.ui.fldLogFile.setItemData(
+				self.ui.fldLogFile.count() - 1,
+				'%s (%s, %s)' % (
+					f['file'], self.formatSize(int(f['size'])),
+					datetime.datetime.fromtimestamp(f['mtime']).strftime('%d.%m.%Y %H:%M:%S')
+				),
+				QtCore.Qt.ToolTipRole
+			)
+
+		idx = self.ui.fldLogFile.findText(current)
+		if idx >= 0:
+			self.ui.fldLogFile.setCurrentIndex(idx)
 
 		self.disableProgressBar()
 
+	def formatSize(self, size):
+		for unit in ['B', 'KB', 'MB']:
+			if size < 1024:
+				return '%i %s' % (size, unit)
+			size = size / 1024
+
+		return '%.1f GB' % (size,)
+
 	@pyqtSlot(Exception)
 	def dataLoadError(self, e):
 		self.disableProgressBar()
@@ -1560,28 +2156,142 @@ class FLScpMainWindow(QMainWindow):
 		if logFile == '':
 			return
 
-		self.ui.logText.setPlainText('')
+		self.clearLogFile()
+		self.logFile = logFile
 
 		self.enableProgressBar(self.ui.tabLog, _translate('MainWindow', 'Loading log file...', None))
-		dataLoader = LogFileLoader(self.rpc)
-		dataLoader.setFile(logFile)
-		dataLoader.dataLoaded.connect(self.logFileLoaded)
+		self.loadLogChunk(None, LOG_DIRECTION_TAIL)
+
+	def loadLogChunk(self, offset, direction):
+		self.logLoading = True
+		dataLoader = LogFileLoader(self.rpc, self.logFile, offset, direction)
+		dataLoader.dataLoadedDict.connect(self.logFileLoaded)
 		dataLoader.certError.connect(self.dataLoadCertError)
 		dataLoader.socketError.connect(self.dataLoadSocketError)
 		dataLoader.protocolError.connect(self.dataLoadProtocolError)
 		dataLoader.unknownError.connect(self.dataLoadError)
+		dataLoader.certError.connect(self.logLoadFailed)
+		dataLoader.socketError.connect(self.logLoadFailed)
+		dataLoader.protocolError.connect(self.logLoadFailed)
+		dataLoader.unknownError.connect(self.logLoadFailed)
 		QThreadPool.globalInstance().start(dataLoader)
 
-	@pyqtSlot(list)
+	@pyqtSlot()
+	def logLoadFailed(self):
+		# the next scroll or search may try again.
+		self.logLoading = False
+		self.disableProgressBar()
+
+	@pyqtSlot(dict)
 	def logFileLoaded(self, data):
 		self.disableProgressBar()
-		self.ui.logText.insertPlainText(data[0])
-		#self.ui.logText.setPlainText(self.ui.logText.getPlainText() + data[0])
+		self.logLoading = False
+		if data['file'] != self.logFile:
+			# user switched to another file in the meantime.
+			return
+
+		scrollBar = self.ui.logText.verticalScrollBar()
+		cursor = QTextCursor(self.ui.logText.document())
+		self.logSize = int(data['size'])
+		if self.logEnd is None:
+			# first chunk: start at the end of the log (or at a search result)
+			self.ui.logText.setPlainText(data['data'])
+			self.logStart = int(data['offset'])
+			self.logEnd = int(data['end'])
+			if self.logSearchPending is not None:
+				scrollBar.setValue(scrollBar.minimum())
+				self.searchLog(self.logSearchPending)
+				self.logSearchPending = None
+			else:
+				scrollBar.setValue(scrollBar.maximum())
+			self.followLog(self.ui.butLogFollow.isChecked())
+		elif data['direction'] == LOG_DIRECTION_TAIL:
+			# prepend - and keep the visible part on the same position
+			oldMax = scrollBar.maximum()
+			oldValue = scrollBar.value()
+			cursor.movePosition(QTextCursor.Start)
+			cursor.insertText(data['data'])
+			self.logStart = int(data['offset'])
+			scrollBar.setValue(oldValue + scrollBar.maximum() - oldMax)
+		else:
+			cursor.movePosition(QTextCursor.End)
+			cursor.insertText(data['data'])
+			self.logEnd = int(data['end'])
+
 		self.ui.logText.setReadOnly(True)
 		self.ui.logText.setAcceptRichText(False)
 
+	@pyqtSlot(bool)
+	def followLog(self, state):
+		if state and not self.logFollowing and self.logFile is not None and self.logEnd is not None:
+			self.logFollowing = True
+			self.loadLogFollow()
+
+	def loadLogFollow(self):
+		dataLoader = LogFollowLoader(self.rpc, self.logFile, self.logSize, self.logInode)
+		dataLoader.dataLoadedDict.connect(self.logFollowLoaded)
+		dataLoader.certError.connect(self.dataLoadCertError)
+		dataLoader.socketError.connect(self.dataLoadSocketError)
+		dataLoader.protocolError.connect(self.dataLoadProtocolError)
+		dataLoader.unknownError.connect(self.dataLoadError)
+		dataLoader.certError.connect(self.stopFollowLog)
+		dataLoader.socketError.connect(self.stopFollowLog)
+		dataLoader.protocolError.connect(self.stopFollowLog)
+		dataLoader.unknownError.connect(self.stopFollowLog)
+		QThreadPool.globalInstance().start(dataLoader)
+
+	@pyqtSlot()
+	def stopFollowLog(self):
+		self.logFollowing = False
+		self.ui.butLogFollow.setChecked(False)
+
+	@pyqtSlot(dict)
+	def logFollowLoaded(self, data):
+		self.logFollowing = False
+		if data['file'] == self.logFile and self.logEnd is not None:
+			self.logInode = data['inode']
+			# only append, if the end of the file is shown (otherwise the lazy
+			# loading while scrolling gets it).
+			if self.logEnd == self.logSize or data['rotated']:
+				scrollBar = self.ui.logText.verticalScrollBar()
+				atBottom = scrollBar.value() >= scrollBar.maximum()
+				cursor = QTextCursor(self.ui.logText.document())
+				cursor.movePosition(QTextCursor.End)
+				if data['rotated']:
+					cursor.insertText('\n')
+				cursor.insertText(data['data'])
+				self.logEnd = int(data['end'])
+				if atBottom:
+					scrollBar.setValue(scrollBar.maximum())
+			self.logSize = int(data['size'])
+			if not data.get('followable', True):
+				# e.g. a rotated (gzip) log - nothing will be appended.
+				self.stopFollowLog()
+				return
+
+		# next round (or the follow request of a newly loaded file)
+		self.followLog(self.ui.butLogFollow.isChecked())
+
+	@pyqtSlot(int)
+	def logScrolled(self, value):
+		if self.logFile is None or self.logEnd is None or self.logLoading:
+			return
+
+		scrollBar = self.ui.logText.verticalScrollBar()
+		if value <= scrollBar.minimum() and self.logStart > 0:
+			self.loadLogChunk(self.logStart, LOG_DIRECTION_TAIL)
+		elif value >= scrollBar.maximum() and self.logEnd < self.logSize:
+			self.loadLogChunk(self.logEnd, LOG_DIRECTION_HEAD)
+
 	@pyqtSlot()
 	def clearLogFile(self):
+		self.logFile = None
+		self.logStart = 0
+		self.logEnd = None
+		self.logSize = 0
+		self.logInode = None
+		self.logLoading = False
+		self.logSearchPending = None
 		self.ui.logText.setPlainText('')
 
 	@pyqtSlot(str)
@@ -1602,7 +2312,11 @@ class FLScpMainWindow(QMainWindow):
 		if self.ui.butLogChkSensitive.isChecked():
 			options = options | QTextDocument.FindCaseSensitively
 		
-		self.ui.logText.find(self.ui.logSearch.text(), options)
+		if not self.ui.logText.find(self.ui.logSearch.text(), options) and self.logStart > 0:
+			# not in the loaded part - ask the server for the previous match.
+			self.searchLogServer(
+				self.ui.logSearch.text(), {'reverse': True, 'end': str(self.logStart)}
+			)
 
 	@pyqtSlot()
 	def searchLogForward(self):
@@ -1611,9 +2325,63 @@ class FLScpMainWindow(QMainWindow):
 			options = QTextDocument.FindCaseSensitively
 
 		if options is None:
-			self.ui.logText.find(self.ui.logSearch.text())
+			found = self.ui.logText.find(self.ui.logSearch.text())
 		else:
-			self.ui.logText.find(self.ui.logSearch.text(), options)
+			found = self.ui.logText.find(self.ui.logSearch.text(), options)
+
+		if not found and self.logEnd is not None and self.logEnd < self.logSize:
+			# not in the loaded part - ask the server for the next match.
+			self.searchLogServer(
+				self.ui.logSearch.text(), 
+				{'cursor': {'file': self.logFile, 'offset': str(self.logEnd), 'line': None}}
+			)
+
+	def searchLogServer(self, text, options):
+		if self.logFile is None or len(text) <= 0 or self.logLoading:
+			return
+
+		options['caseSensitive'] = self.ui.butLogChkSensitive.isChecked()
+		options['limit'] = 1
+		self.logLoading = True
+		self.enableProgressBar(self.ui.tabLog, _translate('MainWindow', 'Searching log file...', None))
+		dataLoader = LogSearchLoader(self.rpc, text, [self.logFile], options)
+		dataLoader.dataLoadedDict.connect(self.logSearchLoaded)
+		dataLoader.certError.connect(self.dataLoadCertError)
+		dataLoader.socketError.connect(self.dataLoadSocketError)
+		dataLoader.protocolError.connect(self.dataLoadProtocolError)
+		dataLoader.unknownError.connect(self.dataLoadError)
+		dataLoader.certError.connect(self.logLoadFailed)
+		dataLoader.socketError.connect(self.logLoadFailed)
+		dataLoader.protocolError.connect(self.logLoadFailed)
+		dataLoader.unknownError.connect(self.logLoadFailed)
+		QThreadPool.globalInstance().start(dataLoader)
+
+	@pyqtSlot(dict)
+	def logSearchLoaded(self, data):
+		self.logLoading = False
+		if len(data['matches']) <= 0:
+			self.disableProgressBar()
+			if data['next'] is not None and data['next'].get('reverse', False):
+				# server stopped after scanning a big part. Continue before it.
+				self.searchLogServer(self.ui.logSearch.text(), {'reverse': True, 'end': data['next']['offset']})
+			elif data['next'] is not None:
+				# server stopped after scanning a big part. Continue there.
+				self.searchLogServer(self.ui.logSearch.text(), {'cursor': data['next']})
+			else:
+				self.ui.statusbar.showMessage(_translate('MainWindow', 'Keine weiteren Treffer.', None), 5000)
+			return
+
+		match = data['matches'][0]
+		if match['file'] != self.logFile:
+			self.disableProgressBar()
+			return
+
+		# show the log beginning at the line of the match.
+		logFile = self.logFile
+		self.clearLogFile()
+		self.logFile = logFile
+		self.logSearchPending = self.ui.logSearch.text()
+		self.loadLogChunk(match['offset'], LOG_DIRECTION_HEAD)
 
 	@pyqtSlot()
 	def switchToAdmin(self):
@@ -1640,6 +2408,7 @@ class FLScpMainWindow(QMainWindow):
 		else:
 			# select the default host.
 			conf.set('options', 'currenthost', conf.get('options', 'defaulthost'))
+			self.openCache()
 
 		# now initiate the RPC server
 		self.rpc = FlsServer.getInstance()
@@ -1658,8 +2427,8 @@ class FLScpMainWindow(QMainWindow):
 		
 		if self.rpc is not None:
 			# connection possible ?
-			timeout = self.rpc.__transport.timeout
-			self.rpc.__transport.timeout = 1
+			timeout = self.rpc.getPool().timeout
+			self.rpc.getPool().timeout = 1
 			try:
 				p = self.rpc.ping()
 			except ssl.SSLError as e:
@@ -1715,107 +2484,241 @@ class FLScpMainWindow(QMainWindow):
 				)
 				self.sigCancelStart.emit()
 				return
-			self.rpc.__transport.timeout = timeout
+			self.rpc.getPool().timeout = timeout
 			self.loginNeeded = False
 
-			# Check if we're allowed to connect with this version.
-			self.splash.showMessage(_translate('SplashScreen', 'Prüfe Kompatibilität...'), 4, color=QColor(255, 255, 255))
-			self.app.processEvents()
-			try:
-				upToDate = self.rpc.compatible(__version__, __min_server__)
-			except xmlrpc.client.Fault as e:
-				upToDate = False
-			if not upToDate:
-				log.critical('Could not connect due to incompatibility.')
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Versionsfehler!', None), 
-					_translate('MainWindow', 
-						'Eine Verbindung kann nicht aufgebaut werden wegen Versionsinkompatibilität. ' \
-						'Bitte aktualisieren Sie die Server- oder Clientapplikation!', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
+			# the data of the last start is shown at once, the server only
+			# sends the changes (in the background).
+			if self.loadFromCache():
+				self.startBootstrap()
+			elif not self.bootstrap():
+				self.sigCancelStart.emit()
+				return
+		else:
+			if not self.initLoginCert():
 				self.sigCancelStart.emit()
 				return
 
-			# connection possible - now check the version
-			self.splash.showMessage(_translate('SplashScreen', 'Prüfe Version...'), 4, color=QColor(255, 255, 255))
-			self.app.processEvents()
-			upToDate = self.rpc.upToDate(__version__)
-			if not upToDate:
-				self.updateVersion()
+		# disable splash screen!
+		# (it is always a login needed. But sometimes we cannot simply start the application ;))
+		if not self.loginNeeded:
+			self.stateProgressBar = True
+			self.start()
 
-			# load the data!
-			self.splash.showMessage(_translate('SplashScreen', 'Lade Domains...'), 7, color=QColor(255, 255, 255))
-			self.app.processEvents()
+	def bootstrap(self):
+		# Check if we're allowed to connect with this version. Newer servers
+		# send the version check and the first data in one request.
+		self.splash.showMessage(_translate('SplashScreen', 'Prüfe Kompatibilität...'), 4, color=QColor(255, 255, 255))
+		self.app.processEvents()
+		try:
+			boot = self.rpc.bootstrap(__version__, __min_server__, MAIL_PAGE_SIZE)
+		except xmlrpc.client.Fault as e:
+			log.info('Server does not support bootstrap (%s)' % (e,))
+			boot = None
 
-			# domains
+		if boot is not None:
+			upToDate = boot['compatible']
+		else:
 			try:
-				self.loadDomains()
+				upToDate = self.rpc.compatible(__version__, __min_server__)
 			except xmlrpc.client.Fault as e:
-				log.critical('Could not load domains because of %s' % (e,))
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Daten nicht ladbar', None), 
-					_translate('MainWindow', 
-						'Die Domains konnten nicht abgerufen werden.', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
-			else:
-				self.loadDomainData()
+				upToDate = False
+		if not upToDate:
+			log.critical('Could not connect due to incompatibility.')
+			QMessageBox.critical(
+				self, _translate('MainWindow', 'Versionsfehler!', None), 
+				_translate('MainWindow', 
+					'Eine Verbindung kann nicht aufgebaut werden wegen Versionsinkompatibilität. ' \
+					'Bitte aktualisieren Sie die Server- oder Clientapplikation!', 
+					None),
+				QMessageBox.Ok, QMessageBox.Ok
+			)
+			return False
 
-			# load the data!
-			self.splash.showMessage(_translate('SplashScreen', 'Lade E-Mail-Adresse...'), 8, color=QColor(255, 255, 255))
-			self.app.processEvents()
+		# connection possible - now check the version
+		self.splash.showMessage(_translate('SplashScreen', 'Prüfe Version...'), 4, color=QColor(255, 255, 255))
+		self.app.processEvents()
+		upToDate = boot['upToDate'] if boot is not None else self.rpc.upToDate(__version__)
+		if not upToDate:
+			self.updateVersion()
 
-			# mails
-			try:
-				self.loadMails(True)
-			except xmlrpc.client.Fault as e:
-				log.critical('Could not load mails because of %s' % (e,))
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Daten nicht ladbar', None), 
-					_translate('MainWindow', 
-						'Die E-Mail-Konten konnten nicht abgerufen werden.', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
+		# load the data!
+		self.splash.showMessage(_translate('SplashScreen', 'Lade Daten...'), 7, color=QColor(255, 255, 255))
+		self.app.processEvents()
+		if boot is not None:
+			ClientCache.getInstance().checkVersion(boot['version'])
+			self.bootstrapLoaded(boot)
+		else:
+			self.loadParallel()
 
-			# load the data!
-			self.splash.showMessage(_translate('SplashScreen', 'Lade Zertifikate...'), 9, color=QColor(255, 255, 255))
-			self.app.processEvents()
+		return True
 
-			# certs
-			try:
-				self.loadCerts(True)
-			except xmlrpc.client.Fault as e:
-				log.critical('Could not load certificates because of %s' % (e,))
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Daten nicht ladbar', None), 
-					_translate('MainWindow', 
-						'Die Zertifikate konnten nicht abgerufen werden.', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
+	def startBootstrap(self):
+		dataLoader = BootstrapLoader(self.rpc, {'domains': self.domainRevision, 'mails': self.mailRevision})
+		dataLoader.dataLoadedDict.connect(self.bootstrapChecked)
+		dataLoader.certError.connect(self.dataLoadCertError)
+		dataLoader.socketError.connect(self.dataLoadSocketError)
+		dataLoader.protocolError.connect(self.dataLoadProtocolError)
+		dataLoader.unknownError.connect(self.dataLoadError)
+		QThreadPool.globalInstance().start(dataLoader)
+
+	@pyqtSlot(dict)
+	def bootstrapChecked(self, boot):
+		# the window shows the cached data - now the server answered.
+		if not boot['compatible']:
+			log.critical('Could not connect due to incompatibility.')
+			QMessageBox.critical(
+				self, _translate('MainWindow', 'Versionsfehler!', None), 
+				_translate('MainWindow', 
+					'Eine Verbindung kann nicht aufgebaut werden wegen Versionsinkompatibilität. ' \
+					'Bitte aktualisieren Sie die Server- oder Clientapplikation!', 
+					None),
+				QMessageBox.Ok, QMessageBox.Ok
+			)
+			self.sigCancelStart.emit()
+			return
+
+		if not boot['upToDate']:
+			self.updateVersion()
+
+		if not ClientCache.getInstance().checkVersion(boot['version']):
+			# cached for another server version: load everything again.
+			self.mailData.clear()
+			self.mailRevision = None
+			self.domainData.clear()
+			self.domainRevision = None
+			self.dnsData.clear()
+			self.dnsRevision.clear()
+			self.features = boot['features']
+			self.certListLoaded(boot['certs'])
+			self.loadParallel(certs = False)
+			return
+
+		self.bootstrapLoaded(boot)
+
+	def openCache(self):
+		# every host has its own cache.
+		host = conf.get('options', 'currenthost')
+		try:
+			ClientCache.getInstance().open(host, '%s:%s' % (conf.get(host, 'host'), conf.get(host, 'port')))
+		except (sqlite3.Error, OSError) as e:
+			log.warning('Local cache not available: %s' % (e,))
+			ClientCache.getInstance().close()
+
+	def loadFromCache(self):
+		cache = ClientCache.getInstance()
+		try:
+			if not cache.isOpen() or cache.getMeta('version') is None:
+				return False
+
+			(certRevision, certData) = cache.load('certs')
+			(domainRevision, domainData) = cache.load('domains')
+			(mailRevision, mailData) = cache.load('mails')
+			if certRevision is None or domainRevision is None or mailRevision is None:
+				return False
+
+			dnsData = {}
+			for name in cache.listDatasets('dns-'):
+				dnsData[int(name[4:])] = cache.load(name)
+		except sqlite3.Error as e:
+			log.warning('Could not read the local cache: %s' % (e,))
+			return False
+
+		log.info('Show %i cached mails and %i domains' % (len(mailData), len(domainData)))
+		self.setCerts(certData[0]['data'])
+		self.domainData = domainData
+		self.domainRevision = domainRevision
+		self.setDomains()
+		self.loadDomainData()
+		self.mailData = mailData
+		self.mailRevision = mailRevision
+		self.mailListLoaded(sorted(self.mailData.values(), key=lambda f: f['id']))
+		for (domainId, (revision, items)) in dnsData.items():
+			if revision is not None:
+				self.dnsData[domainId] = items
+				self.dnsRevision[domainId] = revision
+
+		return True
+
+	def bootstrapLoaded(self, boot):
+		self.features = boot['features']
+		self.certListLoaded(boot['certs'])
+		self.domainChangesLoaded(boot['domains'])
+		self.mailChangesLoaded(boot['mails'])
+
+		# the other mails are loaded in parallel. The cache is incomplete
+		# until all pages are there.
+		self.mailPages = set(boot['mailPages'])
+		self.mailPagesFailed = False
+		if len(self.mailPages) > 0:
+			ClientCache.getInstance().applyChanges('mails', {'revision': None, 'full': False, 'items': [], 'deleted': []})
+		for after in boot['mailPages']:
+			dataLoader = MailPageLoader(self.rpc, after, MAIL_PAGE_SIZE)
+			dataLoader.dataLoadedDict.connect(self.mailPageLoaded)
+			dataLoader.certError.connect(self.dataLoadCertError)
+			dataLoader.socketError.connect(self.dataLoadSocketError)
+			dataLoader.protocolError.connect(self.dataLoadProtocolError)
+			dataLoader.unknownError.connect(self.dataLoadError)
+			QThreadPool.globalInstance().start(dataLoader)
+
+	def loadParallel(self, certs = True):
+		# servers without bootstrap (and a cache of another server version):
+		# every list with its own request, all at the same time.
+		loaders = [
+			(DomainListLoader(self.rpc, self.domainRevision), self.domainChangesLoaded),
+			(MailListLoader(self.rpc, self.mailRevision), self.mailChangesLoaded)
+		]
+		if certs:
+			loaders.append((CertListLoader(self.rpc), self.certListLoaded))
+		for (dataLoader, slot) in loaders:
+			dataLoader.dataLoadedDict.connect(slot)
+			dataLoader.certError.connect(self.dataLoadCertError)
+			dataLoader.socketError.connect(self.dataLoadSocketError)
+			dataLoader.protocolError.connect(self.dataLoadProtocolError)
+			dataLoader.unknownError.connect(self.dataLoadError)
+			QThreadPool.globalInstance().start(dataLoader)
+
+	@pyqtSlot(dict)
+	def mailPageLoaded(self, data):
+		self.mailPages.discard(data['after'])
+		if data['items'] is None:
+			self.mailPagesFailed = True
 		else:
-			if not self.initLoginCert():
-				self.sigCancelStart.emit()
-				return
+			for item in data['items']:
+				self.mailData[item['id']] = item
+			ClientCache.getInstance().applyChanges(
+				'mails', {'revision': None, 'full': False, 'items': data['items'], 'deleted': []}
+			)
 
-		# disable splash screen!
-		# (it is always a login needed. But sometimes we cannot simply start the application ;))
-		if not self.loginNeeded:
-			self.stateProgressBar = True
-			self.start()
+		if len(self.mailPages) > 0:
+			return
+
+		if self.mailPagesFailed:
+			# incomplete - the next refresh loads the full list.
+			self.mailRevision = None
+		ClientCache.getInstance().applyChanges(
+			'mails', {'revision': self.mailRevision, 'full': False, 'items': [], 'deleted': []}
+		)
+		log.debug('Loaded all pages of the mail list (%i mails)' % (len(self.mailData),))
+		self.mailListLoaded(sorted(self.mailData.values(), key=lambda f: f['id']))
 
 	def updateVersion(self):
 		self.splash.showMessage(_translate('SplashScreen', 'Neue Version verfügbar. Lade herunter...'), 5, color=QColor(255, 255, 255))
 		self.app.processEvents()
 
+		settings = QSettings(SETTINGS_ORG, SETTINGS_APP)
+		fileName = None
 		try:
-			data = self.rpc.getCurrentVersion()
+			info = self.rpc.getVersionHash()
+			if settings.value('updateHash') == info['hash']:
+				# we have already installed this bundle.
+				log.info('Update %s is already installed.' % (info['hash'],))
+				return
+			fileName = self.downloadUpdate(info)
 		except xmlrpc.client.Fault as e:
 			log.critical('Could not update the flscp because of %s' % (e,))
+
+		if fileName is None:
 			QMessageBox.critical(
 				self, _translate('MainWindow', 'Aktualisierung', None), 
 				_translate('MainWindow', 
@@ -1826,13 +2729,8 @@ class FLScpMainWindow(QMainWindow):
 		else:
 			self.splash.showMessage(_translate('SplashScreen', 'Neue Version verfügbar. Installiere...'), 6, color=QColor(255, 255, 255))
 			self.app.processEvents()
-			# now save it!
-			data = base64.b64decode(data.encode('utf-8'))
-			d = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
-			d.write(data)
-			d.close()
 			# open zip
-			zfile = zipfile.ZipFile(d.name, 'r')
+			zfile = zipfile.ZipFile(fileName, 'r')
 			# crc ok?
 			if zfile.testzip() is not None:
 				log.warning('Corrupted update downloaded!')
@@ -1844,7 +2742,7 @@ class FLScpMainWindow(QMainWindow):
 					QMessageBox.Ok, QMessageBox.Ok
 				)
 				zfile.close()
-				os.unlink(d.name)
+				os.unlink(fileName)
 				return
 
 			# do we have an build folder?
@@ -1854,6 +2752,7 @@ class FLScpMainWindow(QMainWindow):
 			else:
 				extp = '.'
 			zfile.extractall(extp)
+			settings.setValue('updateHash', info['hash'])
 			log.info('Update successful!')
 			QMessageBox.information(
 				self, _translate('MainWindow', 'Aktualisierung', None), 
@@ -1863,12 +2762,54 @@ class FLScpMainWindow(QMainWindow):
 				QMessageBox.Ok, QMessageBox.Ok
 			)
 			zfile.close()
-			os.unlink(d.name)
+			os.unlink(fileName)
 			self.splash.close()
 			self.stateProgressBar = False
 			self.close()
 			return
 
+	def downloadUpdate(self, info):
+		"""
+		Downloads the update bundle in chunks. An interrupted download is
+		continued on the next start (as long as the bundle did not change).
+		Returns the file name of the complete bundle or None.
+		"""
+		partName = os.path.join(tempfile.gettempdir(), 'flscp-update-%s.part' % (info['hash'],))
+		offset = os.path.getsize(partName) if os.path.exists(partName) else 0
+		if offset > info['size']:
+			os.unlink(partName)
+			offset = 0
+
+		with open(partName, 'ab') as f:
+			while offset < info['size']:
+				chunk = self.rpc.getVersionChunk(info['hash'], offset, UPDATE_CHUNK_SIZE)
+				if chunk['data'] is None:
+					# bundle changed on server while downloading.
+					log.warning('Update bundle %s is outdated!' % (info['hash'],))
+					f.close()
+					os.unlink(partName)
+					return None
+
+				data = base64.b64decode(chunk['data'].encode('utf-8'))
+				if len(data) <= 0:
+					break
+				f.write(data)
+				offset += len(data)
+				self.splash.showMessage(
+					_translate('SplashScreen', 'Neue Version verfügbar. Lade herunter ({} %)...', None, int(offset * 100 / info['size'])), 
+					5, color=QColor(255, 255, 255)
+				)
+				self.app.processEvents()
+
+		with open(partName, 'rb') as f:
+			checksum = hashlib.sha256(f.read()).hexdigest()
+		if checksum != info['hash']:
+			log.warning('Checksum of update is wrong (%s instead of %s)!' % (checksum, info['hash']))
+			os.unlink(partName)
+			return None
+
+		return partName
+
 	def initLoginCert(self):
 		self.splash.showMessage(_translate('SplashScreen', 'Warte auf Anmeldung...'), 3, color=QColor(255, 255, 255))
 		self.app.processEvents()
@@ -1918,6 +2859,7 @@ class FLScpMainWindow(QMainWindow):
 
 	@pyqtSlot(str)
 	def loginCertSelected(self, f):
+		import OpenSSL
 
 		if len(f) > 0:
 			f = f[0]
@@ -2090,6 +3032,12 @@ class FLScpMainWindow(QMainWindow):
 
 	@pyqtSlot(dict)
 	def certListLoaded(self, data):
+		ClientCache.getInstance().applyChanges(
+			'certs', {'revision': '0', 'full': True, 'items': [{'id': 0, 'data': data}], 'deleted': []}
+		)
+		self.setCerts(data)
+
+	def setCerts(self, data):
 		self.certs = flscertification.FLSCertificateList()
 
 		for key, item in data.items():
@@ -2105,62 +3053,84 @@ class FLScpMainWindow(QMainWindow):
 		self.ui.adminTable.setRowCount(0)
 
 		for cert in self.certs:
-			rowNr = self.ui.adminTable.rowCount()
-			self.ui.adminTable.insertRow(rowNr)
-			# number
-			item = QTableWidgetItem()
-			item.setText('%s' % (rowNr + 1,))
-			self.ui.adminTable.setVerticalHeaderItem(rowNr, item)
-			# hash (to identify later)
-			item = QTableWidgetItem()
-			item.setText('%s' % (cert.__hash__(),))
-			self.ui.adminTable.setItem(rowNr, 0, item)
-			# name
-			item = QTableWidgetItem()
-			item.setText('%s' % (cert.subject.commonName,))
-			self.ui.adminTable.setItem(rowNr, 1, item)
-			# email
-			item = QTableWidgetItem()
-			item.setText(cert.subject.emailAddress)
-			self.ui.adminTable.setItem(rowNr, 2, item)
-			# serial number
-			item = QTableWidgetItem()
-			item.setText('%s' % (cert.serialNumber,))
-			self.ui.adminTable.setItem(rowNr, 3, item)
-			# valid until?
-			item = QTableWidgetItem()
-			if cert.notAfter is not None:
-				item.setText(cert.notAfter.strftime('%d.%m.%Y %H:%M:%S'))
-			else:
-				item.setText('')
-			self.ui.adminTable.setItem(rowNr, 4, item)
-			# status
-			item = QTableWidgetItem()
-			icon = QIcon()
-			if cert.state == flscertification.FLSCertificate.STATE_OK:
-				icon.addPixmap(QPixmap(":/status/ok.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "OK", None))
-			elif cert.state == flscertification.FLSCertificate.STATE_ADDED:
-				icon.addPixmap(QPixmap(":/status/state_add.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "wird hinzugefügt", None))
-			elif cert.state == flscertification.FLSCertificate.STATE_DELETE:
-				icon.addPixmap(QPixmap(":/status/trash.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "wird gelöscht", None))
-			elif cert.state == flscertification.FLSCertificate.STATE_EXPIRED:
-				icon.addPixmap(QPixmap(":/status/expired.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "ist abgelaufen", None))
-			else:
-				icon.addPixmap(QPixmap(":/status/warning.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "Unbekannt", None))
-			item.setIcon(icon)
-			self.ui.adminTable.setItem(rowNr, 5, item)
+			self.insertCertRow(cert)
 		self.ui.adminTable.setSortingEnabled(True)
 
+	def findCertRow(self, cert):
+		# the hash identifies the certificate (column 0)
+		hsh = '%s' % (cert.__hash__(),)
+		for rowNr in range(self.ui.adminTable.rowCount()):
+			if self.ui.adminTable.item(rowNr, 0).text() == hsh:
+				return rowNr
+
+		return None
+
+	@pyqtSlot(object)
+	def insertCertRow(self, cert):
+		sorting = self.ui.adminTable.isSortingEnabled()
+		self.ui.adminTable.setSortingEnabled(False)
+		rowNr = self.ui.adminTable.rowCount()
+		self.ui.adminTable.insertRow(rowNr)
+		# number
+		item = QTableWidgetItem()
+		item.setText('%s' % (rowNr + 1,))
+		self.ui.adminTable.setVerticalHeaderItem(rowNr, item)
+		# hash (to identify later)
+		item = QTableWidgetItem()
+		item.setText('%s' % (cert.__hash__(),))
+		self.ui.adminTable.setItem(rowNr, 0, item)
+		for col in range(1, 6):
+			self.ui.adminTable.setItem(rowNr, col, QTableWidgetItem())
+		self.setCertRow(rowNr, cert)
+		self.ui.adminTable.setSortingEnabled(sorting)
+
+	@pyqtSlot(object)
+	def updateCertRow(self, cert):
+		rowNr = self.findCertRow(cert)
+		if rowNr is not None:
+			self.setCertRow(rowNr, cert)
+
+	@pyqtSlot(object)
+	def removeCertRow(self, cert):
+		rowNr = self.findCertRow(cert)
+		if rowNr is not None:
+			self.ui.adminTable.removeRow(rowNr)
+
+	def setCertRow(self, rowNr, cert):
+		# name
+		self.ui.adminTable.item(rowNr, 1).setText('%s' % (cert.subject.commonName,))
+		# email
+		self.ui.adminTable.item(rowNr, 2).setText(cert.subject.emailAddress)
+		# serial number
+		self.ui.adminTable.item(rowNr, 3).setText('%s' % (cert.serialNumber,))
+		# valid until?
+		item = self.ui.adminTable.item(rowNr, 4)
+		if cert.notAfter is not None:
+			item.setText(cert.notAfter.strftime('%d.%m.%Y %H:%M:%S'))
+		else:
+			item.setText('')
+		# status
+		item = self.ui.adminTable.item(rowNr, 5)
+		if cert.state == flscertification.FLSCertificate.STATE_OK:
+			item.setIcon(MailTableModel.getIcon(":/status/ok.png"))
+			item.setText(_translate("MainWindow", "OK", None))
+		elif cert.state == flscertification.FLSCertificate.STATE_ADDED:
+			item.setIcon(MailTableModel.getIcon(":/status/state_add.png"))
+			item.setText(_translate("MainWindow", "wird hinzugefügt", None))
+		elif cert.state == flscertification.FLSCertificate.STATE_DELETE:
+			item.setIcon(MailTableModel.getIcon(":/status/trash.png"))
+			item.setText(_translate("MainWindow", "wird gelöscht", None))
+		elif cert.state == flscertification.FLSCertificate.STATE_EXPIRED:
+			item.setIcon(MailTableModel.getIcon(":/status/expired.png"))
+			item.setText(_translate("MainWindow", "ist abgelaufen", None))
+		else:
+			item.setIcon(MailTableModel.getIcon(":/status/warning.png"))
+			item.setText(_translate("MainWindow", "Unbekannt", None))
+
 	def loadMails(self, interactive = False):
 		if interactive:
 			try:
-				data = self.rpc.getMails()
-				self.mailListLoaded(data)
+				self.mailChangesLoaded(getChanges(self.rpc, 'Mails', self.mailRevision))
 			except ssl.CertificateError as e:
 				log.error('Possible attack! Server Certificate is wrong! (%s)' % (e,))
 				QMessageBox.critical(
@@ -2202,14 +3172,58 @@ class FLScpMainWindow(QMainWindow):
 				self.disableProgressBar()
 		else:
 			self.enableProgressBar(self.ui.tabMail, _translate('MainWindow', 'Loading mail list...', None))
-			dataLoader = MailListLoader(self.rpc)
-			dataLoader.dataLoaded.connect(self.mailListLoaded)
+			dataLoader = MailListLoader(self.rpc, self.mailRevision)
+			dataLoader.dataLoadedDict.connect(self.mailChangesLoaded)
 			dataLoader.certError.connect(self.dataLoadCertError)
 			dataLoader.socketError.connect(self.dataLoadSocketError)
 			dataLoader.protocolError.connect(self.dataLoadProtocolError)
 			dataLoader.unknownError.connect(self.dataLoadError)
 			QThreadPool.globalInstance().start(dataLoader)
 
+	def mergeChanges(self, cache, changes):
+		# applies the changes of get*Since to cache (id -> dict) and returns
+		# the new revision.
+		if changes['full']:
+			cache.clear()
+		for item in changes['items']:
+			cache[item['id']] = item
+		for rowId in changes['deleted']:
+			cache.pop(rowId, None)
+
+		return changes['revision']
+
+	@pyqtSlot(dict)
+	def mailChangesLoaded(self, changes):
+		self.mailRevision = self.mergeChanges(self.mailData, changes)
+		ClientCache.getInstance().applyChanges('mails', changes)
+		log.debug('Loaded %i changed and %i deleted mails' % (len(changes['items']), len(changes['deleted'])))
+		if changes['full']:
+			self.mailListLoaded(sorted(self.mailData.values(), key=lambda f: f['id']))
+		else:
+			self.applyMailChanges(changes)
+			self.disableProgressBar()
+
+	def applyMailChanges(self, changes):
+		# only the changed accounts are replaced in the list, the model and the
+		# search index. Pending changes are dropped (like on a full reload).
+		items = dict((item['id'], item) for item in changes['items'])
+		for account in [f for f in self.mails if f.id is None or f.id not in self.mailData]:
+			self.mails.remove(account)
+			self.mailNotifier.itemRemoved.emit(account)
+
+		for (pos, account) in enumerate(self.mails):
+			if account.id in items or account.state != MailAccount.STATE_OK:
+				items.pop(account.id, None)
+				newAccount = MailAccount.fromDict(self.mailData[account.id])
+				self.mails[pos] = newAccount
+				self.mailNotifier.itemRemoved.emit(account)
+				self.mailNotifier.itemAdded.emit(newAccount)
+
+		for itemId in sorted(items.keys()):
+			account = MailAccount.fromDict(items[itemId])
+			self.mails.add(account)
+			self.mailNotifier.itemAdded.emit(account)
+
 	@pyqtSlot(list)
 	def mailListLoaded(self, data):
 		self.mails = MailAccountList()
@@ -2219,11 +3233,26 @@ class FLScpMainWindow(QMainWindow):
 		self.loadMailData()
 		self.disableProgressBar()
 
+	def mergeDomainChanges(self, changes):
+		self.domainRevision = self.mergeChanges(self.domainData, changes)
+		ClientCache.getInstance().applyChanges('domains', changes)
+		self.setDomains()
+
+	def setDomains(self):
+		self.domains = DomainList()
+		for item in sorted(self.domainData.values(), key=lambda f: f['id']):
+			self.domains.add(Domain.fromDict(item))
+
+	@pyqtSlot(dict)
+	def domainChangesLoaded(self, changes):
+		self.mergeDomainChanges(changes)
+		self.loadDomainData()
+		self.disableProgressBar()
+
 	def loadDomains(self, interactive = False):
 		self.domains = DomainList()
 		try:
-			for item in self.rpc.getDomains():
-				self.domains.add(Domain.fromDict(item))
+			self.mergeDomainChanges(getChanges(self.rpc, 'Domains', self.domainRevision))
 		except ssl.CertificateError as e:
 			log.error('Possible attack! Server Certificate is wrong! (%s)' % (e,))
 			QMessageBox.critical(
@@ -2330,6 +3359,7 @@ class FLScpMainWindow(QMainWindow):
 		fd.show()
 
 	def getCert(self, pubkey):
+		import OpenSSL
 		if not isinstance(pubkey, OpenSSL.crypto.X509):
 			raise TypeError('Expected X509 object of OpenSSL!')
 
@@ -2364,6 +3394,7 @@ class FLScpMainWindow(QMainWindow):
 
 	@pyqtSlot(list)
 	def certificatesSelected(self, files):
+		import OpenSSL
 		for f in files:
 			pubkey = None
 			cnt = None
@@ -2472,74 +3503,29 @@ class FLScpMainWindow(QMainWindow):
 					continue
 
 				self.certs.add(cert)
-				# now display in table?
-				rowNr = self.ui.adminTable.rowCount()
-				self.ui.adminTable.insertRow(rowNr)
-				# number
-				item = QTableWidgetItem()
-				item.setText('%s' % (rowNr + 1,))
-				self.ui.adminTable.setVerticalHeaderItem(rowNr, item)
-				# hash (to identify later)
-				item = QTableWidgetItem()
-				item.setText('%s' % (cert.__hash__(),))
-				self.ui.adminTable.setItem(rowNr, 0, item)
-				# name
-				item = QTableWidgetItem()
-				item.setText('%s' % (cert.subject.commonName,))
-				self.ui.adminTable.setItem(rowNr, 1, item)
-				# email
-				item = QTableWidgetItem()
-				item.setText(cert.subject.emailAddress)
-				self.ui.adminTable.setItem(rowNr, 2, item)
-				# serial number
-				item = QTableWidgetItem()
-				item.setText('%s' % (cert.serialNumber,))
-				self.ui.adminTable.setItem(rowNr, 3, item)
-				# expires on...
-				item = QTableWidgetItem()
-				if cert.notAfter is not None:
-					item.setText(cert.notAfter.strftime('%d.%m.%Y %H:%M:%S'))
-				else:
-					item.setText('')
-				self.ui.adminTable.setItem(rowNr, 4, item)
-				# status
-				item = QTableWidgetItem()
-				icon = QIcon()
-				if cert.state == flscertification.FLSCertificate.STATE_OK:
-					icon.addPixmap(QPixmap(":/status/ok.png"), QIcon.Normal, QIcon.Off)
-					item.setText(_translate("MainWindow", "OK", None))
-				elif cert.state == flscertification.FLSCertificate.STATE_ADDED:
-					icon.addPixmap(QPixmap(":/status/state_add.png"), QIcon.Normal, QIcon.Off)
-					item.setText(_translate("MainWindow", "wird hinzugefügt", None))
-				elif cert.state == flscertification.FLSCertificate.STATE_DELETE:
-					icon.addPixmap(QPixmap(":/status/trash.png"), QIcon.Normal, QIcon.Off)
-					item.setText(_translate("MainWindow", "wird gelöscht", None))
-				else:
-					icon.addPixmap(QPixmap(":/status/warning.png"), QIcon.Normal, QIcon.Off)
-					item.setText(_translate("MainWindow", "Unbekannt", None))
-				item.setIcon(icon)
-				self.ui.adminTable.setItem(rowNr, 5, item)
+				self.certNotifier.itemAdded.emit(cert)
 
 	@pyqtSlot()
 	def deleteCertificates(self):
 		nrSelected = len(self.ui.adminTable.selectionModel().selectedRows())
 		log.info('Have to delete %i items!' % (nrSelected,))
+		certs = []
 		for selectedRow in self.ui.adminTable.selectionModel().selectedRows():
 			nr = int(self.ui.adminTable.item(selectedRow.row(), 0).text())
-			cert = self.certs.findByHash(nr)
+			certs.append(self.certs.findByHash(nr))
+
+		for cert in certs:
 			if cert is not None:
 				if cert.state == flscertification.FLSCertificate.STATE_ADDED:
 					# we cancel pending action.
-					self.ui.adminTable.removeRow(selectedRow.row())		
 					self.certs.remove(cert)
+					self.certNotifier.itemRemoved.emit(cert)
 				else:
 					# do not remove (because we want to see the pending action!)
 					cert.state = flscertification.FLSCertificate.STATE_DELETE
+					self.certNotifier.itemChanged.emit(cert)
 					log.info('state set to delete')
 
-		if nrSelected > 0:
-			self.loadCertData()
-
 	@pyqtSlot()
 	def reloadMailTable(self):
 		self.enableProgressBar()
@@ -2583,83 +3569,66 @@ class FLScpMainWindow(QMainWindow):
 		self.disableProgressBar()
 
 	def loadMailData(self):
-		self.ui.mailTable.setSortingEnabled(False)
-		self.ui.mailTable.setRowCount(0)
+		self.mailModel.setAccounts(self.mails)
+		self.buildMailIndex()
 
-		for row in self.mails:
-			rowNr = self.ui.mailTable.rowCount()
-			self.ui.mailTable.insertRow(rowNr)
-			item = QTableWidgetItem()
-			try:
-				item.setText('%s' % (row.id,))
-			except Exception as e:
-				log.warning('%s' % (e,))
-				return
-			item.setTextAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter)
-			self.ui.mailTable.setItem(rowNr, 0, item)
-			# mail
-			item = QTableWidgetItem()
-			item.setText(row.getMailAddress())
-			self.ui.mailTable.setItem(rowNr, 1, item)
-			# type
-			item = QTableWidgetItem()
-			icon = QIcon()
-			if row.type == MailAccount.TYPE_ACCOUNT:
-				icon.addPixmap(QPixmap(":/typ/account.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "Konto", None))
-			elif row.type == MailAccount.TYPE_FWDSMTP:
-				icon.addPixmap(QPixmap(":/typ/fwdsmtp.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "Weiterleitung mit SMTP", None))
-			else:
-				icon.addPixmap(QPixmap(":/typ/forward.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "Weiterleitung", None))
-			item.setIcon(icon)
-			self.ui.mailTable.setItem(rowNr, 2, item)
-			# quota (human readable)
-			item = QTableWidgetItem()
-			item.setText(row.getQuotaReadable())
-			item.setTextAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter)
-			self.ui.mailTable.setItem(rowNr, 3, item)
-			# quotaSts (in percent)
-			item = QTableWidgetItem()
-			item.setText(row.getQuotaStatus())
-			item.setTextAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter)
-			self.ui.mailTable.setItem(rowNr, 4, item)
-			# Enabled / Disabled
-			item = QTableWidgetItem()
-			if row.enabled:
-				item.setText(_translate('MainWindow', 'Ja'))
-			else:
-				item.setText(_translate('MainWindow', 'Nein'))
-			item.setTextAlignment(QtCore.Qt.AlignCenter|QtCore.Qt.AlignVCenter)
-			self.ui.mailTable.setItem(rowNr, 5, item)
-			# status
-			item = QTableWidgetItem()
-			icon = QIcon()
-			if row.state == MailAccount.STATE_OK:
-				icon.addPixmap(QPixmap(":/status/ok.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "OK", None))
-			elif row.state == MailAccount.STATE_CHANGE:
-				icon.addPixmap(QPixmap(":/status/waiting.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "wird geändert", None))
-			elif row.state == MailAccount.STATE_CREATE:
-				icon.addPixmap(QPixmap(":/status/state_add.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "wird hinzugefügt", None))
-			elif row.state == MailAccount.STATE_DELETE:
-				icon.addPixmap(QPixmap(":/status/trash.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "wird gelöscht", None))
-			elif row.state == MailAccount.STATE_QUOTA:
-				icon.addPixmap(QPixmap(":/status/general_process.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "Quota wird neuberechnet", None))
+	def getMailTypeLabels(self):
+		return dict(
+			(f, self.mailModel.getTypeInfo(f)[1])
+			for f in [MailAccount.TYPE_ACCOUNT, MailAccount.TYPE_FORWARD, MailAccount.TYPE_FWDSMTP]
+		)
+
+	def buildMailIndex(self):
+		self.mailIndexGeneration += 1
+		self.mailIndex = None
+		self.mailIndexPending = {}
+		dataLoader = MailIndexLoader(list(self.mails), self.getMailTypeLabels(), self.mailIndexGeneration)
+		dataLoader.dataLoadedDict.connect(self.mailIndexLoaded)
+		QThreadPool.globalInstance().start(dataLoader)
+
+	@pyqtSlot(dict)
+	def mailIndexLoaded(self, data):
+		if data['generation'] != self.mailIndexGeneration:
+			# the list was loaded again meanwhile.
+			return
+
+		self.mailIndex = data['index']
+		log.debug('Built search index of %i mails' % (len(self.mailIndex),))
+		pending = self.mailIndexPending
+		self.mailIndexPending = {}
+		for (key, account) in pending.items():
+			if account is None:
+				self.mailIndex.remove(key)
 			else:
-				icon.addPixmap(QPixmap(":/status/warning.png"), QIcon.Normal, QIcon.Off)
-				item.setText(_translate("MainWindow", "Unbekannt", None))
-			item.setIcon(icon)
-			self.ui.mailTable.setItem(rowNr, 6, item)
+				self.indexMail(account)
+
+		if len(self.ui.search.text()) > 0:
+			self.searchMail()
+
+	@pyqtSlot(object)
+	def indexMail(self, account):
+		if self.mailIndex is None:
+			self.mailIndexPending[getMailKey(account)] = account
+			return
 
-		self.ui.mailTable.setSortingEnabled(True)
+		self.mailIndex.add(getMailKey(account), getMailSearchDocument(account, self.getMailTypeLabels()))
 		if len(self.ui.search.text()) > 0:
-			self.filterMail(self.ui.search.text())
+			self.mailSearchTimer.start()
+
+	@pyqtSlot(object)
+	def unindexMail(self, account):
+		if self.mailIndex is None:
+			self.mailIndexPending[getMailKey(account)] = None
+			return
+
+		self.mailIndex.remove(getMailKey(account))
+
+	def selectedMails(self):
+		accounts = []
+		for index in self.ui.mailTable.selectionModel().selectedRows():
+			accounts.append(self.mailModel.getAccount(self.mailProxy.mapToSource(index).row()))
+
+		return accounts
 
 	def selectHost(self):
 		mf = HostSelectionForm(self.splash)
@@ -2668,10 +3637,13 @@ class FLScpMainWindow(QMainWindow):
 		if not mf.aborted:
 			log.info('Host was selected: %s' % (mf.selectedHost,))
 			conf.set('options', 'currenthost', mf.selectedHost)
+			# switch to the cache of the selected host.
+			self.openCache()
 			return True
 		else:
 			log.info('No host was selected! Aborting...')
 			conf.set('options', 'currenthost', '')
+			ClientCache.getInstance().close()
 			return False
 
 	@pyqtSlot()
@@ -2683,83 +3655,70 @@ class FLScpMainWindow(QMainWindow):
 		if not mf.aborted and mf.account is not None:
 			log.info('Mail created')
 			self.mails.add(mf.account)
-			self.loadMailData()
+			self.mailNotifier.itemAdded.emit(mf.account)
 		else:
 			log.info('Mail creation aborted')
 
 	@pyqtSlot()
 	def editMail(self):
 		log.info('Clicked "edit mail"')
-		for selectedRow in self.ui.mailTable.selectionModel().selectedRows():
-			nr = self.ui.mailTable.item(selectedRow.row(), 0).text()
-			account = self.mails.findById(nr)
+		for account in self.selectedMails():
 			if account is not None:
 				mf = MailForm(self, account)
 				mf.show()
 				mf.exec_()
-
-		self.loadMailData()
+				self.mailNotifier.itemChanged.emit(account)
 
 	@pyqtSlot()
 	def calculateMailQuota(self):
 		log.info('Clicked "calculate mail quota"')
-		for selectedRow in self.ui.mailTable.selectionModel().selectedRows():
-			nr = self.ui.mailTable.item(selectedRow.row(), 0).text()
-			account = self.mails.findById(nr)
+		for account in self.selectedMails():
 			account.markQuotaCalc()
+			self.mailNotifier.itemChanged.emit(account)
 			log.debug('Marked mail to recalculation.')
 
-		self.loadMailData()
-
 	@pyqtSlot()
 	def deleteMail(self):
 		nrSelected = len(self.ui.mailTable.selectionModel().selectedRows())
 		log.info('Have to delete %i items!' % (nrSelected,))
 
-		for selectedRow in self.ui.mailTable.selectionModel().selectedRows():
-			nr = self.ui.mailTable.item(selectedRow.row(), 0).text()
-			account = self.mails.findById(nr)
+		for account in self.selectedMails():
 			if account is not None:
 				if account.state == MailAccount.STATE_CREATE:
 					# we cancel pending action.
-					self.ui.mailTable.removeRow(selectedRow.row())		
 					self.mails.remove(account)
+					self.mailNotifier.itemRemoved.emit(account)
 				else:
 					# do not remove (because we want to see the pending action!)
 					account.state = MailAccount.STATE_DELETE
+					self.mailNotifier.itemChanged.emit(account)
 					log.info('state set to delete')
 
-		self.loadMailData()
-
 	@pyqtSlot()
 	def toggleStatusMail(self):
 		nrSelected = len(self.ui.mailTable.selectionModel().selectedRows())
 		log.info('Have to toggle %i items!' % (nrSelected,))
 
-		for selectedRow in self.ui.mailTable.selectionModel().selectedRows():
-			nr = self.ui.mailTable.item(selectedRow.row(), 0).text()
-			account = self.mails.findById(nr)
+		for account in self.selectedMails():
 			if account is not None:
 				account.toggleStatus()
+				self.mailNotifier.itemChanged.emit(account)
 
-		self.loadMailData()
-
-	@pyqtSlot(int, int)
-	def selectedMail(self, row, col):
-		nr = self.ui.mailTable.item(row, 0).text()
-		account = self.mails.findById(nr)
+	@pyqtSlot(QModelIndex)
+	def selectedMail(self, index):
+		account = self.mailModel.getAccount(self.mailProxy.mapToSource(index).row())
 		if account is not None:
 			mf = MailForm(self, account)
 			mf.show()
 			mf.exec_()
-
-		self.loadMailData()
+			self.mailNotifier.itemChanged.emit(account)
 
 
 	def loadDomainData(self):
 		self.ui.domainTree.setSortingEnabled(False)
 		# delete all entries on start!
 		self.ui.domainTree.clear()
+		self.domainItems = {}
 
 		for row in self.domains.iterTlds():
 			self.insertDomainData(row)
@@ -2774,6 +3733,21 @@ class FLScpMainWindow(QMainWindow):
 		except Exception as e:
 			log.warning('%s' % (e,))
 			return
+		self.setDomainItem(item, row)
+		self.domainItems[getDomainKey(row)] = item
+
+		if parent is None:
+			self.ui.domainTree.addTopLevelItem(item)
+		else:
+			parent.addChild(item)
+
+		# has item chils? (a new domain has no id and no childs)
+		if row.id is None:
+			return
+		for childs in self.domains.iterByParent(row.id):
+			self.insertDomainData(childs, item)
+
+	def setDomainItem(self, item, row):
 		#item.setTextAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter)
 		# domain
 		item.setText(1, row.name)
@@ -2784,32 +3758,46 @@ class FLScpMainWindow(QMainWindow):
 		# ipv6
 		item.setText(4, row.ipv6)
 		# state
-		icon = QIcon()
 		if row.state == Domain.STATE_OK:
-			icon.addPixmap(QPixmap(":/status/ok.png"), QIcon.Normal, QIcon.Off)
+			item.setIcon(5, MailTableModel.getIcon(":/status/ok.png"))
 			item.setText(5, _translate("MainWindow", "OK", None))
 		elif row.state == Domain.STATE_CHANGE:
-			icon.addPixmap(QPixmap(":/status/waiting.png"), QIcon.Normal, QIcon.Off)
+			item.setIcon(5, MailTableModel.getIcon(":/status/waiting.png"))
 			item.setText(5, _translate("MainWindow", "wird geändert", None))
 		elif row.state == Domain.STATE_CREATE:
-			icon.addPixmap(QPixmap(":/status/state_add.png"), QIcon.Normal, QIcon.Off)
+			item.setIcon(5, MailTableModel.getIcon(":/status/state_add.png"))
 			item.setText(5, _translate("MainWindow", "wird hinzugefügt", None))
 		elif row.state == Domain.STATE_DELETE:
-			icon.addPixmap(QPixmap(":/status/trash.png"), QIcon.Normal, QIcon.Off)
+			item.setIcon(5, MailTableModel.getIcon(":/status/trash.png"))
 			item.setText(5, _translate("MainWindow", "wird gelöscht", None))
 		else:
-			icon.addPixmap(QPixmap(":/status/warning.png"), QIcon.Normal, QIcon.Off)
+			item.setIcon(5, MailTableModel.getIcon(":/status/warning.png"))
 			item.setText(5, _translate("MainWindow", "Unbekannt", None))
-		item.setIcon(5, icon)
 
-		if parent is None:
-			self.ui.domainTree.addTopLevelItem(item)
-		else:
-			parent.addChild(item)
+	@pyqtSlot(object)
+	def insertDomainItem(self, domain):
+		sorting = self.ui.domainTree.isSortingEnabled()
+		self.ui.domainTree.setSortingEnabled(False)
+		parent = self.domains.findById(domain.parent) if domain.parent is not None else None
+		self.insertDomainData(domain, self.domainItems.get(getDomainKey(parent)) if parent is not None else None)
+		self.ui.domainTree.setSortingEnabled(sorting)
+
+	@pyqtSlot(object)
+	def updateDomainItem(self, domain):
+		item = self.domainItems.get(getDomainKey(domain))
+		if item is not None:
+			self.setDomainItem(item, domain)
+
+	@pyqtSlot(object)
+	def removeDomainItem(self, domain):
+		item = self.domainItems.pop(getDomainKey(domain), None)
+		if item is None:
+			return
 
-		# has item chils?
-		for childs in self.domains.iterByParent(row.id):
-			self.insertDomainData(childs, item)
+		if item.parent() is not None:
+			item.parent().removeChild(item)
+		else:
+			self.ui.domainTree.takeTopLevelItem(self.ui.domainTree.indexOfTopLevelItem(item))
 
 	@pyqtSlot()
 	def addDomain(self):
@@ -2844,7 +3832,7 @@ class FLScpMainWindow(QMainWindow):
 				nD = de.domain
 				if nD is not None:
 					self.domains.add(nD)
-					self.loadDomainData()
+					self.domainNotifier.itemAdded.emit(nD)
 			else:
 				log.debug('No... domain creation was cancelled!')
 
@@ -2875,7 +3863,7 @@ class FLScpMainWindow(QMainWindow):
 					de.exec_()
 					if de.accepted:
 						log.debug('Yes... domain can be saved. Can we?')
-						self.loadDomainData()
+						self.domainNotifier.itemChanged.emit(domain)
 					else:
 						log.debug('No... domain editing was cancelled!')
 						# so do nothing! ;)
@@ -3031,21 +4019,20 @@ class FLScpMainWindow(QMainWindow):
 				if domain is not None:
 					if domain.state == Domain.STATE_CREATE:
 						# we cancel pending action.
-						self.ui.domainTree.removeItemWidget(selectedRow)
 						self.domains.remove(domain)
+						self.domainNotifier.itemRemoved.emit(domain)
 					else:
 						# do not remove (because we want to see the pending action!)
 						# check possibility!
 						# this means: are there mails with this domain?
 						if domain.isDeletable(self.domains, self.mails):
 							domain.state = Domain.STATE_DELETE
+							self.domainNotifier.itemChanged.emit(domain)
 							log.info('state set to delete')
 						else:
 							log.error('cannot delete domain %s!' % (domain.name,))
 							continue
 
-			self.loadDomainData()
-
 	@pyqtSlot(bool)
 	def deleteDNSEntries(self, triggered = False, activeTable = None):
 		if activeTable is None:
@@ -3252,6 +4239,10 @@ class FLScpMainWindow(QMainWindow):
 		self.ui.dnsTable[domain.id] = tableDNS
 		self.ui.dnsNotifier[domain.id] = []
 		self.ui.tabDNS.addTab(tabDomainDNS, domain.name)
+		if domain.id in self.dnsData:
+			# cached - shown until the changes are loaded.
+			self.setDnsEntries(domain.id)
+			self.loadDnsData(domain.id)
 		self.reloadDnsDataByDomain(domain.id, tab=tabDomainDNS)
 
 	@pyqtSlot()
@@ -3306,10 +4297,7 @@ class FLScpMainWindow(QMainWindow):
 				pending = False
 	
 		if not pending or not interactive:
-			# remove all entries for domain id
-			self.dns.removeByDomain(domainId)
-
-			dataLoader = DnsListLoader(self.rpc, domainId)
+			dataLoader = DnsListLoader(self.rpc, domainId, self.dnsRevision.get(domainId))
 			dataLoader.dataLoadedDict.connect(self.dnsDataLoaded)
 			dataLoader.certError.connect(self.dataLoadCertError)
 			dataLoader.socketError.connect(self.dataLoadSocketError)
@@ -3320,18 +4308,27 @@ class FLScpMainWindow(QMainWindow):
 	@pyqtSlot(int, list)
 	def dnsDataLoaded(self, data):
 
-		for domainId, entries in data.items():
-			for f in entries:
-				d = Dns.fromDict(f)
-				# check if d already in dns
-				if d not in self.dns:
-					self.dns.add(d)
+		for domainId, changes in data.items():
+			cache = self.dnsData.setdefault(domainId, {})
+			self.dnsRevision[domainId] = self.mergeChanges(cache, changes)
+			if domainId is not None:
+				ClientCache.getInstance().applyChanges('dns-%i' % (domainId,), changes)
 
+			self.setDnsEntries(domainId)
 			if domainId is not None:
 				self.loadDnsData(domainId)
 
 		self.disableProgressBar()
 
+	def setDnsEntries(self, domainId):
+		# replace all entries for domain id (pending changes are dropped)
+		if domainId is not None:
+			self.dns.removeByDomain(domainId)
+		else:
+			self.dns = DNSList()
+		for f in sorted(self.dnsData[domainId].values(), key=lambda f: f['id']):
+			self.dns.add(Dns.fromDict(f))
+
 	def loadDnsData(self, domainId):
 		if domainId not in self.ui.dnsTabs or \
 			domainId not in self.ui.dnsTable:
@@ -3732,189 +4729,204 @@ class FLScpMainWindow(QMainWindow):
 
 	@pyqtSlot()
 	def commitDomainData(self):
-		editDNS = False
+		# domains and the dns entries of all open dns tabs in one request.
+		batch = RpcBatch(self.rpc)
+		if not self.addDnsSaves(batch):
+			return
+		self.addDomainSaves(batch)
+		self.commitBatch(batch)
 
-		elms = self.ui.tabDNS.currentWidget()
-		# first we think, that the selected element contains tree widget:
-		activeTable = elms.findChild(QTreeWidget)
+	@pyqtSlot(bool)
+	def saveDNSEntries(self, triggered = False, activeTable = None):
 		if activeTable is None:
-			editDNS = True
-			activeTable = elms.findChild(QTableWidget)
+			activeTable = self.ui.tabDNS.currentWidget().findChild(QTableWidget)
 			if activeTable is None:
 				return
 
-		if editDNS:
-			self.saveDNSEntries(activeTable=activeTable)
-		else:
-			domainList = DomainList()
-			for domain in self.domains:
-				if domain is not None:
-					if domain.state == Domain.STATE_CREATE:
-						# we cancel pending creation action.
-						#self.ui.domainTree.removeItemWidget(selectedRow)
-						self.domains.remove(domain)
-					else:
-						# do not remove (because we want to see the pending action!)
-						# check possibility!
-						# this means: are there mails with this domain?
-						if domain.state == Domain.STATE_DELETE and not domain.isDeletable(self.domains, self.mails):
-							log.error('cannot delete domain %s!' % (domain.name,))
-							continue
-						else:
-							domainList.add(domain)
+		domainId = activeTable.property('domainId')
+		if domainId is None:
+			return
 
-			if len(domainList) > 0:
-				try:
-					self.rpc.saveDomains(domainList)
-				except TypeError as e:
-					log.error('Uhhh we tried to send things the server does not understood (%s)' % (e,))
-					QMessageBox.warning(
-							self, _translate('MainWindow', 'Datenfehler', None), 
-							_translate('MainWindow', 
-								'Bei der Kommunikation mit dem Server ist ein Datenfehler aufgetreten!', 
-								None),
-							QMessageBox.Ok, QMessageBox.Ok
-						)
-				except ssl.CertificateError as e:
-					log.error('Possible attack! Server Certificate is wrong! (%s)' % (e,))
-					QMessageBox.critical(
-						self, _translate('MainWindow', 'Warnung', None), 
-						_translate('MainWindow', 
-							'Potentieller Angriff! Server-Zertifikat ist fehlerhaft! Bitte informieren Sie Ihren Administrator!', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-				except socket.error as e:
-					QMessageBox.critical(
-						self, _translate('MainWindow', 'Warnung', None), 
-						_translate('MainWindow', 
-							'Verbindung zum Server nicht möglich. Bitte versuchen Sie es später noch einmal.', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-				except xmlrpc.client.ProtocolError as e:
-					if e.errcode == 403:
-						log.warning('Missing rights for loading mails (%s)' % (e,))
-						QMessageBox.warning(
-							self, _translate('MainWindow', 'Fehlende Rechte', None), 
-							_translate('MainWindow', 
-								'Sie haben nicht ausreichend Rechte!', 
-								None),
-							QMessageBox.Ok, QMessageBox.Ok
-						)
-					else:
-						log.warning('Unexpected error in protocol: %s' % (e,))
-						QMessageBox.warning(
-							self, _translate('MainWindow', 'Unbekannter Fehler', None), 
-							_translate('MainWindow', 
-								'Unbekannter Fehler in der Kommunikation mit dem Server aufgetreten.', 
-								None),
-							QMessageBox.Ok, QMessageBox.Ok
-						)
+		# the other dns tabs with changes are saved with the same request.
+		batch = RpcBatch(self.rpc)
+		if self.addDnsSaves(batch):
+			self.commitBatch(batch)
+
+	@pyqtSlot()
+	def commitAll(self):
+		batch = RpcBatch(self.rpc)
+		if not self.addDnsSaves(batch):
+			return
+		self.addDomainSaves(batch)
+		self.addMailSaves(batch)
+		self.addCertSaves(batch)
+		self.commitBatch(batch)
+
+	def addDomainSaves(self, batch):
+		domainList = DomainList()
+		for domain in list(self.domains):
+			if domain is not None:
+				if domain.state == Domain.STATE_CREATE:
+					# we cancel pending creation action.
+					self.domains.remove(domain)
+				elif domain.state == Domain.STATE_DELETE and not domain.isDeletable(self.domains, self.mails):
+					# this means: are there mails with this domain?
+					log.error('cannot delete domain %s!' % (domain.name,))
 				else:
-					log.debug('Saved with success. Now reload domain data.')
-					try:
-						self.loadDomains()
-					except xmlrpc.client.Fault as e:
-						log.critical('Could not load domains because of %s' % (e,))
-						QMessageBox.critical(
-							self, _translate('MainWindow', 'Daten nicht ladbar', None), 
-							_translate('MainWindow', 
-								'Die Domains konnten nicht abgerufen werden.', 
-								None),
-							QMessageBox.Ok, QMessageBox.Ok
-						)
-					else:
-						self.loadDomainData()
-						
-		self.disableProgressBar()
+					# do not remove (because we want to see the pending action!)
+					domainList.add(domain)
 
-	@pyqtSlot(bool)
-	def saveDNSEntries(self, triggered = False, activeTable = None):
-		if activeTable is None:
-			activeTable = self.ui.tabDNS.currentWidget().findChild(QTableWidget)
-			if activeTable is None:
-				return
+		if len(domainList) > 0:
+			batch.add('domains', _translate('MainWindow', 'Domains', None), 'saveDomains', domainList)
 
-		# first: check whether all dns entries are valid!
-		domainId = activeTable.property('domainId')
-		if domainId is None:
-			return
+	def addDnsSaves(self, batch):
+		# every open dns tab with pending changes. Returns False if a table
+		# contains errors - then nothing is saved.
+		for domainId in getattr(self.ui, 'dnsTable', {}).keys():
+			entries = list(self.dns.iterByDomain(domainId))
+			if all(f.state == Dns.STATE_OK for f in entries):
+				continue
 
-		dList = DNSList()
-		errors = False
-		for dns in self.dns.iterByDomain(domainId):
-			if not dns.validate():
-				errors = True
-				break
-			else:
+			if not all(f.validate() for f in entries):
+				QMessageBox.warning(
+					self, _translate('MainWindow', 'DNs-Fehler', None), 
+					_translate('MainWindow', 
+						'Die DNS-Tabelle enthält Fehler und kann nicht gespeichert werden.', 
+						None),
+					QMessageBox.Ok, QMessageBox.Ok
+				)
+				return False
+
+			dList = DNSList()
+			for dns in entries:
 				dList.add(dns)
+			domain = self.domains.findById(domainId)
+			batch.add(
+				('dns', domainId), 
+				_translate('MainWindow', 'DNS-Einträge von {}', None, domain.name if domain is not None else domainId),
+				'saveDns', domainId, dList
+			)
+
+		return True
 
-		if errors:
+	def addMailSaves(self, batch):
+		data = MailAccountList()
+		for f in self.mails:
+			if f.state != MailAccount.STATE_OK:
+				data.add(f)
+
+		if len(data) > 0:
+			batch.add('mails', _translate('MainWindow', 'E-Mail-Konten', None), 'saveMails', data)
+
+	def addCertSaves(self, batch):
+		data = flscertification.FLSCertificateList()
+		for f in self.certs:
+			if f.state != flscertification.FLSCertificate.STATE_OK:
+				data.add(f)
+
+		if len(data) > 0:
+			batch.add('certs', _translate('MainWindow', 'Zertifikate', None), 'saveCerts', data.__serialize__())
+
+	def batchProgress(self, done, total):
+		self.ui.progress.setMaximum(total)
+		self.ui.progress.setValue(done)
+		self.ui.statusbar.showMessage(_translate('MainWindow', 'Speichere Änderungen ({}/{})...', None).format(done, total))
+		self.app.processEvents()
+
+	def commitBatch(self, batch):
+		if len(batch) <= 0:
+			return
+
+		self.enableProgressBar()
+		results = None
+		try:
+			results = batch.run(self.batchProgress)
+		except TypeError as e:
+			log.error('Uhhh we tried to send things the server does not understood (%s)' % (e,))
 			QMessageBox.warning(
-				self, _translate('MainWindow', 'DNs-Fehler', None), 
+					self, _translate('MainWindow', 'Datenfehler', None), 
+					_translate('MainWindow', 
+						'Bei der Kommunikation mit dem Server ist ein Datenfehler aufgetreten!', 
+						None),
+					QMessageBox.Ok, QMessageBox.Ok
+				)
+		except ssl.CertificateError as e:
+			log.error('Possible attack! Server Certificate is wrong! (%s)' % (e,))
+			QMessageBox.critical(
+				self, _translate('MainWindow', 'Warnung', None), 
 				_translate('MainWindow', 
-					'Die DNS-Tabelle enthält Fehler und kann nicht gespeichert werden.', 
+					'Potentieller Angriff! Server-Zertifikat ist fehlerhaft! Bitte informieren Sie Ihren Administrator!', 
 					None),
 				QMessageBox.Ok, QMessageBox.Ok
 			)
-			return
-
-		# All is ok. Now save (but only for given domain!)
-		self.enableProgressBar()
-		if len(dList) > 0:
-			try:
-				self.rpc.saveDns(domainId, dList)
-			except TypeError as e:
-				log.error('Uhhh we tried to send things the server does not understood (%s)' % (e,))
+		except socket.error as e:
+			QMessageBox.critical(
+				self, _translate('MainWindow', 'Warnung', None), 
+				_translate('MainWindow', 
+					'Verbindung zum Server nicht möglich. Bitte versuchen Sie es später noch einmal.', 
+					None),
+				QMessageBox.Ok, QMessageBox.Ok
+			)
+		except xmlrpc.client.ProtocolError as e:
+			if e.errcode == 403:
+				log.warning('Missing rights for saving (%s)' % (e,))
 				QMessageBox.warning(
-						self, _translate('MainWindow', 'Datenfehler', None), 
-						_translate('MainWindow', 
-							'Bei der Kommunikation mit dem Server ist ein Datenfehler aufgetreten!', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-			except ssl.CertificateError as e:
-				log.error('Possible attack! Server Certificate is wrong! (%s)' % (e,))
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Warnung', None), 
+					self, _translate('MainWindow', 'Fehlende Rechte', None), 
 					_translate('MainWindow', 
-						'Potentieller Angriff! Server-Zertifikat ist fehlerhaft! Bitte informieren Sie Ihren Administrator!', 
+						'Sie haben nicht ausreichend Rechte!', 
 						None),
 					QMessageBox.Ok, QMessageBox.Ok
 				)
-			except socket.error as e:
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Warnung', None), 
+			else:
+				log.warning('Unexpected error in protocol: %s' % (e,))
+				QMessageBox.warning(
+					self, _translate('MainWindow', 'Unbekannter Fehler', None), 
 					_translate('MainWindow', 
-						'Verbindung zum Server nicht möglich. Bitte versuchen Sie es später noch einmal.', 
+						'Unbekannter Fehler in der Kommunikation mit dem Server aufgetreten.', 
 						None),
 					QMessageBox.Ok, QMessageBox.Ok
 				)
-			except xmlrpc.client.ProtocolError as e:
-				if e.errcode == 403:
-					log.warning('Missing rights for loading mails (%s)' % (e,))
-					QMessageBox.warning(
-						self, _translate('MainWindow', 'Fehlende Rechte', None), 
+		finally:
+			self.ui.progress.setMaximum(0)
+			self.disableProgressBar()
+
+		if results is None:
+			return
+
+		# reload what was saved - failed parts keep their pending state.
+		failed = []
+		for (key, title, result, fault) in results:
+			if fault is not None:
+				failed.append(title)
+			elif key == 'domains':
+				try:
+					self.loadDomains()
+				except xmlrpc.client.Fault as e:
+					log.critical('Could not load domains because of %s' % (e,))
+					QMessageBox.critical(
+						self, _translate('MainWindow', 'Daten nicht ladbar', None), 
 						_translate('MainWindow', 
-							'Sie haben nicht ausreichend Rechte!', 
+							'Die Domains konnten nicht abgerufen werden.', 
 							None),
 						QMessageBox.Ok, QMessageBox.Ok
 					)
 				else:
-					log.warning('Unexpected error in protocol: %s' % (e,))
-					QMessageBox.warning(
-						self, _translate('MainWindow', 'Unbekannter Fehler', None), 
-						_translate('MainWindow', 
-							'Unbekannter Fehler in der Kommunikation mit dem Server aufgetreten.', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-
-			else:
-				self.reloadDnsDataByDomain(domainId, interactive=False)
+					self.loadDomainData()
+			elif key == 'mails':
+				self.loadMails()
+			elif key == 'certs':
+				self.loadCerts()
+			elif key[0] == 'dns':
+				self.reloadDnsDataByDomain(key[1], interactive=False, tab=self.ui.dnsTabs.get(key[1]))
 
-		self.disableProgressBar()
+		if len(failed) > 0:
+			QMessageBox.warning(
+				self, _translate('MainWindow', 'Warnung', None), 
+				_translate('MainWindow', 
+					'Folgende Änderungen konnten nicht gespeichert werden: {}', 
+					None, ', '.join(failed)),
+				QMessageBox.Ok, QMessageBox.Ok
+			)
 
 	@pyqtSlot()
 	def changelog(self):
@@ -3966,97 +4978,48 @@ class FLScpMainWindow(QMainWindow):
 
 	@pyqtSlot(str)
 	def filterMail(self, filterText):
-		log.debug('Filter for %s' % (filterText,))
-		row = 0
-		while row < self.ui.mailTable.rowCount():
-			if len(filterText) <= 0:
-				self.ui.mailTable.setRowHidden(row, False)
-			else:
-				match = False
-				col = 0
-				while col < self.ui.mailTable.columnCount():
-					if filterText in self.ui.mailTable.item(row, col).text():
-						match = True
-						break
-					col += 1
-				self.ui.mailTable.setRowHidden(row, not match)
-			row += 1
+		self.cancelMailSearch()
+		if len(filterText.strip()) <= 0:
+			self.mailSearchTimer.stop()
+			self.mailProxy.setMatches(None)
+		else:
+			# wait until the user stops typing.
+			self.mailSearchTimer.start()
+
+	def cancelMailSearch(self):
+		self.mailSearchSeq += 1
+		if self.mailSearchCancel is not None:
+			self.mailSearchCancel.set()
+			self.mailSearchCancel = None
 
 	@pyqtSlot()
-	def commitMailData(self):
-		self.enableProgressBar()
-		data = MailAccountList()
-		for f in self.mails:
-			if f.state != MailAccount.STATE_OK:
-				data.add(f)
+	def searchMail(self):
+		if self.mailIndex is None:
+			# started again as soon as the index is built.
+			return
 
-		if len(data) > 0:
-			try:
-				self.rpc.saveMails(data)
-			except TypeError as e:
-				log.error('Uhhh we tried to send things the server does not understood (%s)' % (e,))
-				print(data._items[0])
-				Printer(data._items[0])
-				log.debug('Tried to send: %s' % (str(data),))
-				QMessageBox.warning(
-						self, _translate('MainWindow', 'Datenfehler', None), 
-						_translate('MainWindow', 
-							'Bei der Kommunikation mit dem Server ist ein Datenfehler aufgetreten!', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-			except ssl.CertificateError as e:
-				log.error('Possible attack! Server Certificate is wrong! (%s)' % (e,))
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Warnung', None), 
-					_translate('MainWindow', 
-						'Potentieller Angriff! Server-Zertifikat ist fehlerhaft! Bitte informieren Sie Ihren Administrator!', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
-			except socket.error as e:
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Warnung', None), 
-					_translate('MainWindow', 
-						'Verbindung zum Server nicht möglich. Bitte versuchen Sie es später noch einmal.', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
-			except xmlrpc.client.ProtocolError as e:
-				if e.errcode == 403:
-					log.warning('Missing rights for loading mails (%s)' % (e,))
-					QMessageBox.warning(
-						self, _translate('MainWindow', 'Fehlende Rechte', None), 
-						_translate('MainWindow', 
-							'Sie haben nicht ausreichend Rechte!', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-				else:
-					log.warning('Unexpected error in protocol: %s' % (e,))
-					QMessageBox.warning(
-						self, _translate('MainWindow', 'Unbekannter Fehler', None), 
-						_translate('MainWindow', 
-							'Unbekannter Fehler in der Kommunikation mit dem Server aufgetreten.', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
+		self.cancelMailSearch()
+		filterText = self.ui.search.text()
+		log.debug('Filter for %s' % (filterText,))
+		self.mailSearchCancel = threading.Event()
+		dataLoader = MailSearchLoader(self.mailIndex, filterText, self.mailSearchSeq, self.mailSearchCancel)
+		dataLoader.dataLoadedDict.connect(self.mailSearchLoaded)
+		QThreadPool.globalInstance().start(dataLoader)
 
-			else:
-				try:
-					self.loadMails()
-				except xmlrpc.client.Fault as e:
-					log.critical('Could not load mails because of %s' % (e,))
-					QMessageBox.critical(
-						self, _translate('MainWindow', 'Daten nicht ladbar', None), 
-						_translate('MainWindow', 
-							'Die E-Mail-Konten konnten nicht abgerufen werden.', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-				else:
-					self.loadMailData()
-		self.disableProgressBar()
+	@pyqtSlot(dict)
+	def mailSearchLoaded(self, data):
+		if data['seq'] != self.mailSearchSeq:
+			# result of an old query
+			return
+
+		self.mailSearchCancel = None
+		self.mailProxy.setMatches(data['ids'])
+
+	@pyqtSlot()
+	def commitMailData(self):
+		batch = RpcBatch(self.rpc)
+		self.addMailSaves(batch)
+		self.commitBatch(batch)
 
 	def setupMailTable(self):
 		# create context menu
@@ -4078,68 +5041,9 @@ class FLScpMainWindow(QMainWindow):
 
 	@pyqtSlot()
 	def commitCertData(self):
-		self.enableProgressBar()
-		data = flscertification.FLSCertificateList()
-		for f in self.certs:
-			if f.state != flscertification.FLSCertificate.STATE_OK:
-				data.add(f)
-
-		if len(data) > 0:
-			try:
-				self.rpc.saveCerts(data.__serialize__())
-			except ssl.CertificateError as e:
-				log.error('Possible attack! Server Certificate is wrong! (%s)' % (e,))
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Warnung', None), 
-					_translate('MainWindow', 
-						'Potentieller Angriff! Server-Zertifikat ist fehlerhaft! Bitte informieren Sie Ihren Administrator!', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
-			except socket.error as e:
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Warnung', None), 
-					_translate('MainWindow', 
-						'Verbindung zum Server nicht möglich. Bitte versuchen Sie es später noch einmal.', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
-			except xmlrpc.client.Fault as e:
-				QMessageBox.critical(
-					self, _translate('MainWindow', 'Warnung', None), 
-					_translate('MainWindow', 
-						'Austausch von Daten mit dem Server ist fehlerhaft.', 
-						None),
-					QMessageBox.Ok, QMessageBox.Ok
-				)
-			except xmlrpc.client.ProtocolError as e:
-				if e.errcode == 403:
-					log.warning('Missing rights for loading mails (%s)' % (e,))
-					QMessageBox.warning(
-						self, _translate('MainWindow', 'Fehlende Rechte', None), 
-						_translate('MainWindow', 
-							'Sie haben nicht ausreichend Rechte!', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-				else:
-					log.warning('Unexpected error in protocol: %s' % (e,))
-					QMessageBox.warning(
-						self, _translate('MainWindow', 'Unbekannter Fehler', None), 
-						_translate('MainWindow', 
-							'Unbekannter Fehler in der Kommunikation mit dem Server aufgetreten.', 
-							None),
-						QMessageBox.Ok, QMessageBox.Ok
-					)
-			except TypeError as err:
-				for f in data:
-					Printer(f)
-				raise
-
-			else:
-				self.loadCerts()
-				self.loadCertData()
-		self.disableProgressBar()
+		batch = RpcBatch(self.rpc)
+		self.addCertSaves(batch)
+		self.commitBatch(batch)
 
 	def setupCertTable(self):
 		# create context menu
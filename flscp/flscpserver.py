@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
-# require: bsddb3, python-magic
+# require: bsddb3 (optional: python-magic, pyinotify)
 from logging.handlers import WatchedFileHandler
 from ansistrm import ColorizingStreamHandler
 from xmlrpc.server import SimpleXMLRPCServer
@@ -11,16 +11,23 @@ from xmlrpc.server import resolve_dotted_attribute
 from threading import Thread
 from socketserver import UnixStreamServer
 from distutils.version import StrictVersion as V
-import logging, os, sys, shlex, subprocess
+import logging, os, sys, shlex, subprocess, re
 import ssl, socketserver, socket, io, pickle, configparser, base64, stat
-import zipfile, tempfile, datetime, json, magic, gzip
-import atexit
+import datetime, json, time, xmlrpc.client
+import atexit, argparse
+from concurrent.futures import ThreadPoolExecutor
 from database import MailDatabase
 from flsconfig import FLSConfig
 from modules.flscertification import FLSCertificateList, FLSCertificate
-from modules.mail import MailAccountList, MailAccount
-from modules.dns import Dns, DNSList
-from mailer import Mailer
+from modules.mailstore import MailAccountList, MailAccount
+from modules.dnsstore import Dns, DNSList
+from mailer import Mailer, MailTemplates
+import logreader
+import updatebundle
+import bindconfig
+import zoneexport
+import mailqueue
+import dovecotdict
 
 try:
 	import fcntl
@@ -29,8 +36,16 @@ except:
 
 __author__  = 'Lukas Schreiner'
 __copyright__ = 'Copyright (C) 2013 - 2016 Website-Team Friedrich-List-Schule-Wiesbaden'
-__version__ = '0.9'
+__version__ = '0.10'
 __min_client__ = '0.9'
+# number of mails in one page of getMailsPage / bootstrap
+MAIL_PAGE_SIZE = 1000
+MAIL_PAGE_MAX = 5000
+# threads of the command socket for slow work after the reply (password
+# resets, mails without queue)
+COMMAND_WORKERS = 4
+# users per query and reply chunk of a dict iteration (doveadm -A)
+ITERATE_CHUNK = 1000
 
 FORMAT = '%(asctime)-15s %(levelname)s %(module)s.%(funcName)s: %(message)s'
 formatter = logging.Formatter(FORMAT, datefmt='%b %d %H:%M:%S')
@@ -59,6 +74,38 @@ if len(fread) <= 0:
 else:
 	log.debug('Using config files "%s"' % (fread.pop(),))
 
+if conf.has_option('logs', 'indexcache') and len(conf.get('logs', 'indexcache').strip()) > 0:
+	logreader.LogReader.getInstance().indexDir = conf.get('logs', 'indexcache')
+
+bindconfig.DnsReloader(
+	conf.get('dns', 'reload'),
+	conf.get('dns', 'reloadzone') if conf.has_option('dns', 'reloadzone') and len(conf.get('dns', 'reloadzone').strip()) > 0 else None,
+	conf.get('dns', 'reconfig') if conf.has_option('dns', 'reconfig') and len(conf.get('dns', 'reconfig').strip()) > 0 else None,
+	conf.getfloat('dns', 'reloaddelay') if conf.has_option('dns', 'reloaddelay') else 2
+)
+
+if conf.has_option('mailqueue', 'spool') and len(conf.get('mailqueue', 'spool').strip()) > 0:
+	mailqueue.MailQueue(
+		conf.get('mailqueue', 'spool'),
+		conf.get('mailqueue', 'smtphost') if conf.has_option('mailqueue', 'smtphost') else 'localhost',
+		conf.getint('mailqueue', 'smtpport') if conf.has_option('mailqueue', 'smtpport') else 25,
+		conf.getint('mailqueue', 'retrydelay') if conf.has_option('mailqueue', 'retrydelay') else 60,
+		conf.getint('mailqueue', 'maxretrydelay') if conf.has_option('mailqueue', 'maxretrydelay') else 3600,
+		conf.getint('mailqueue', 'maxage') if conf.has_option('mailqueue', 'maxage') else 259200
+	)
+
+commandWorkers = ThreadPoolExecutor(max_workers=COMMAND_WORKERS)
+
+def runInBackground(title, func, *args):
+	def job():
+		try:
+			if func(*args) is False:
+				log.warning('%s failed!' % (title,))
+		except Exception as e:
+			log.error('%s failed: %s' % (title, e))
+
+	commandWorkers.submit(job)
+
 def reloadPostfix():
 	state = True
 	cmd = shlex.split('%s %s' % (conf.get('mailserver', 'postfix'), 'quiet-reload'))
@@ -73,27 +120,6 @@ def reloadPostfix():
 
 	return state
 
-def reloadDns():
-	# do that only if dns is enabled.
-	if not conf.getboolean('dns', 'active'):
-		return True
-
-	state = True
-	cmd = shlex.split('%s' % (conf.get('dns', 'reload'),))
-	try:
-		with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as p:
-			out = p.stdout.read()
-			err = p.stderr.read()
-			if len(out) > 0:
-				log.info(out)
-			if len(err) > 0:
-				log.warning(err)
-				state = False
-	except Exception:
-		raise
-
-	return state
-
 class ControlPanel:
 
 	def upToDate(self, version):
@@ -114,103 +140,36 @@ class ControlPanel:
 			return True
 
 	def getCurrentVersion(self):
-		# check if we have build directory or not
-		base = ''
-		if os.path.exists('build' + os.sep):
-			base = 'build' + os.sep
+		# complete bundle in one response (used by older clients)
+		data = base64.b64encode(updatebundle.UpdateBundle.getInstance().getData())
+		return data.decode('utf-8')
 
-		# now create temp zip file
-		zfile = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
-		with zipfile.ZipFile(zfile, 'w') as verzip:
-			self.__addFilesZip(verzip, base)
+	def getVersionHash(self):
+		return updatebundle.UpdateBundle.getInstance().getInfo()
 
-		zfile.close()
-		data = ''
-		with open(zfile.name, 'rb') as f:
-			data = f.read()
+	def getVersionChunk(self, bundleHash, offset, length = updatebundle.CHUNK_SIZE):
+		data = updatebundle.UpdateBundle.getInstance().getChunk(bundleHash, int(offset), length)
+		if data is None:
+			log.info('Client requested an outdated update bundle %s' % (bundleHash,))
+			return {'hash': bundleHash, 'offset': offset, 'data': None}
 
-		os.unlink(zfile.name)
-		data = base64.b64encode(data)
-		return data.decode('utf-8')
+		return {'hash': bundleHash, 'offset': offset, 'data': base64.b64encode(data).decode('utf-8')}
 
-	def __addFilesZip(self, zipobj, fdir):
-		if fdir not in ['.', '..', 'certs']:
-			for f in os.listdir(fdir):
-				p = os.path.join(fdir, f)
-				if os.path.isdir(p):
-					self.__addFilesZip(zipobj, p)
-				else:
-					arcname = p.replace('build' + os.sep + 'flscp' + os.sep, '')
-					if f.endswith('.ini'):
-						arcname = arcname.replace(f, f + '.example')
-					zipobj.write(p, arcname)
-
-	def __addZoneFile(self, domain, zoneFile):
-		path = conf.get('dns', 'zoneConfig')
-		content = []
-		if os.path.exists(path):
-			with open(path, 'rb') as f:
-				content = f.read().decode('utf-8').replace('\r\n', '\n').split('\n')
-
-		fullDomain = domain.getFullDomain()
-		pattern = '// dmn [%s] cfg entry BEGIN.' % (fullDomain,)
-		# check if our file does exists.
-		alreadyExist = False
-		for f in content:
-			if pattern in f:
-				alreadyExist = True
-
-		if not alreadyExist:
-			# start comment
-			content.append('\n')
-			content.append('// dmn [%s] cfg entry BEGIN.' % (fullDomain,))
-			content.append('zone "%s" {' % (fullDomain,))
-			content.append('\ttype master;')
-			content.append('\tfile "%s";' % (zoneFile,))
-			content.append('\tnotify YES;')
-			content.append('};')
-			content.append('// dmn [%s] cfg entry END.' % (fullDomain,))
-
-			# now write
-			data = '\n'.join(content)
-			try:
-				with open(path, 'wb') as f:
-					f.write(data.encode('utf-8'))
-			except:
-				log.error('Could not write the zone configuration file!')
-
-	def __removeZoneFile(self, domain, zoneFile):
-		fullDomain = domain.getFullDomain()
-		patternStart = '// dmn [%s] cfg entry BEGIN.' % (fullDomain,)
-		patternEnd = '// dmn [%s] cfg entry END.' % (fullDomain,)
-		path = conf.get('dns', 'zoneConfig')
-		content = []
-
-		if os.path.exists(path):
-			with open(path, 'rb') as f:
-				content = f.read().decode('utf-8').replace('\r\n', '\n').split('\n')
-			# now search
-			start = False
-			for line in content:
-				if not start and patternStart in line:
-					start = True
-
-				if start:
-					content.remove(line)
-
-				if start and patternEnd in line:
-					start = False
-					break
+	def __addZoneFile(self, fqdn, zoneFile, zoneChanges = None):
+		# without given changes (batch), the change is written directly.
+		changes = zoneChanges if zoneChanges is not None else bindconfig.ZoneConfig.getInstance(conf.get('dns', 'zoneConfig')).begin()
+		changes.add(fqdn, zoneFile)
+		if zoneChanges is None:
+			changes.save()
 
-			# write back
-			data = '\n'.join(content)
-			try:
-				with open(path, 'wb') as f:
-					f.write(data.encode('utf-8'))
-			except:
-				log.error('Could not write the zone configuration file!')
+	def __removeZoneFile(self, fqdn, zoneFile, zoneChanges = None):
+		changes = zoneChanges if zoneChanges is not None else bindconfig.ZoneConfig.getInstance(conf.get('dns', 'zoneConfig')).begin()
+		changes.remove(fqdn)
+		if zoneChanges is None:
+			changes.save()
 
 		# remove the cache file
+		bindconfig.ZoneFiles.getInstance().forget(zoneFile)
 		if os.path.exists(zoneFile):
 			try:
 				os.unlink(zoneFile)
@@ -280,14 +239,26 @@ class ControlPanel:
 		return conf.has_option('features', feature)
 
 	def getDomains(self):
-		data = []
 		db = MailDatabase.getInstance()
 		cursor = db.getCursor()
+		try:
+			return self.__loadDomains(cursor)
+		finally:
+			cursor.close()
+
+	def getDomainsSince(self, revision):
+		return self.__getChanges('domain', revision, self.__loadDomains)
+
+	def __loadDomains(self, cursor, since = None, domain = None):
+		data = []
 		query = (
 			'SELECT domain_id, domain_parent, domain_name, ipv6, ipv4, domain_gid, domain_uid, domain_created, ' \
 			'domain_last_modified, domain_srvpath, domain_status FROM domain'
 		)
-		cursor.execute(query)
+		if since is not None:
+			cursor.execute(query + ' WHERE revision > %s', (since,))
+		else:
+			cursor.execute(query)
 		for (domain_id, domain_parent, domain_name, ipv6, ipv4, gid, uid, created, modified, srvpath, state) in cursor:
 			data.append(
 				{
@@ -305,122 +276,228 @@ class ControlPanel:
 				}
 			)
 
-		cursor.close()
-
 		return data
 
 	def getDns(self, domain = None):
-		data = []
 		db = MailDatabase.getInstance()
 		cursor = db.getCursor()
-		if domain is None:
-			query = (
-				'SELECT dns_id, domain_id FROM dns'
-			)
-			cursor.execute(query)
-		else:
-			query = (
-				'SELECT dns_id FROM dns WHERE domain_id = %s'
-			)
-			cursor.execute(query, (domain,))
+		try:
+			return self.__loadDns(cursor, None, domain)
+		finally:
+			cursor.close()
 
-		dnsIds = []
-		for (dns_id,) in cursor:
-			dnsIds.append(dns_id)
+	def getDnsSince(self, domain, revision):
+		return self.__getChanges('dns', revision, self.__loadDns, domain)
 
-		for i in dnsIds:
-			dns = Dns(i)
-			dns.load()
+	def __loadDns(self, cursor, since = None, domain = None):
+		data = []
+		query = (
+			'SELECT dns_id, domain_id, dns_key, dns_type, dns_value, dns_prio, dns_weight, dns_port, dns_admin, dns_refresh, ' \
+			'dns_retry, dns_expire, dns_ttl, status FROM dns WHERE 1 = 1'
+		)
+		params = []
+		if domain is not None:
+			query += ' AND domain_id = %s'
+			params.append(domain)
+		if since is not None:
+			query += ' AND revision > %s'
+			params.append(since)
+
+		cursor.execute(query, params)
+		for row in cursor:
+			dns = Dns(row[0])
+			(
+				dns.id, dns.domainId, dns.key, dns.type, dns.value, dns.prio, dns.weight, dns.port,
+				dns.dnsAdmin, dns.refreshRate, dns.retryRate, dns.expireTime, dns.ttl, dns.state
+			) = row
 			data.append(dns.toDict())
-			del(dns)
-
-		cursor.close()
 
 		return data
 
+	def __getRevision(self, cursor):
+		cursor.execute('SELECT revision_value FROM revision WHERE revision_name = %s', ('global',))
+		row = cursor.fetchone()
+		return int(row[0]) if row is not None else 0
+
+	def __getChanges(self, table, revision, loader, domain = None):
+		"""
+		Returns the rows of table (loaded by loader) which changed after the
+		given revision and the ids of the deleted rows. Without a (valid)
+		revision all rows are returned ("full").
+		"""
+		db = MailDatabase.getInstance()
+		# start with a new snapshot: all rows up to the current revision are
+		# committed (the revision counter is locked until commit).
+		db.commit()
+		cursor = db.getCursor()
+		try:
+			current = self.__getRevision(cursor)
+			since = int(revision) if revision is not None and len(str(revision).strip()) > 0 else 0
+			full = since <= 0 or since > current
+
+			items = loader(cursor, None if full else since, domain)
+			deleted = []
+			if not full:
+				query = 'SELECT row_id FROM deleted_rows WHERE table_name = %s AND revision > %s'
+				params = [table, since]
+				if domain is not None:
+					query += ' AND domain_id = %s'
+					params.append(domain)
+				cursor.execute(query, params)
+				deleted = [rowId for (rowId,) in cursor]
+		finally:
+			cursor.close()
+		db.commit()
+
+		log.debug(
+			'Changes of %s since revision %s: %i rows, %i deleted%s' %
+			(table, revision, len(items), len(deleted), ' (full)' if full else '')
+		)
+
+		# revisions can exceed the xml-rpc integer (32 bit).
+		return {'revision': str(current), 'full': full, 'items': items, 'deleted': deleted}
+
 	def saveDns(self, domain, dns):
-		from modules.domain import Domain
-		dnsList = DNSList()
-		for f in dns['_items']:
-			dnsList.add(Dns.fromDict(f))
-		log.debug('Want to save %i dns items!' % (len(dnsList),))
-
-		for d in dnsList:
-			d.save()
-
-		if domain is not None and (type(domain) == int or len(domain.strip()) > 0) and conf.getboolean('dns', 'active'):
-			content = self.getDomainZoneFile(domain)
-			# now we need the Domain
-			dom = Domain(domain)
-			if not dom.load():
-				log.warning('Could not load the domain %s for generating zone file!' % (domain,))
-				return False
+		return self.saveDnsZones([{'domain': domain, 'dns': dns}])
+
+	def saveDnsZones(self, zones):
+		"""
+		Saves the dns entries of several domains. Every zone file is only
+		written if its content changed and bind is reloaded once (delayed)
+		for all changed zones.
+		"""
+		from modules.domainstore import Domain
+		state = True
+		dnsActive = conf.getboolean('dns', 'active')
+		# the zone configuration changes of this request
+		zoneChanges = None
+		if dnsActive:
+			zoneChanges = bindconfig.ZoneConfig.getInstance(conf.get('dns', 'zoneConfig')).begin()
+
+		changed = []
+		for zone in zones:
+			domain = zone['domain']
+			dnsList = DNSList()
+			for f in zone['dns']['_items']:
+				dnsList.add(Dns.fromDict(f))
+			log.debug('Want to save %i dns items!' % (len(dnsList),))
+
+			# the zone file is only written after the entries are committed.
+			if not dnsList.save():
+				state = False
+				continue
+
+			if domain is not None and (type(domain) == int or len(domain.strip()) > 0) and dnsActive:
+				# now we need the Domain
+				dom = Domain(domain)
+				if not dom.load():
+					log.warning('Could not load the domain %s for generating zone file!' % (domain,))
+					state = False
+					continue
 
-			# we need the fully qualified domain name!
-			fqdn = dom.getFullDomain()
-			# now try to save it!
-			fileName = '%s.db' % (fqdn,)
-			path = os.path.join(conf.get('dns', 'cache'), fileName)
-			addToZoneFile = False
-			if not os.path.exists(path):
-				addToZoneFile = True
-			try:
-				with open(path, 'wb') as f:
-					f.write(content.encode('utf-8'))
-			except Exception as e:
-				log.warning('Could not update the database file for the DNS-Service because of %s' % (str(e),))
-			else:
-				log.info('Update the DNS-Service-Database %s' % (os.path.join(conf.get('dns', 'cache'), fileName),))
-				if addToZoneFile:
-					self.__addZoneFile(domain, path)
+				if self.__writeZoneFile(dom, zoneChanges):
+					changed.append(dom.getFullDomain())
+
+		if zoneChanges is not None:
+			reconfig = zoneChanges.hasChanges()
+			zoneChanges.save()
+			if len(changed) > 0 or reconfig:
+				bindconfig.DnsReloader.getInstance().schedule(changed, reconfig)
+
+		return state
+
+	def __writeZoneFile(self, dom, zoneChanges):
+		# returns True, if the zone file changed.
+		content = dom.generateBindFile()
+		# we need the fully qualified domain name!
+		fqdn = dom.getFullDomain()
+		fileName = '%s.db' % (fqdn,)
+		path = os.path.join(conf.get('dns', 'cache'), fileName)
+		addToZoneFile = not os.path.exists(path) or fqdn not in zoneChanges
+		try:
+			written = bindconfig.ZoneFiles.getInstance().write(path, content)
+		except Exception as e:
+			log.warning('Could not update the database file for the DNS-Service because of %s' % (str(e),))
+			return False
 
-			# reload
-			try:
-				reloadDns()
-			except Exception as e:
-				log.critical('Could not reload the DNS-Service because of %s!' % (str(e),))
-			else:
-				log.info('DNS-Service reloaded with success!')
+		if written:
+			log.info('Update the DNS-Service-Database %s' % (path,))
+		else:
+			log.debug('DNS-Service-Database %s is unchanged' % (path,))
 
-		return True
+		if addToZoneFile:
+			self.__addZoneFile(fqdn, path, zoneChanges)
+
+		return written
 
 	def saveDomains(self, domains):
-		from modules.domain import Domain, DomainList
+		from modules.domainstore import Domain, DomainList
 		domainList = DomainList()
 		for f in domains['_items']:
 			domainList.add(Domain.fromDict(f))
 		log.debug('Want to save %i domains' % (len(domainList),))
 
+		start = time.time()
+		current = DomainList.loadAll()
+		loaded = time.time()
+
+		# the full domain names are needed after deleting from database.
+		names = {}
 		for domain in domainList:
-			# get the old domain
-			oldDomain = None
-			if domain.state != Domain.STATE_CREATE:
-				oldDomain = Domain(domain.id)
-				oldDomain.load()
-
-			domain.save(oldDomain)
-			# check if corresponding dns file exists.
-
-			if conf.getboolean('dns', 'active'):
-				fqdn = domain.getFullDomain()
-				fileName = '%s.db' % (fqdn,)
-				path = os.path.join(conf.get('dns', 'cache'), fileName)
-				if domain.state != Domain.STATE_DELETE:
-					if not os.path.exists(path):
-						try:
-							with open(path, 'wb') as f:
-								f.write('\n'.encode('utf-8'))
-						except:
-							pass
-						else:
-							self.__addZoneFile(domain, path)
-					else:
-						self.__addZoneFile(domain, path)
+			old = current.findById(domain.id) if domain.state != Domain.STATE_CREATE else None
+			names[id(domain)] = (old if old is not None else domain).getFullDomain(current)
+		domainList.save(current)
+		saved = time.time()
+
+		for domain in domainList:
+			if domain.state == Domain.STATE_DELETE:
+				continue
+			try:
+				domain.provision(current.findById(domain.id))
+			except Exception as e:
+				log.error('Could not prepare the folder %s of domain %s (%s)' % (domain.srvpath, domain.name, e))
+		provisioned = time.time()
+
+		if conf.getboolean('dns', 'active'):
+			zoneChanges = bindconfig.ZoneConfig.getInstance(conf.get('dns', 'zoneConfig')).begin()
+			for domain in domainList:
+				fqdn = names[id(domain)]
+				path = os.path.join(conf.get('dns', 'cache'), '%s.db' % (fqdn,))
+				if domain.state == Domain.STATE_DELETE:
+					self.__removeZoneFile(fqdn, path, zoneChanges)
+				elif os.path.exists(path):
+					self.__addZoneFile(fqdn, path, zoneChanges)
 				else:
-					self.__removeZoneFile(domain, path)
+					try:
+						with open(path, 'wb') as f:
+							f.write('\n'.encode('utf-8'))
+					except OSError as e:
+						log.warning('Could not create the zone file %s (%s)' % (path, e))
+					else:
+						self.__addZoneFile(fqdn, path, zoneChanges)
+
+			# write all changes of the zone configuration at once
+			if zoneChanges.hasChanges():
+				if zoneChanges.save():
+					bindconfig.DnsReloader.getInstance().schedule(reconfig = True)
+
+		log.info(
+			'Saved %i domains (load %.1fms, database %.1fms, folders %.1fms, zones %.1fms)' % (
+				len(domainList), (loaded - start) * 1000, (saved - loaded) * 1000,
+				(provisioned - saved) * 1000, (time.time() - provisioned) * 1000
+			)
+		)
+
+	def exportZones(self, check = False):
+		if not conf.getboolean('dns', 'active'):
+			return False
+
+		return zoneexport.exportZones(
+			conf.get('dns', 'cache'), bindconfig.ZoneConfig.getInstance(conf.get('dns', 'zoneConfig')), check
+		)
 
 	def getDomainZoneFile(self, domainId):
-		from modules.domain import Domain
+		from modules.domainstore import Domain
 		content = ''
 		d = Domain(domainId)
 		if not d.load():
@@ -432,65 +509,183 @@ class ControlPanel:
 		return content
 
 	def getListOfLogs(self):
-		base = '/var/log/'
-		fileList = []
-		mime = magic.Magic(mime=True)
+		return [f['file'] for f in logreader.LogInventory.getInstance().getLogs()]
 
-		for root, dirs, files in os.walk(base):
-			for name in files:
-				fullPath = os.path.join(root, name)
-				fileType = mime.from_file(fullPath)
-				if fileType is not None and \
-					fileType.decode('utf-8') in ['text/plain', 'application/x-gzip']:
-					fileList.append(fullPath)
+	def getLogInventory(self):
+		data = logreader.LogInventory.getInstance().getLogs()
+		for f in data:
+			# sizes can be bigger than an xml-rpc integer (32 bit).
+			f['size'] = str(f['size'])
+			f['mtime'] = int(f['mtime'])
 
-		fileList.sort()
-		return fileList
+		return data
 
 	def getLogFile(self, logFile):
-		content = None
-		mime = magic.Magic(mime=True)
-		fileType = mime.from_file(logFile).decode('utf-8')
-
-		if fileType == 'application/x-gzip':
+		# kept for older clients: deliver only the end of the file instead of
+		# the whole (maybe several hundred MB big) log.
+		return self.getLogChunk(logFile, None, logreader.CHUNK_MAX, logreader.DIRECTION_TAIL)['data']
+
+	def getLogChunk(self, logFile, offset = None, maxBytes = logreader.CHUNK_SIZE, direction = logreader.DIRECTION_TAIL):
+		chunk = {'file': logFile, 'offset': 0, 'end': 0, 'size': 0, 'data': ''}
+		if not logreader.validLogPath(logFile):
+			log.warning('Client requested logfile "%s" which is not a valid log!' % (logFile,))
+		else:
 			try:
-				f = gzip.open(logFile, 'rb')
-				contentTmp = f.read()
-				f.close()
-				content = contentTmp.decode('utf-8')
+				chunk = logreader.LogReader.getInstance().readChunk(
+					logFile, None if offset is None else int(offset), maxBytes, direction
+				)
 			except Exception as e:
 				log.warning('Could not load logfile "%s" (%s)!' % (logFile, str(e),))
 
+		# offsets can be bigger than an xml-rpc integer (32 bit).
+		for k in ('offset', 'end', 'size'):
+			chunk[k] = str(chunk[k])
+
+		return chunk
+
+	def followLog(self, logFile, offset, inode = None, timeout = logreader.FOLLOW_TIMEOUT):
+		# not followable: the client must not ask again immediately.
+		chunk = {
+			'file': logFile, 'offset': offset, 'end': offset, 'size': 0, 'data': '', 'inode': '', 'rotated': False,
+			'followable': False
+		}
+		if not logreader.validLogPath(logFile):
+			log.warning('Client requested logfile "%s" which is not a valid log!' % (logFile,))
 		else:
 			try:
-				with open(logFile, 'rb') as f:
-					content = f.read().decode('utf-8')
+				chunk = logreader.LogReader.getInstance().follow(
+					logFile, int(offset), None if inode is None or inode == '' else int(inode), timeout
+				)
 			except Exception as e:
-				log.warning('Could not load logfile "%s" (%s)!' % (logFile, str(e),))
+				log.warning('Could not follow logfile "%s" (%s)!' % (logFile, str(e),))
+
+		for k in ('offset', 'end', 'size', 'inode'):
+			chunk[k] = str(chunk[k])
+
+		return chunk
+
+	def searchLogs(self, pattern, files = None, options = None):
+		"""
+		Searches the given log files (or all) for a pattern. Supported options:
+		regex, caseSensitive, since / until (unix timestamp), limit, reverse,
+		end (offset, only for reverse search) and cursor (continuation).
+		At most SEARCH_SCAN_MAX bytes are scanned per request (over all files),
+		next is the cursor to continue then.
+		"""
+		if options is None:
+			options = {}
+		result = {'matches': [], 'next': None}
+		if files is None or len(files) <= 0:
+			files = self.getListOfLogs()
+		files = [f for f in files if logreader.validLogPath(f)]
+
+		flags = 0 if options.get('caseSensitive', False) else re.IGNORECASE
+		try:
+			if options.get('regex', False):
+				matcher = re.compile(pattern.encode('utf-8'), flags)
+			else:
+				matcher = re.compile(re.escape(pattern.encode('utf-8')), flags)
+		except re.error as e:
+			log.info('Invalid search pattern "%s" (%s)' % (pattern, e))
+			return result
+
+		limit = max(1, min(int(options.get('limit', logreader.SEARCH_LIMIT)), logreader.SEARCH_LIMIT_MAX))
+		since = int(options['since']) if options.get('since') is not None else None
+		until = int(options['until']) if options.get('until') is not None else None
+		reverse = options.get('reverse', False)
+		end = int(options['end']) if options.get('end') is not None else None
+		cursor = options.get('cursor')
+		if cursor is not None and cursor.get('file') in files:
+			files = files[files.index(cursor['file']):]
+		else:
+			cursor = None
+
+		reader = logreader.LogReader.getInstance()
+		matches = []
+		# the scan limit applies to the whole request, not to every file.
+		budget = logreader.SEARCH_SCAN_MAX
+		for logFile in files:
+			if budget <= 0:
+				result['next'] = {'file': logFile, 'offset': None, 'line': None}
+				if reverse:
+					result['next']['reverse'] = True
+				break
+
+			offset = line = None
+			if cursor is not None and cursor['file'] == logFile:
+				offset = cursor.get('offset')
+				line = cursor.get('line')
+			try:
+				(found, nextPos, scanned) = reader.search(
+					logFile, matcher, since, until, None if offset is None else int(offset), line,
+					limit if reverse else limit - len(matches), reverse, end, budget
+				)
+			except Exception as e:
+				log.warning('Could not search logfile "%s" (%s)!' % (logFile, e))
+				continue
+
+			budget -= scanned
+			matches.extend(found)
+			if nextPos is not None:
+				result['next'] = {'file': logFile, 'offset': str(nextPos[0]), 'line': nextPos[1]}
+				if reverse:
+					# continue backwards with end = offset.
+					result['next']['reverse'] = True
+				break
 
-		return '' if content is None else content
+		result['matches'] = matches[-limit:] if reverse else matches
+		return result
 
 	def getMails(self):
 		db = MailDatabase.getInstance()
-		domainsRaw = self.getDomains()
-		domains = {}
-		for f in domainsRaw:
-			domains[f['id']] = f['name']
+		cursor = db.getCursor()
+		try:
+			return self.__loadMails(cursor)
+		finally:
+			cursor.close()
 
-		data = []
+	def getMailsSince(self, revision):
+		return self.__getChanges('mail_users', revision, self.__loadMails)
+
+	def getMailsPage(self, after, limit = MAIL_PAGE_SIZE):
+		"""
+		Returns up to limit mails (ordered by id) with an id greater than after.
+		"""
+		db = MailDatabase.getInstance()
 		cursor = db.getCursor()
+		try:
+			return self.__loadMails(cursor, after = int(after), limit = max(1, min(int(limit), MAIL_PAGE_MAX)))
+		finally:
+			cursor.close()
+
+	def __loadMails(self, cursor, since = None, domain = None, after = None, limit = None):
+		data = []
 		query = (
 			'SELECT m.mail_id, m.mail_acc, m.mail_addr, m.mail_type, m.mail_forward, m.quota, m.status, ' \
 			'm.domain_id, m.alternative_addr, m.alias, m.encryption, m.public_key, m.private_key, ' \
 			'm.private_key_salt, m.private_key_iterations, m.filter_postgrey, m.filter_spam, ' \
-			'm.filter_virus, m.enabled, q.bytes ' \
-			'FROM mail_users m LEFT JOIN quota_dovecot q ON m.mail_addr = q.username'
+			'm.filter_virus, m.enabled, q.bytes, d.domain_name ' \
+			'FROM mail_users m LEFT JOIN quota_dovecot q ON m.mail_addr = q.username ' \
+			'LEFT JOIN domain d ON d.domain_id = m.domain_id WHERE 1 = 1'
 		)
-		cursor.execute(query)
+		params = []
+		if since is not None:
+			query += ' AND m.revision > %s'
+			params.append(since)
+		if after is not None:
+			query += ' AND m.mail_id > %s'
+			params.append(after)
+		query += ' ORDER BY m.mail_id'
+		if limit is not None:
+			query += ' LIMIT %s'
+			params.append(limit)
+
+		cursor.execute(query, params)
 		for (
 				mail_id, mail_acc, mail_addr, mail_type, mail_forward, quota, status, domain_id, 
 				alternative_addr, alias, encryption, public_key, private_key, private_key_salt, 
-				private_key_iterations, filter_postgrey, filter_spam, filter_virus, enabled, usedBytes
+				private_key_iterations, filter_postgrey, filter_spam, filter_virus, enabled, usedBytes,
+				domain_name
 			) in cursor:
 			quotaSts = 0.00
 			if usedBytes is not None:
@@ -504,7 +699,7 @@ class ControlPanel:
 					'altMail': alternative_addr if alternative_addr is not None else '',
 					'alias': bool(alias),
 					'forward': mail_forward.split(',') if mail_forward != '_no_' else [],
-					'domain': domains[domain_id],
+					'domain': domain_name,
 					'domainId': domain_id,
 					'state': status,
 					'type': mail_type,
@@ -524,8 +719,6 @@ class ControlPanel:
 				}
 			)
 
-		cursor.close()
-
 		return data
 
 	def saveMails(self, mails):
@@ -552,6 +745,60 @@ class ControlPanel:
 	def ping(self):
 		return 'pong'
 
+	def getMailQueue(self):
+		queue = mailqueue.MailQueue.getInstance()
+		if queue is None:
+			return False
+
+		return queue.getStatus()
+
+	def bootstrap(self, version, requiresVersion, mailLimit = MAIL_PAGE_SIZE, revisions = None):
+		"""
+		Everything the client needs at start in one request: version check,
+		features, certificates, domains and the first page of mails.
+		mailPages has the last id before every further page - the client
+		loads them with getMailsPage (in parallel).
+		A client with cached data sends the revisions of its domains and
+		mails and only gets the changes (without pages).
+		"""
+		data = {
+			'version': __version__,
+			'compatible': self.compatible(version, requiresVersion),
+			'upToDate': self.upToDate(version)
+		}
+		if not data['compatible']:
+			return data
+
+		data['features'] = self.getFeatures()
+		data['certs'] = self.getCerts()
+		if revisions is not None:
+			data['domains'] = self.getDomainsSince(revisions.get('domains'))
+			data['mails'] = self.getMailsSince(revisions.get('mails'))
+			data['mailPages'] = []
+			return data
+
+		data['domains'] = self.getDomainsSince(None)
+
+		mailLimit = max(1, min(int(mailLimit), MAIL_PAGE_MAX))
+		db = MailDatabase.getInstance()
+		# first page and page borders from the same snapshot as the revision.
+		db.commit()
+		cursor = db.getCursor()
+		try:
+			revision = self.__getRevision(cursor)
+			cursor.execute('SELECT mail_id FROM mail_users ORDER BY mail_id')
+			ids = [mailId for (mailId,) in cursor]
+			mails = self.__loadMails(cursor, limit = mailLimit)
+		finally:
+			cursor.close()
+		db.commit()
+
+		data['mails'] = {'revision': str(revision), 'full': True, 'items': mails, 'deleted': []}
+		data['mailPages'] = [ids[i - 1] for i in range(mailLimit, len(ids), mailLimit)]
+		log.debug('Bootstrap with %i of %i mails (%i further pages)' % (len(mails), len(ids), len(data['mailPages'])))
+
+		return data
+
 class FLSUnixRequestHandler(socketserver.BaseRequestHandler):
 	def handle(self):
 		cmd = ''
@@ -666,13 +913,22 @@ class FLSUnixRequestHandler(socketserver.BaseRequestHandler):
 			return False
 
 		# now create auth code and send mail!
-		if maccount.createAuthCode():
-			m = Mailer(maccount)
-			return m.sendPasswordLink()
-		else:
+		if not maccount.createAuthCode():
 			log.warning('Could not create auth code for %s!' % (mail,))
 			return False
 
+		self.notify('Password link for %s' % (mail,), Mailer(maccount).sendPasswordLink)
+		return True
+
+	def notify(self, title, send):
+		# a spooled mail is already durable, otherwise smtp is too slow for
+		# the request.
+		queue = mailqueue.MailQueue.getInstance()
+		if queue is not None and queue.isRunning():
+			if not send():
+				log.warning('%s failed!' % (title,))
+		else:
+			runInBackground(title, send)
 
 	def sendpw(self, data):
 		# <mail/username> <authcode>
@@ -696,73 +952,120 @@ class FLSUnixRequestHandler(socketserver.BaseRequestHandler):
 		if maccount.authValid is None or maccount.authValid < datetime.datetime.now():
 			return False
 
-		# now send new pw!
+		# the auth code is used once. The new password is stored before we
+		# answer, only the mail is sent in the background.
+		authValid = maccount.authValid
+		if not maccount.consumeAuthCode(authcode):
+			return False
+
 		maccount.generatePassword()
-		if maccount.changePassword(maccount.pw):
-			m = Mailer(maccount)
-			return m.sendNewPassword()
-		else:
+		# the current password is unknown: an encryption key can not be kept.
+		if not maccount.changePassword('', maccount.pw):
+			log.warning('Could not set the new password of %s!' % (mail,))
+			# the link stays usable.
+			maccount.restoreAuthCode(authcode, authValid)
 			return False
 
+		self.notify('New password for %s' % (mail,), Mailer(maccount).sendNewPassword)
+		return True
+
 class FLSUnixAuthHandler(socketserver.BaseRequestHandler):
+	# lookups of one connection are run in parallel in this pool (if set).
+	pool = None
 
 	def handle(self):
-		msg = ''
-		while True:
+		dovecotdict.DictSession(self.request, self.processLine, self.pool).serve()
+
+	def processLine(self, msg):
+		cmd = msg[:1]
+		if cmd == 'H':
+			#log.debug('Got: %s' % (msg,))
+			log.debug('Got an H-message. Will not print for security reason.')
+			log.info('Got Hello...')
+			return None
+		elif cmd == 'L':
 			try:
-				msg = self.request.recv(2048).decode('utf-8')
-			except Exception:
-				log.debug('Got some useless data,...')
-				break
-
-			if not msg:
-				break
-
-			cmd = msg[:1]
-			if cmd == 'H':
-				#log.debug('Got: %s' % (msg,))
-				log.debug('Got an H-message. Will not print for security reason.')
-				log.info('Got Hello...')
-				tryCompressed = msg.split('\n')
-				if len(tryCompressed) > 1 and tryCompressed[1][:1] == 'L':
-					msg = tryCompressed[1]
-					cmd = msg[:1]
-					log.info('It is a compressed query. Go ahead...')
-				else:
-					continue
-			# be careful! Don't make a elif out of this, because we can get an
-			# compressed lookup so the first cmd will be "H"!!!
-			if cmd == 'L':
-				msg = msg.strip()
-				try:
-					namespace, typ, user, pwd, mech, cert = msg[1:].split('/', 6)
-				except ValueError:
-					log.debug('Got: %s' % (msg,))
-					namespace, typ, user = msg[1:].split('/', 3)
-				else:
-					log.debug('Got: %s%s/%s/%s/%s/%s/%s' % (cmd, namespace, typ, user, '***', mech, cert))
+				namespace, typ, user, pwd, mech, cert = msg[1:].split('/', 6)
+			except ValueError:
+				log.debug('Got: %s' % (msg,))
+				namespace, typ, user = msg[1:].split('/', 3)
+			else:
+				log.debug('Got: %s%s/%s/%s/%s/%s/%s' % (cmd, namespace, typ, user, '***', mech, cert))
 
-				log.info('I:%s, %s, %s' % (namespace, typ, user))
+			log.info('I:%s, %s, %s' % (namespace, typ, user))
 
-				# try to find user:
+			# try to find user:
+			try:
 				if typ == 'userdb':
 					retCode = self.lookup(namespace, typ, user)
-					if retCode is False:
-						self.request.sendall('N\n'.encode('utf-8'))
-					else:
-						self.request.sendall(('O%s\n' % (json.dumps(retCode),)).encode('utf-8'))
 				elif typ == 'passdb':
 					# jap.. we have a problem!
 					retCode = self.passdb(namespace, typ, user, pwd, mech, cert)
-					if retCode is False:
-						self.request.sendall('N\n'.encode('utf-8'))
-					else:
-						self.request.sendall(('O%s\n' % (json.dumps(retCode),)).encode('utf-8'))
 				else:
-					self.request.send('F\n'.encode('utf-8'))
+					return 'F'
+			finally:
+				self.endTransaction()
+
+			return 'N' if retCode is False else 'O%s' % (json.dumps(retCode),)
+		elif cmd == 'I':
+			return self.iterate(msg)
+		else:
+			log.debug('Got: %s' % (msg,))
+			return 'F'
+
+	def iterate(self, msg):
+		# I<flags>\t<max rows>\t<path> (dovecot 2.3) or I<flags>\t<path>
+		# (2.2), e.g. "I0\t0\tshared/userdb/" (doveadm -A). The flags are
+		# not used: the values are always empty.
+		fields = msg[1:].split('\t')
+		try:
+			if len(fields) >= 3:
+				maxRows = int(fields[1])
+				path = fields[2]
 			else:
-				log.debug('Got: %s' % (msg,))
-				self.request.send('F\n'.encode('utf-8'))
+				maxRows = 0
+				path = fields[1]
+			namespace, typ, prefix = path.split('/', 2)
+		except (ValueError, IndexError):
+			log.debug('Got: %s' % (msg,))
+			return 'F'
+
+		log.info('I:%s, %s, %s' % (namespace, typ, prefix))
+		if typ != 'userdb':
+			return 'F'
+
+		return self.iterateUsers(namespace, prefix, maxRows)
+
+	def iterateUsers(self, namespace, prefix, maxRows = 0):
+		"""
+		Yields the userdb keys in chunks; the values are empty (the userdb
+		iteration only needs the user names). An empty line ends the
+		iteration.
+		"""
+		# all chunks are read from one new snapshot.
+		self.endTransaction()
+		try:
+			count = 0
+			for chunk in MailAccount.iterateAddresses(ITERATE_CHUNK):
+				rows = ['O%s/userdb/%s\t' % (namespace, f) for f in chunk if f.startswith(prefix)]
+				if maxRows > 0 and count + len(rows) >= maxRows:
+					yield rows[:maxRows - count]
+					break
+				count += len(rows)
+				yield rows
+		finally:
+			self.endTransaction()
+
+		yield ['']
+
+	def endTransaction(self):
+		# the connections of the workers live long: without ending the
+		# transaction, every lookup would see the snapshot of the first one
+		# (repeatable read).
+		try:
+			MailDatabase.getInstance().commit()
+		except Exception as e:
+			log.warning('Could not end the transaction of the auth lookup: %s' % (e,))
 
 	def lookup(self, namespace, typ, arg):
 		maccount = MailAccount.getByEMail(arg)
@@ -780,6 +1083,10 @@ class FLSUnixAuthHandler(socketserver.BaseRequestHandler):
 
 class FLSRequestHandler(SimpleXMLRPCRequestHandler):
 	rpc_paths = ('/RPC2',)
+	# persistent connections: the client sends all requests of a thread
+	# over one connection. Idle connections are closed after the timeout.
+	protocol_version = 'HTTP/1.1'
+	timeout = 60
 
 	def validAuth(self):
 		log.info('Want to authenticate an user,...')
@@ -852,6 +1159,8 @@ class FLSRequestHandler(SimpleXMLRPCRequestHandler):
 		self.send_header("Content-length", str(len(response)))
 		self.end_headers()
 		self.wfile.write(response)
+		# the request body was not read.
+		self.close_connection = True
 
 class FLSXMLRPCDispatcher(SimpleXMLRPCDispatcher):
 
@@ -888,9 +1197,46 @@ class FLSXMLRPCDispatcher(SimpleXMLRPCDispatcher):
 			log.warning('Client tried to call method "%s" which does not exist!' % (method,))
 			raise Exception('method "%s" is not supported' % method)
 
-class FLSXMLRPCServer(SimpleXMLRPCServer, FLSXMLRPCDispatcher):
+	def system_multicall(self, call_list):
+		"""
+		Runs several calls with one request. An error is returned as fault of
+		this call and the following calls are still executed. The calls are
+		no transactions: they commit themselves (e.g. saveDomains) and write
+		files directly (zone files, bind configuration), so a failed call can
+		leave partial changes; only uncommitted database changes are rolled
+		back.
+		"""
+		results = []
+		for call in call_list:
+			method = call.get('methodName')
+			params = call.get('params', [])
+			if method == 'system.multicall':
+				results.append({'faultCode': 1, 'faultString': 'recursive system.multicall is not allowed'})
+				continue
+
+			try:
+				results.append([self._dispatch(method, params)])
+			except xmlrpc.client.Fault as fault:
+				self.__rollback()
+				results.append({'faultCode': fault.faultCode, 'faultString': fault.faultString})
+			except Exception as e:
+				self.__rollback()
+				results.append({'faultCode': 1, 'faultString': '%s:%s' % (type(e).__name__, e)})
+
+		log.debug('Executed multicall with %i calls' % (len(call_list),))
+		return results
+
+	def __rollback(self):
+		try:
+			MailDatabase.getInstance().rollback()
+		except Exception as e:
+			log.warning('Could not roll back after failed call: %s' % (e,))
+
+class FLSXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer, FLSXMLRPCDispatcher):
 
 	_send_traceback_header = False
+	# long running requests (e.g. followLog) must not block other clients.
+	daemon_threads = True
 
 	def __init__(self, privkey, pubkey, cacert, addr, requestHandler=FLSRequestHandler,
 					logRequests=True, allow_none=True, encoding=None, bind_and_activate=True):
@@ -919,6 +1265,12 @@ class FLSXMLRPCServer(SimpleXMLRPCServer, FLSXMLRPCDispatcher):
 			flags |= fcntl.FD_CLOEXEC
 			fcntl.fcntl(self.fileno(), fcntl.F_SETFD, flags)
 
+	def process_request_thread(self, request, client_address):
+		try:
+			super().process_request_thread(request, client_address)
+		finally:
+			MailDatabase.release()
+
 class FLSCpServer(Thread, FLSXMLRPCServer):
 
 	def __init__(self, connection):
@@ -928,12 +1280,15 @@ class FLSCpServer(Thread, FLSXMLRPCServer):
 			conf.get('connection', 'cacert'), connection
 		)
 		self.register_instance(ControlPanel())
+		self.register_multicall_functions()
 
 	def run(self):
 		self.serve_forever()
 
-class FLSCpUnixServer(Thread, UnixStreamServer):
+class FLSCpUnixServer(Thread, socketserver.ThreadingMixIn, UnixStreamServer):
 	allow_reuse_address = True
+	# a slow request (e.g. a password change) must not block other clients.
+	daemon_threads = True
 
 	def __init__(self, connection, requestHandler=FLSUnixRequestHandler, name='flscp-unix'):
 		Thread.__init__(self, name=name)
@@ -945,6 +1300,12 @@ class FLSCpUnixServer(Thread, UnixStreamServer):
 
 		UnixStreamServer.__init__(self, connection, requestHandler)
 
+	def process_request_thread(self, request, client_address):
+		try:
+			socketserver.ThreadingMixIn.process_request_thread(self, request, client_address)
+		finally:
+			MailDatabase.release()
+
 	def run(self):
 		# set permission
 		os.chmod(
@@ -976,16 +1337,51 @@ def writepid():
 def delpid():
 	os.remove(conf.get('general', 'pidfile'))
 
+def exportZonesCli(check):
+	report = ControlPanel().exportZones(check)
+	if report is False:
+		sys.stderr.write('DNS is not active!\n')
+		return 1
+
+	# the reload is not delayed - the process ends now.
+	bindconfig.DnsReloader.getInstance().flush()
+	for entry in report['zones']:
+		sys.stdout.write('%-40s %10i %8.1fms %8.1fms %8.1fms  %s\n' % (
+			entry['zone'], entry['serial'], entry['render'] * 1000, entry['check'] * 1000, entry['write'] * 1000,
+			'; '.join(entry['errors']) if len(entry['errors']) > 0 else ('written' if entry['written'] else 'unchanged')
+		))
+	sys.stdout.write('%i zones, %i written, %i with errors (loaded in %.1fms, total %.1fms)\n' % (
+		len(report['zones']), report['written'], report['errors'], report['load'] * 1000, report['total'] * 1000
+	))
+
+	return 1 if report['errors'] > 0 else 0
+
 if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description = 'FLS control panel server')
+	parser.add_argument('--export-zones', action = 'store_true', help = 'write the zone files of all domains and exit')
+	parser.add_argument('--check', action = 'store_true', help = 'check the syntax of the exported zones')
+	args = parser.parse_args()
+
 	hdlr = WatchedFileHandler(conf.get('general', 'logfile'))
 	hdlr.setFormatter(formatter)
 	log.addHandler(hdlr)
 	log.setLevel(logging.DEBUG)
 
+	if args.export_zones:
+		sys.exit(exportZonesCli(args.check))
+
 	# Write pidfile
 	writepid()
 	atexit.register(delpid) # Make sure pid file is removed if we quit
 
+	queue = mailqueue.MailQueue.getInstance()
+	if queue is not None:
+		queue.start()
+	MailTemplates.getInstance().watch()
+	authWorkers = conf.getint('connection', 'authworkers') if conf.has_option('connection', 'authworkers') else 4
+	if authWorkers > 1:
+		FLSUnixAuthHandler.pool = ThreadPoolExecutor(max_workers=authWorkers)
+
 	threads = []
 	try:
 		threads.append(FLSCpServer((conf.get('connection', 'host'), conf.getint('connection', 'port'))))
@@ -1005,4 +1401,9 @@ if __name__ == '__main__':
 		log.info('Try to stop the cp server (press again ctrl+c to quit)...')
 		for t in threads:
 			t.shutdown()
+		commandWorkers.shutdown()
+		if FLSUnixAuthHandler.pool is not None:
+			FLSUnixAuthHandler.pool.shutdown()
+		if queue is not None:
+			queue.stop()
 
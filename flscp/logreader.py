@@ -0,0 +1,680 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import os, os.path
+import re
+import mmap
+import zlib
+import bisect
+import pickle
+import hashlib
+import logging
+import threading
+import collections
+import datetime
+import time
+try:
+	import pyinotify
+	notifyInstalled = True
+except:
+	notifyInstalled = False
+try:
+	import magic
+except:
+	magic = None
+
+LOG_BASE = '/var/log/'
+DIRECTION_HEAD = 'head'
+DIRECTION_TAIL = 'tail'
+# default and maximum size of one chunk sent to the client
+CHUNK_SIZE = 256 * 1024
+CHUNK_MAX = 4 * 1024 * 1024
+
+# limits of one search request
+SEARCH_LIMIT = 100
+SEARCH_LIMIT_MAX = 1000
+SEARCH_SCAN_MAX = 64 * 1024 * 1024
+# maximum time a follow request waits for new data (seconds)
+FOLLOW_TIMEOUT = 25
+FOLLOW_POLL = 0.5
+
+# the list of logs is refreshed at most every x seconds
+INVENTORY_TTL = 10
+
+TYPE_TEXT = 'text'
+TYPE_GZIP = 'gzip'
+GZIP_MAGIC = b'\x1f\x8b'
+SNIFF_SIZE = 4096
+
+SYSLOG_TIME = re.compile(rb'^([A-Z][a-z]{2}) +(\d{1,2}) (\d{2}):(\d{2}):(\d{2})')
+ISO_TIME = re.compile(rb'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})')
+MONTHS = {
+	b'Jan': 1, b'Feb': 2, b'Mar': 3, b'Apr': 4, b'May': 5, b'Jun': 6,
+	b'Jul': 7, b'Aug': 8, b'Sep': 9, b'Oct': 10, b'Nov': 11, b'Dec': 12
+}
+
+def isGzip(path):
+	try:
+		with open(path, 'rb') as f:
+			return f.read(2) == GZIP_MAGIC
+	except OSError:
+		return False
+
+def sniffType(path):
+	"""
+	Classifies a file as TYPE_TEXT, TYPE_GZIP or None (anything else) by
+	looking at the first bytes. libmagic is only asked if that is not clear.
+	"""
+	try:
+		with open(path, 'rb') as f:
+			head = f.read(SNIFF_SIZE)
+	except OSError:
+		return None
+
+	if head[:2] == GZIP_MAGIC:
+		return TYPE_GZIP
+	if b'\x00' in head:
+		return None
+	try:
+		head.decode('utf-8')
+	except UnicodeDecodeError as e:
+		# a multibyte character cut at the end of the sniffed block is fine.
+		if e.start < len(head) - 4:
+			return sniffMagic(path)
+
+	return TYPE_TEXT
+
+def sniffMagic(path):
+	if magic is None:
+		return None
+
+	try:
+		fileType = magic.Magic(mime=True).from_file(path)
+	except Exception:
+		return None
+
+	if isinstance(fileType, bytes):
+		fileType = fileType.decode('utf-8')
+	if fileType == 'text/plain':
+		return TYPE_TEXT
+	elif fileType in ('application/x-gzip', 'application/gzip'):
+		return TYPE_GZIP
+	else:
+		return None
+
+def waitForChange(path, size, inode, timeout):
+	"""
+	Blocks until `path` differs from the given size / inode or the timeout
+	is reached. Uses inotify if available, otherwise polls with stat.
+	"""
+	deadline = time.time() + timeout
+	wm = None
+	notifier = None
+	if notifyInstalled:
+		try:
+			wm = pyinotify.WatchManager()
+			wm.add_watch(
+				path, pyinotify.IN_MODIFY | pyinotify.IN_ATTRIB | pyinotify.IN_MOVE_SELF | pyinotify.IN_DELETE_SELF
+			)
+			notifier = pyinotify.Notifier(wm, pyinotify.ProcessEvent())
+		except Exception:
+			notifier = None
+
+	try:
+		while True:
+			try:
+				st = os.stat(path)
+			except OSError:
+				return
+			if st.st_size != size or st.st_ino != inode:
+				return
+
+			remaining = deadline - time.time()
+			if remaining <= 0:
+				return
+
+			if notifier is not None:
+				if notifier.check_events(int(remaining * 1000)):
+					notifier.read_events()
+					notifier.process_events()
+			else:
+				time.sleep(min(remaining, FOLLOW_POLL))
+	finally:
+		if wm is not None:
+			wm.close()
+
+def validLogPath(path):
+	realPath = os.path.realpath(path)
+	return realPath.startswith(os.path.realpath(LOG_BASE) + os.sep) and os.path.isfile(realPath)
+
+def parseTime(line, refTime):
+	"""
+	Returns the unix timestamp of a log line (syslog or ISO format) or None.
+	Syslog lines have no year, so the year is taken from `refTime` (mtime of
+	the file).
+	"""
+	m = SYSLOG_TIME.match(line)
+	if m is not None:
+		month = MONTHS.get(m.group(1))
+		if month is None:
+			return None
+		ref = datetime.datetime.fromtimestamp(refTime)
+		try:
+			ts = datetime.datetime(
+				ref.year, month, int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5))
+			)
+		except ValueError:
+			return None
+		# entries from december in a file written in january.
+		if ts > ref + datetime.timedelta(days=1):
+			ts = ts.replace(year=ref.year - 1)
+		return int(ts.timestamp())
+
+	m = ISO_TIME.match(line)
+	if m is not None:
+		try:
+			return int(datetime.datetime(*[int(f) for f in m.groups()]).timestamp())
+		except ValueError:
+			return None
+
+	return None
+
+class LineIndex:
+	"""
+	Sparse index of a log file: every `EVERY` lines the byte offset and the
+	time of the line is remembered. Used to resume searches with line numbers
+	and to skip everything before the start of a time range. The index is
+	shared by the request threads.
+	"""
+	EVERY = 1000
+
+	def __init__(self, path, key):
+		self.path = path
+		self.key = key
+		self.lock = threading.Lock()
+		# (line number, byte offset, timestamp or None)
+		self.points = [(0, 0, None)]
+		# everything before this byte offset is indexed.
+		self.covered = 0
+
+	def __getstate__(self):
+		with self.lock:
+			state = self.__dict__.copy()
+			state['points'] = list(self.points)
+		del(state['lock'])
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.lock = threading.Lock()
+
+	def validFor(self, key):
+		(mtime, size, inode, gzipped) = key
+		with self.lock:
+			if self.key == key:
+				return True
+			# plain logs only grow - the indexed prefix is still valid.
+			return not gzipped and self.key[2] == inode and self.key[1] <= size and not self.key[3]
+
+	def addPoint(self, lineNo, offset, ts):
+		"""
+		Returns True if a new checkpoint was added.
+		"""
+		with self.lock:
+			if offset > self.covered:
+				self.covered = offset
+				if lineNo >= self.points[-1][0] + LineIndex.EVERY:
+					self.points.append((lineNo, offset, ts))
+					return True
+
+		return False
+
+	def findStart(self, since = None, offset = None):
+		"""
+		Returns the checkpoint (line, offset) where a scan has to start.
+		"""
+		with self.lock:
+			best = self.points[0]
+			if since is None and offset is None:
+				return best[0], best[1]
+
+			for point in self.points:
+				if offset is not None and point[1] > offset:
+					break
+				if since is not None and point[2] is not None and point[2] >= since:
+					break
+				best = point
+
+		return best[0], best[1]
+
+class GzipIndex:
+	"""
+	Seekable access to a gzip file. While walking once through the file,
+	the state of the decompressor is saved every `SPAN` uncompressed bytes,
+	so a later read starts at the nearest checkpoint instead of the beginning.
+	"""
+	SPAN = 4 * 1024 * 1024
+	READ_SIZE = 32 * 1024
+
+	def __init__(self, path):
+		self.path = path
+		self.size = 0
+		# (uncompressed offset, compressed offset, decompressor)
+		self.points = []
+		self.offsets = []
+		self.build()
+
+	def build(self):
+		decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+		self.points = [(0, 0, decomp.copy())]
+		uoff = 0
+		coff = 0
+		nextPoint = GzipIndex.SPAN
+		with open(self.path, 'rb') as f:
+			while True:
+				buf = f.read(GzipIndex.READ_SIZE)
+				if not buf:
+					break
+				coff += len(buf)
+				while buf:
+					uoff += len(decomp.decompress(buf))
+					buf = b''
+					if decomp.eof:
+						# multi member gzip (e.g. concatenated by logrotate)
+						buf = decomp.unused_data
+						decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+				if uoff >= nextPoint and not decomp.eof:
+					self.points.append((uoff, coff, decomp.copy()))
+					nextPoint = uoff + GzipIndex.SPAN
+
+		self.size = uoff
+		self.offsets = [f[0] for f in self.points]
+
+	def iterate(self, offset):
+		"""
+		Yields the uncompressed data beginning at `offset` block by block.
+		"""
+		if offset >= self.size:
+			return
+
+		(uoff, coff, decomp) = self.points[bisect.bisect_right(self.offsets, offset) - 1]
+		decomp = decomp.copy()
+		with open(self.path, 'rb') as f:
+			f.seek(coff)
+			while True:
+				buf = f.read(GzipIndex.READ_SIZE)
+				if not buf:
+					break
+				while buf:
+					out = decomp.decompress(buf)
+					buf = b''
+					if decomp.eof:
+						buf = decomp.unused_data
+						decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+					# skip everything before the requested offset
+					if uoff + len(out) <= offset:
+						uoff += len(out)
+						continue
+					if uoff < offset:
+						out = out[offset - uoff:]
+						uoff = offset
+					uoff += len(out)
+					if out:
+						yield out
+
+	def read(self, offset, length):
+		if offset >= self.size or length <= 0:
+			return b''
+
+		data = []
+		collected = 0
+		for out in self.iterate(offset):
+			data.append(out)
+			collected += len(out)
+			if collected >= length:
+				break
+
+		return b''.join(data)[:length]
+
+class LogInventory:
+	"""
+	Cached list of all log files below LOG_BASE. Only new or changed files
+	(mtime, size, inode) are classified again.
+	"""
+	__instance = None
+
+	def __init__(self, base = LOG_BASE):
+		LogInventory.__instance = self
+		self.base = base
+		self.lock = threading.Lock()
+		# path -> ((mtime, size, inode), type)
+		self.files = {}
+		self.lastRefresh = 0
+
+	@staticmethod
+	def getInstance():
+		if LogInventory.__instance is None:
+			LogInventory()
+
+		return LogInventory.__instance
+
+	def refresh(self, force = False):
+		with self.lock:
+			if not force and time.time() - self.lastRefresh < INVENTORY_TTL:
+				return
+
+			files = {}
+			for root, dirs, names in os.walk(self.base):
+				for name in names:
+					fullPath = os.path.join(root, name)
+					try:
+						st = os.stat(fullPath)
+					except OSError:
+						continue
+					if not os.path.isfile(fullPath):
+						continue
+
+					key = (st.st_mtime, st.st_size, st.st_ino)
+					cached = self.files.get(fullPath)
+					if cached is not None and cached[0] == key:
+						files[fullPath] = cached
+					else:
+						files[fullPath] = (key, sniffType(fullPath))
+
+			self.files = files
+			self.lastRefresh = time.time()
+
+	def getLogs(self):
+		self.refresh()
+		with self.lock:
+			items = list(self.files.items())
+
+		return sorted(
+			[
+				{'file': path, 'mtime': key[0], 'size': key[1], 'type': fileType}
+				for (path, (key, fileType)) in items if fileType is not None
+			],
+			key=lambda f: f['file']
+		)
+
+class LogReader:
+	"""
+	Reads ranges of (rotated) log files. Plain files are mapped into memory,
+	gzip files are accessed through a cached `GzipIndex`.
+	"""
+	__instance = None
+	INDEX_CACHE = 8
+
+	def __init__(self):
+		LogReader.__instance = self
+		self.log = logging.getLogger('flscp')
+		self.lock = threading.Lock()
+		# path -> ((mtime, size, inode), GzipIndex)
+		self.indexes = {}
+		# path -> LineIndex
+		self.lineIndexes = {}
+		# directory for persisting the line indexes (optional)
+		self.indexDir = None
+
+	@staticmethod
+	def getInstance():
+		if LogReader.__instance is None:
+			LogReader()
+
+		return LogReader.__instance
+
+	def getGzipIndex(self, path):
+		st = os.stat(path)
+		key = (st.st_mtime, st.st_size, st.st_ino)
+		with self.lock:
+			cached = self.indexes.get(path)
+			if cached is not None and cached[0] == key:
+				return cached[1]
+
+		idx = GzipIndex(path)
+		with self.lock:
+			if path not in self.indexes and len(self.indexes) >= LogReader.INDEX_CACHE:
+				del(self.indexes[next(iter(self.indexes))])
+			self.indexes[path] = (key, idx)
+
+		return idx
+
+	def readRange(self, path, start, end):
+		if isGzip(path):
+			return self.getGzipIndex(path).read(start, end - start)
+
+		with open(path, 'rb') as f:
+			if end <= start:
+				return b''
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+				return m[start:end]
+
+	def getSize(self, path):
+		if isGzip(path):
+			return self.getGzipIndex(path).size
+		else:
+			return os.path.getsize(path)
+
+	def getLineIndex(self, path):
+		st = os.stat(path)
+		key = (st.st_mtime, st.st_size, st.st_ino, isGzip(path))
+		with self.lock:
+			idx = self.lineIndexes.get(path)
+
+		if idx is None and self.indexDir is not None:
+			idxFile = self.getLineIndexFile(path)
+			try:
+				with open(idxFile, 'rb') as f:
+					idx = pickle.load(f)
+			except (OSError, EOFError, pickle.PickleError, AttributeError):
+				idx = None
+
+		if idx is None or not idx.validFor(key):
+			idx = LineIndex(path, key)
+		else:
+			with idx.lock:
+				idx.key = key
+
+		with self.lock:
+			# another request may have loaded the index in the meantime.
+			cached = self.lineIndexes.get(path)
+			if cached is not None and cached is not idx and cached.key == key:
+				return cached
+			self.lineIndexes[path] = idx
+
+		return idx
+
+	def getLineIndexFile(self, path):
+		return os.path.join(self.indexDir, '%s.idx' % (hashlib.sha1(path.encode('utf-8')).hexdigest(),))
+
+	def saveLineIndex(self, idx):
+		if self.indexDir is None:
+			return
+
+		try:
+			os.makedirs(self.indexDir, 0o750, exist_ok=True)
+			tmpFile = self.getLineIndexFile(idx.path) + '.tmp'
+			with open(tmpFile, 'wb') as f:
+				pickle.dump(idx, f)
+			os.replace(tmpFile, self.getLineIndexFile(idx.path))
+		except OSError as e:
+			self.log.warning('Could not save line index of %s (%s)' % (idx.path, e))
+
+	def iterLines(self, path, offset = 0):
+		"""
+		Yields (offset, line) for every line beginning at `offset`.
+		"""
+		if isGzip(path):
+			rest = b''
+			pos = offset
+			for block in self.getGzipIndex(path).iterate(offset):
+				lines = (rest + block).split(b'\n')
+				rest = lines.pop()
+				for line in lines:
+					yield pos, line
+					pos += len(line) + 1
+			if rest:
+				yield pos, rest
+		else:
+			with open(path, 'rb') as f:
+				f.seek(offset)
+				pos = offset
+				for line in f:
+					yield pos, line.rstrip(b'\n')
+					pos += len(line)
+
+	def search(self, path, matcher, since = None, until = None, offset = None, line = None,
+			limit = SEARCH_LIMIT, reverse = False, end = None, scanMax = SEARCH_SCAN_MAX):
+		"""
+		Searches `path` for lines matching the compiled (bytes) `matcher`.
+		Returns (matches, next, scanned bytes) where next is (offset, line) to
+		continue or None if the file was searched completely. With `reverse` the last
+		`limit` matches before `end` are returned; only the `scanMax` bytes
+		before `end` are searched, next is then the offset to continue
+		backwards from (line numbers are None if the index does not reach
+		that part of the file).
+		"""
+		idx = self.getLineIndex(path)
+		refTime = idx.key[0]
+		windowStart = 0
+		if offset is None or line is None:
+			(lineNo, pos) = idx.findStart(since=since, offset=offset)
+			if reverse:
+				if end is None:
+					end = self.getSize(path)
+				windowStart = max(0, end - scanMax)
+				if pos >= windowStart:
+					# everything before is older than `since`.
+					windowStart = 0
+				else:
+					(lineNo, pos) = idx.findStart(offset=windowStart)
+					if windowStart - pos > scanMax:
+						# not indexed that far: start at the window without line numbers.
+						(lineNo, pos) = (None, windowStart)
+		else:
+			lineNo = int(line)
+			pos = int(offset)
+
+		# a scan in the middle of a line skips the rest of it.
+		skipPartial = lineNo is None and pos > 0 and self.readRange(path, pos - 1, pos) != b'\n'
+		startOffset = None if offset is None else int(offset)
+		matches = collections.deque(maxlen=limit if reverse else None)
+		nextPos = None
+		scanned = 0
+		grown = False
+		for (pos, text) in self.iterLines(path, pos):
+			if skipPartial:
+				skipPartial = False
+				continue
+			if end is not None and pos >= end:
+				break
+
+			ts = None
+			checkpoint = lineNo is not None and lineNo % LineIndex.EVERY == 0
+			if checkpoint or since is not None or until is not None:
+				ts = parseTime(text, refTime)
+			if checkpoint:
+				grown = idx.addPoint(lineNo, pos, ts) or grown
+
+			if until is not None and ts is not None and ts > until:
+				break
+
+			if (startOffset is None or pos >= startOffset) and (since is None or ts is None or ts >= since) \
+					and matcher.search(text) is not None:
+				matches.append({
+					'file': path,
+					'offset': str(pos),
+					'line': None if lineNo is None else lineNo + 1,
+					'text': text.decode('utf-8', errors='replace')
+				})
+				if not reverse and len(matches) >= limit:
+					nextPos = (pos + len(text) + 1, lineNo + 1)
+					break
+
+			if lineNo is not None:
+				lineNo += 1
+			scanned += len(text) + 1
+			if not reverse and scanned >= scanMax:
+				nextPos = (pos + len(text) + 1, lineNo)
+				break
+
+		if reverse and windowStart > 0 and len(matches) < limit:
+			nextPos = (windowStart, None)
+
+		# the index is only written if it got new checkpoints.
+		if grown:
+			self.saveLineIndex(idx)
+
+		return list(matches), nextPos, scanned
+
+	def readChunk(self, path, offset = None, maxBytes = CHUNK_SIZE, direction = DIRECTION_HEAD):
+		"""
+		Returns a chunk of the log file aligned to full lines.
+		For `DIRECTION_HEAD` the chunk starts at `offset`, for `DIRECTION_TAIL`
+		it ends at `offset` (or at the end of the file if offset is None).
+		"""
+		maxBytes = max(1, min(int(maxBytes), CHUNK_MAX))
+		size = self.getSize(path)
+
+		if direction == DIRECTION_TAIL:
+			end = size if offset is None else max(0, min(int(offset), size))
+			start = max(0, end - maxBytes)
+		else:
+			start = 0 if offset is None else max(0, min(int(offset), size))
+			end = min(size, start + maxBytes)
+
+		data = self.readRange(path, start, end)
+
+		# we only want to deliver complete lines.
+		if direction == DIRECTION_TAIL and start > 0:
+			pos = data.find(b'\n')
+			if pos >= 0 and pos + 1 < len(data):
+				data = data[pos + 1:]
+				start = end - len(data)
+		elif direction != DIRECTION_TAIL and end < size:
+			pos = data.rfind(b'\n')
+			if pos >= 0:
+				data = data[:pos + 1]
+				end = start + len(data)
+
+		return {
+			'file': path,
+			'offset': start,
+			'end': end,
+			'size': size,
+			'data': data.decode('utf-8', errors='replace')
+		}
+
+	def follow(self, path, offset, inode = None, timeout = FOLLOW_TIMEOUT):
+		"""
+		Returns the data appended to `path` after `offset`. If there is
+		nothing new, it waits up to `timeout` seconds for new data. If the
+		file was rotated or truncated in the meantime, it starts at 0 again.
+		Gzip files do not grow: the rest is returned at once and followable is
+		False, the client has to stop following then.
+		"""
+		timeout = max(0, min(float(timeout), FOLLOW_TIMEOUT))
+		rotated = False
+		st = os.stat(path)
+		if isGzip(path):
+			chunk = self.readChunk(path, offset, CHUNK_MAX, DIRECTION_HEAD)
+		else:
+			if (inode is not None and int(inode) != st.st_ino) or st.st_size < offset:
+				rotated = True
+				offset = 0
+			elif st.st_size == offset:
+				waitForChange(path, st.st_size, st.st_ino, timeout)
+				oldInode = st.st_ino
+				st = os.stat(path)
+				if st.st_ino != oldInode or st.st_size < offset:
+					rotated = True
+					offset = 0
+
+			chunk = self.readChunk(path, offset, CHUNK_MAX, DIRECTION_HEAD)
+
+		chunk['inode'] = st.st_ino
+		chunk['rotated'] = rotated
+		chunk['followable'] = not isGzip(path)
+		return chunk
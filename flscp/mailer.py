@@ -1,14 +1,208 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
-import os
+import os, os.path
 import logging
 import re
+import time
+import threading
 import smtplib
 from email.mime.text import MIMEText
+from mailqueue import MailQueue
+try:
+	import pyinotify
+	notifyInstalled = True
+except:
+	notifyInstalled = False
 
 workDir = os.path.dirname(os.path.realpath(__file__))
 
+# seconds until the template paths are checked again (with inotify the
+# cache is invalidated on changes, the check only finds new directories)
+TEMPLATE_CHECK = 5
+TEMPLATE_CHECK_NOTIFY = 60
+
+SENDER_PATTERN = re.compile('# SENDER\\n(.*)\\n# REDNES')
+SUBJECT_PATTERN = re.compile('# SUBJECT\\n(.*)\\n# TCEJBUS')
+BODY_PATTERN = re.compile('# BODY\\n(.*)\\n# YDOB', re.S)
+FIELD_PATTERN = re.compile(r'%\((\w+)\)')
+
+class MailTemplate:
+	"""
+	A parsed mail template. The body is filled with the params of the
+	template and the given values (the values win).
+	"""
+
+	def __init__(self, path, sender, subject, body, params):
+		self.path = path
+		self.sender = sender
+		self.subject = subject
+		self.body = body
+		self.params = params
+		self.fields = set(FIELD_PATTERN.findall(body))
+
+	def render(self, values):
+		return self.body % dict(self.params, **values)
+
+	@classmethod
+	def parse(tpl, path, content):
+		"""
+		Returns the template or None if it is invalid.
+		"""
+		sender = SENDER_PATTERN.search(content)
+		subject = SUBJECT_PATTERN.search(content)
+		body = BODY_PATTERN.search(content)
+		if sender is None or subject is None or body is None:
+			return None
+
+		## any special variables?
+		### they are after YDOB
+		params = {}
+		variables = content[content.find('# YDOB')+len('# YDOB\n'):]
+		if len(variables) > 0:
+			parm = []
+			search = None
+			for f in variables.split('\n'):
+				if search is None and f.startswith('# '):
+					search = '# ' + f[2:][::-1]
+				elif search is not None and f == search:
+					params[f[2:][::-1]] = '\n'.join(parm)
+					search = None
+					parm = []
+				else:
+					parm.append(f)
+
+		self = tpl(path, sender.group(1), subject.group(1), body.group(1), params)
+		# the body has to be usable for the substitution.
+		try:
+			self.render(dict((f, '') for f in self.fields))
+		except (ValueError, TypeError):
+			return None
+
+		return self
+
+class MailTemplates:
+	"""
+	The parsed mail templates. A template is looked up in the template
+	directories (first match wins) and parsed once per file version (real
+	path and mtime). The lookup is repeated after TEMPLATE_CHECK seconds or
+	if inotify reports a change in one of the directories.
+	"""
+	__instance = None
+
+	def __init__(self, searchPaths = None):
+		MailTemplates.__instance = self
+		self.log = logging.getLogger('flscp')
+		self.lock = threading.Lock()
+		if searchPaths is None:
+			searchPaths = [
+				os.path.expanduser(os.path.join('~', '.config', 'flscp', 'templates')),
+				os.path.join(os.sep, 'etc', 'flscp', 'templates'),
+				os.path.join(os.sep, 'usr', 'local', 'etc', 'flscp', 'templates'),
+				os.path.join(workDir, 'templates', 'custom'),
+				os.path.join(workDir, 'templates', 'default')
+			]
+		self.searchPaths = searchPaths
+		# (real path, mtime) -> MailTemplate
+		self.templates = {}
+		# name -> (real path, mtime, time of the lookup)
+		self.resolved = {}
+		self.notifier = None
+
+	@staticmethod
+	def getInstance():
+		if MailTemplates.__instance is None:
+			MailTemplates()
+
+		return MailTemplates.__instance
+
+	def get(self, name):
+		"""
+		Returns the MailTemplate or None if there is no valid template.
+		"""
+		now = time.time()
+		check = TEMPLATE_CHECK_NOTIFY if self.notifier is not None else TEMPLATE_CHECK
+		with self.lock:
+			entry = self.resolved.get(name)
+			if entry is not None and now - entry[2] < check:
+				return self.templates.get(entry[:2])
+
+		(path, mtime) = self.resolve(name)
+		key = (path, mtime)
+		with self.lock:
+			tpl = self.templates.get(key)
+
+		if tpl is None and path is not None:
+			tpl = self.load(path)
+			with self.lock:
+				# older versions of the file are not needed anymore.
+				for f in [f for f in self.templates if f[0] == path]:
+					del(self.templates[f])
+				self.templates[key] = tpl
+
+		with self.lock:
+			self.resolved[name] = (path, mtime, now)
+
+		return tpl
+
+	def resolve(self, name):
+		for folder in self.searchPaths:
+			path = os.path.join(folder, '%s.txt' % (name,))
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+
+			return (os.path.realpath(path), st.st_mtime_ns)
+
+		return (None, None)
+
+	def load(self, path):
+		try:
+			with open(path, 'rb') as f:
+				content = f.read().decode('utf-8')
+		except (OSError, UnicodeDecodeError) as e:
+			self.log.warning('Could not read mail template %s: %s' % (path, e))
+			return None
+
+		tpl = MailTemplate.parse(path, content)
+		if tpl is None:
+			self.log.warning('Invalid mail template %s' % (path,))
+		else:
+			self.log.debug('Loaded mail template %s' % (path,))
+
+		return tpl
+
+	def invalidate(self):
+		with self.lock:
+			self.resolved = {}
+
+	def watch(self):
+		"""
+		Invalidates the lookups on changes in the template directories
+		(requires pyinotify).
+		"""
+		if not notifyInstalled or self.notifier is not None:
+			return False
+
+		try:
+			wm = pyinotify.WatchManager()
+			for folder in self.searchPaths:
+				if os.path.isdir(folder):
+					wm.add_watch(
+						folder, pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | pyinotify.IN_DELETE |
+						pyinotify.IN_MOVED_TO | pyinotify.IN_MOVED_FROM | pyinotify.IN_ATTRIB
+					)
+			self.notifier = pyinotify.ThreadedNotifier(wm, lambda event: self.invalidate())
+			self.notifier.daemon = True
+			self.notifier.start()
+		except Exception as e:
+			self.log.warning('Could not watch the mail templates: %s' % (e,))
+			self.notifier = None
+			return False
+
+		return True
+
 class Mailer:
 
 	def __init__(self, account):
@@ -17,138 +211,97 @@ class Mailer:
 
 	def newAccount(self):
 		# exist custom template?
-		mailContent = Mailer.getMail('newmail')
-		if mailContent is None:
+		tpl = Mailer.getTemplate('newmail')
+		if tpl is None:
 			self.log.warning('Could not load mail "newmail"!')
 			return False
 
-		msg = MIMEText(
-			mailContent['body'] % {
-				'username': '%s@%s' % (self.account.mail,self.account.domain),
-				'password': self.account.pw,
-				'forwarders': ', '.join(self.account.forward) if len(self.account.forward) > 0 else mailContent['params']['noforward'],
-				'notgenerated': mailContent['params']['notgenerated'] if not self.account.genPw else '',
-				'quota': self.account.getQuotaReadable()
-			},
-			_charset='utf-8'
-		)
-
-		msg['Subject'] = mailContent['subject']
-		msg['From'] = mailContent['sender']
-		msg['To'] = self.account.altMail
-
-		return Mailer.sendMail(msg, mailContent['sender'], self.account.altMail)
+		return self.send(tpl, {
+			'username': '%s@%s' % (self.account.mail,self.account.domain),
+			'password': self.account.pw,
+			'forwarders': ', '.join(self.account.forward) if len(self.account.forward) > 0 else tpl.params['noforward'],
+			'notgenerated': tpl.params['notgenerated'] if not self.account.genPw else '',
+			'quota': self.account.getQuotaReadable()
+		})
 
 	def newForward(self):
 		# exist custom template?
-		mailContent = Mailer.getMail('newforward')
-		if mailContent is None:
+		tpl = Mailer.getTemplate('newforward')
+		if tpl is None:
 			self.log.warning('Could not load mail "newforward"!')
 			return False
 
-		msg = MIMEText(
-			mailContent['body'] % {
-				'username': '%s@%s' % (self.account.mail,self.account.domain),
-				'forwarders': ', '.join(self.account.forward)
-			},
-			_charset='utf-8'
-		)
-
-		msg['Subject'] = mailContent['subject']
-		msg['From'] = mailContent['sender']
-		msg['To'] = self.account.altMail
-
-		return Mailer.sendMail(msg, mailContent['sender'], self.account.altMail)
+		return self.send(tpl, {
+			'username': '%s@%s' % (self.account.mail,self.account.domain),
+			'forwarders': ', '.join(self.account.forward)
+		})
 
 	def changeAccount(self):
 		# exist custom template?
-		mailContent = Mailer.getMail('changemail')
-		if mailContent is None:
+		tpl = Mailer.getTemplate('changemail')
+		if tpl is None:
 			self.log.warning('Could not load mail "changemail"!')
 			return False
 
-		msg = MIMEText(
-			mailContent['body'] % {
-				'username': '%s@%s' % (self.account.mail,self.account.domain),
-				'password': self.account.pw if len(self.account.pw) > 0 else mailContent['params']['notchanged'],
-				'forwarders': ', '.join(self.account.forward) if len(self.account.forward) > 0 else mailContent['params']['noforward'],
-				'quota': self.account.getQuotaReadable()
-			},
-			_charset='utf-8'
-		)
-
-		msg['Subject'] = mailContent['subject']
-		msg['From'] = mailContent['sender']
-		msg['To'] = self.account.altMail
-
-		return Mailer.sendMail(msg, mailContent['sender'], self.account.altMail)
+		return self.send(tpl, {
+			'username': '%s@%s' % (self.account.mail,self.account.domain),
+			'password': self.account.pw if len(self.account.pw) > 0 else tpl.params['notchanged'],
+			'forwarders': ', '.join(self.account.forward) if len(self.account.forward) > 0 else tpl.params['noforward'],
+			'quota': self.account.getQuotaReadable()
+		})
 
 	def sendPasswordLink(self):
 		# exist custom template?
-		mailContent = Mailer.getMail('sendpwlink')
-		if mailContent is None:
+		tpl = Mailer.getTemplate('sendpwlink')
+		if tpl is None:
 			self.log.warning('Could not load mail "sendpwlink"!')
 			return False
 
-		msg = MIMEText(
-			mailContent['body'] % {
-				'username': '%s@%s' % (self.account.mail,self.account.domain),
-				'authcode': '%s' % (self.account.authCode,),
-				'authvalid': self.account.authValid.strftime('%d.%m.%Y %H:%M:%S')
-			},
-			_charset='utf-8'
-		)
-
-		msg['Subject'] = mailContent['subject']
-		msg['From'] = mailContent['sender']
-		msg['To'] = self.account.altMail
-
-		return Mailer.sendMail(msg, mailContent['sender'], self.account.altMail)
+		return self.send(tpl, {
+			'username': '%s@%s' % (self.account.mail,self.account.domain),
+			'authcode': '%s' % (self.account.authCode,),
+			'authvalid': self.account.authValid.strftime('%d.%m.%Y %H:%M:%S')
+		})
 
 	def sendNewPassword(self):
 		# exist custom template?
-		mailContent = Mailer.getMail('sendpw')
-		if mailContent is None:
+		tpl = Mailer.getTemplate('sendpw')
+		if tpl is None:
 			self.log.warning('Could not load mail "sendpw"!')
 			return False
 
-		msg = MIMEText(
-			mailContent['body'] % {
-				'username': '%s@%s' % (self.account.mail,self.account.domain),
-				'password': '%s' % (self.account.pw,)
-			},
-			_charset='utf-8'
-		)
-
-		msg['Subject'] = mailContent['subject']
-		msg['From'] = mailContent['sender']
-		msg['To'] = self.account.altMail
-
-		return Mailer.sendMail(msg, mailContent['sender'], self.account.altMail)
+		return self.send(tpl, {
+			'username': '%s@%s' % (self.account.mail,self.account.domain),
+			'password': '%s' % (self.account.pw,)
+		})
 
 	def changeForward(self):
 		# exist custom template?
-		mailContent = Mailer.getMail('changeforward')
-		if mailContent is None:
+		tpl = Mailer.getTemplate('changeforward')
+		if tpl is None:
 			self.log.warning('Could not load mail "changeforward"!')
 			return False
 
-		msg = MIMEText(
-			mailContent['body'] % {
-				'username': '%s@%s' % (self.account.mail,self.account.domain),
-				'forwarders': ', '.join(self.account.forward)
-			},
-			_charset='utf-8'
-		)
+		return self.send(tpl, {
+			'username': '%s@%s' % (self.account.mail,self.account.domain),
+			'forwarders': ', '.join(self.account.forward)
+		})
 
-		msg['Subject'] = mailContent['subject']
-		msg['From'] = mailContent['sender']
+	def send(self, tpl, values):
+		msg = MIMEText(tpl.render(values), _charset='utf-8')
+		msg['Subject'] = tpl.subject
+		msg['From'] = tpl.sender
 		msg['To'] = self.account.altMail
 
-		return Mailer.sendMail(msg, mailContent['sender'], self.account.altMail)
+		return Mailer.sendMail(msg, tpl.sender, self.account.altMail)
 
 	@staticmethod
 	def sendMail(msg, sender, recipient):
+		# with a running queue the mail is only spooled here.
+		queue = MailQueue.getInstance()
+		if queue is not None and queue.isRunning():
+			return queue.enqueue(msg, sender, [recipient])
+
 		try:
 			s = smtplib.SMTP('localhost')
 			s.sendmail(sender, [recipient], msg.as_string())
@@ -161,68 +314,5 @@ class Mailer:
 			return True
 
 	@staticmethod
-	def getMail(mail):
-		mailContent = {
-			'subject': None, 'body': None, 'sender': None,
-			'params': {}
-		}
-
-		basePath = os.path.join(workDir, 'templates', 'default', '%s.txt' % (mail,))
-		basePathCustom = os.path.join(workDir, 'templates', 'custom', '%s.txt' % (mail,))
-		homePath = os.path.expanduser(os.path.join('~', '.config', 'flscp', 'templates', '%s.txt' % (mail,)))
-		etcPath = os.path.join(os.sep, 'etc', 'flscp', 'templates', '%s.txt' % (mail,))
-		etcPathLocal = os.path.join(os.sep, 'usr', 'local', 'etc', 'flscp', 'templates', '%s.txt' % (mail,))
-		pathList = [homePath, etcPath, etcPathLocal, basePathCustom, basePath]
-
-		content = None
-		for f in pathList:
-			if os.path.exists(f):
-				with open(f, 'rb') as f:
-					content = f.read()
-				break
-
-		if content is None:
-			return None
-		else:
-			content = content.decode('utf-8')
-
-		# now extract data
-		## first the sender
-		m = re.compile('# SENDER\\n(.*)\\n# REDNES').search(content)
-		if m is None:
-			return None
-		else:
-			mailContent['sender'] = m.group(1)
-
-		## subject
-		m = re.compile('# SUBJECT\\n(.*)\\n# TCEJBUS').search(content)
-		if m is None:
-			return None
-		else:
-			mailContent['subject'] = m.group(1)
-
-		## body
-		m = re.compile('# BODY\\n(.*)\\n# YDOB', re.S).search(content)
-		if m is None:
-			return None
-		else:
-			mailContent['body'] = m.group(1)
-
-		## any special variables?
-		### they are after YDOB
-		variables = content[content.find('# YDOB')+len('# YDOB\n'):]
-		if len(variables) > 0:
-			variables = variables.split('\n')
-			parm = []
-			search = None
-			for f in variables:
-				if search is None and f.startswith('# '):
-					search = '# ' + f[2:][::-1]
-				elif search is not None and f == search:
-					mailContent['params'][f[2:][::-1]] = '\n'.join(parm)
-					search = None
-					parm = []
-				else:
-					parm.append(f)
-
-		return mailContent
+	def getTemplate(mail):
+		return MailTemplates.getInstance().get(mail)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import os, os.path
+import stat
+import time
+import uuid
+import pickle
+import logging
+import smtplib
+import threading
+
+# number of mails sent over one SMTP connection
+BATCH_SIZE = 100
+# the queue depth is logged if it exceeds this number of mails
+DEPTH_WARNING = 500
+
+class MailQueue:
+	"""
+	Outgoing notification mails. Every mail is written into the spool
+	directory first (one file per mail) and delivered by a background
+	thread: all due mails are sent over one SMTP connection. Temporary
+	failures are retried with a doubled delay each time, mails which are
+	refused permanently or are older than maxAge are dropped. Spooled
+	mails are delivered after a restart, too.
+	"""
+	__instance = None
+
+	def __init__(self, spoolDir, host = 'localhost', port = 25, retryDelay = 60, maxRetryDelay = 3600, maxAge = 259200):
+		MailQueue.__instance = self
+		self.log = logging.getLogger('flscp')
+		self.spoolDir = spoolDir
+		self.host = host
+		self.port = port
+		self.retryDelay = retryDelay
+		self.maxRetryDelay = maxRetryDelay
+		self.maxAge = maxAge
+		self.cond = threading.Condition()
+		# file name -> {'sender', 'recipients', 'message', 'created', 'attempts', 'nextTry', 'error'}
+		self.items = {}
+		self.thread = None
+		self.stopping = False
+		self.sent = 0
+		self.dropped = 0
+		self.lastError = None
+
+	@staticmethod
+	def getInstance():
+		return MailQueue.__instance
+
+	def isRunning(self):
+		return self.thread is not None and self.thread.is_alive()
+
+	def start(self):
+		"""
+		Loads the spooled mails and starts the delivery. Returns False if the
+		spool directory is not usable (mails are sent directly then).
+		"""
+		try:
+			if not os.path.exists(self.spoolDir):
+				os.makedirs(self.spoolDir, 0o700)
+			self.checkSpoolDir()
+			items = self.loadSpool()
+		except OSError as e:
+			self.log.error('Mail queue disabled: spool directory %s is not usable (%s)' % (self.spoolDir, e))
+			return False
+
+		with self.cond:
+			self.items.update(items)
+			self.stopping = False
+		if len(items) > 0:
+			self.log.info('Mail queue: %i spooled mails loaded' % (len(items),))
+
+		self.thread = threading.Thread(target=self.run, name='flscp-mailqueue', daemon=True)
+		self.thread.start()
+
+		return True
+
+	def stop(self, timeout = 10):
+		with self.cond:
+			self.stopping = True
+			self.cond.notify_all()
+
+		if self.thread is not None:
+			self.thread.join(timeout)
+			self.thread = None
+
+	def checkSpoolDir(self):
+		# the spooled mails contain passwords and are unpickled on start:
+		# only we may read or write them.
+		st = os.stat(self.spoolDir)
+		if st.st_uid != os.geteuid():
+			raise PermissionError('owned by uid %i' % (st.st_uid,))
+		if stat.S_IMODE(st.st_mode) & 0o077:
+			self.log.warning('Mail queue: spool directory %s was accessible by others (mode %o), changed to 700' % (
+				self.spoolDir, stat.S_IMODE(st.st_mode)
+			))
+			os.chmod(self.spoolDir, 0o700)
+
+	def loadSpool(self):
+		items = {}
+		for name in os.listdir(self.spoolDir):
+			if not name.endswith('.mail'):
+				continue
+
+			try:
+				with open(os.path.join(self.spoolDir, name), 'rb') as f:
+					items[name] = pickle.load(f)
+			except (OSError, EOFError, pickle.UnpicklingError) as e:
+				self.log.warning('Mail queue: could not read spooled mail %s (%s)' % (name, e))
+
+		return items
+
+	def writeItem(self, name, item):
+		path = os.path.join(self.spoolDir, name)
+		tmpPath = '%s.tmp' % (path,)
+		with os.fdopen(os.open(tmpPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+			pickle.dump(item, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmpPath, path)
+
+	def removeItem(self, name):
+		try:
+			os.unlink(os.path.join(self.spoolDir, name))
+		except OSError as e:
+			self.log.warning('Mail queue: could not remove spooled mail %s (%s)' % (name, e))
+
+	def enqueue(self, msg, sender, recipients):
+		"""
+		Spools the message. Returns False if it could not be written.
+		"""
+		now = time.time()
+		name = '%.6f-%s.mail' % (now, uuid.uuid4().hex)
+		item = {
+			'sender': sender, 'recipients': list(recipients), 'message': msg.as_string(),
+			'created': now, 'attempts': 0, 'nextTry': now, 'error': None
+		}
+		try:
+			self.writeItem(name, item)
+		except OSError as e:
+			self.log.warning('Mail queue: could not spool mail to %s (%s)' % (', '.join(item['recipients']), e))
+			return False
+
+		with self.cond:
+			self.items[name] = item
+			depth = len(self.items)
+			self.cond.notify_all()
+
+		if depth >= DEPTH_WARNING and depth % DEPTH_WARNING == 0:
+			self.log.warning('Mail queue: %i mails are waiting' % (depth,))
+
+		return True
+
+	def getStatus(self):
+		"""
+		Returns the queue depth: number of queued mails, deferred ones (failed
+		at least once), age of the oldest mail in seconds and the counters.
+		"""
+		now = time.time()
+		with self.cond:
+			items = list(self.items.values())
+			return {
+				'running': self.isRunning(),
+				'queued': len(items),
+				'deferred': len([f for f in items if f['attempts'] > 0]),
+				'oldest': int(now - min(f['created'] for f in items)) if len(items) > 0 else 0,
+				'sent': self.sent,
+				'dropped': self.dropped,
+				'lastError': self.lastError
+			}
+
+	def getDue(self):
+		# has to be called with self.cond held.
+		now = time.time()
+		due = sorted(name for (name, item) in self.items.items() if item['nextTry'] <= now)
+		if len(due) > 0:
+			return (due[:BATCH_SIZE], None)
+
+		nextTry = min((f['nextTry'] for f in self.items.values()), default=None)
+		return ([], None if nextTry is None else max(0, nextTry - now))
+
+	def run(self):
+		while True:
+			with self.cond:
+				while not self.stopping:
+					(due, wait) = self.getDue()
+					if len(due) > 0:
+						break
+					self.cond.wait(wait)
+				if self.stopping:
+					return
+				batch = [(name, self.items[name]) for name in due]
+
+			try:
+				self.deliver(batch)
+			except Exception as e:
+				self.log.critical('Mail queue: unexpected error while sending mails: %s' % (e,))
+				# only the mails which are still queued (defer skips the others).
+				for (name, item) in batch:
+					self.defer(name, item, str(e))
+
+	def deliver(self, batch):
+		"""
+		Sends the batch over one SMTP connection.
+		"""
+		try:
+			smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+		except (OSError, smtplib.SMTPException) as e:
+			self.log.warning('Mail queue: could not connect to %s:%i (%s)' % (self.host, self.port, e))
+			for (name, item) in batch:
+				self.defer(name, item, str(e))
+			return
+
+		try:
+			for (nr, (name, item)) in enumerate(batch):
+				try:
+					refused = smtp.sendmail(item['sender'], item['recipients'], item['message'].encode('utf-8'))
+				except smtplib.SMTPRecipientsRefused as e:
+					codes = [code for (code, resp) in e.recipients.values()]
+					if all(code >= 500 for code in codes):
+						self.drop(name, item, 'recipients refused: %s' % (e.recipients,))
+					else:
+						self.defer(name, item, 'recipients refused: %s' % (e.recipients,))
+					smtp.rset()
+				except smtplib.SMTPResponseException as e:
+					error = '%i %s' % (e.smtp_code, e.smtp_error.decode('utf-8', 'replace'))
+					if e.smtp_code >= 500:
+						self.drop(name, item, error)
+					else:
+						self.defer(name, item, error)
+					smtp.rset()
+				except (OSError, smtplib.SMTPException) as e:
+					# connection is lost: the remaining mails are tried later.
+					for (restName, restItem) in batch[nr:]:
+						self.defer(restName, restItem, str(e))
+					return
+				else:
+					if len(refused) > 0:
+						self.log.warning('Mail queue: some recipients were refused: %s' % (refused,))
+					self.done(name)
+		finally:
+			try:
+				smtp.quit()
+			except (OSError, smtplib.SMTPException):
+				smtp.close()
+
+	def done(self, name):
+		self.removeItem(name)
+		with self.cond:
+			self.items.pop(name, None)
+			self.sent += 1
+
+	def drop(self, name, item, error):
+		self.log.error('Mail queue: mail to %s dropped (%s)' % (', '.join(item['recipients']), error))
+		self.removeItem(name)
+		with self.cond:
+			self.items.pop(name, None)
+			self.dropped += 1
+			self.lastError = error
+
+	def defer(self, name, item, error):
+		with self.cond:
+			# already sent or dropped (e.g. the connection broke afterwards).
+			if name not in self.items:
+				return
+
+		now = time.time()
+		if now - item['created'] > self.maxAge:
+			self.drop(name, item, 'too old, last error: %s' % (error,))
+			return
+
+		item['attempts'] += 1
+		item['error'] = error
+		item['nextTry'] = now + min(self.retryDelay * 2 ** (item['attempts'] - 1), self.maxRetryDelay)
+		try:
+			self.writeItem(name, item)
+		except OSError as e:
+			self.log.warning('Mail queue: could not update spooled mail %s (%s)' % (name, e))
+
+		with self.cond:
+			self.lastError = error
+		self.log.info(
+			'Mail queue: mail to %s deferred (attempt %i, next try in %is): %s' %
+			(', '.join(item['recipients']), item['attempts'], item['nextTry'] - now, error)
+		)
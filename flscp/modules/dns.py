@@ -6,8 +6,6 @@ import zlib
 import uuid
 from PyQt5 import QtCore
 from PyQt5.QtCore import pyqtSignal
-from database import MailDatabase
-from modules.domain import Domain
 
 class DNSList:
 
@@ -108,166 +106,6 @@ class Dns(QtCore.QObject):
 	def generateId(self):
 		self.id = 'Z%s' % (str(zlib.crc32(uuid.uuid4().hex.encode('utf-8')))[0:3],)
 
-	def save(self):
-		if self.state == Dns.STATE_CREATE:
-			return self.create()
-		elif self.state == Dns.STATE_CHANGE:
-			return self.update()
-		elif self.state == Dns.STATE_DELETE:
-			return self.delete()
-
-	def create(self):
-		# SOA entries are only allowed ONCE!
-		if self.type == Dns.TYPE_SOA and self.exists():
-			raise ValueError('Entry has to be UNIQUE!')
-
-		# is it a valid domain?
-		state, msg = self.validate()
-		if not state:
-			raise ValueError('No valid data given!')
-
-		db = MailDatabase.getInstance()
-		cx = db.getCursor()
-		self.state = Dns.STATE_CREATE
-		query = (
-			'INSERT INTO dns (domain_id, dns_key, dns_type, dns_prio, dns_value, dns_weight, dns_port, dns_admin,' \
-			'dns_refresh, dns_retry, dns_expire, dns_ttl, status)' \
-			'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'
-		)
-		cx.execute(
-			query, 
-			(
-				self.domainId, self.key, self.type, self.prio, self.value, self.weight, self.port, self.dnsAdmin,
-				self.refreshRate, self.retryRate, self.expireTime, self.ttl, self.state
-			)
-		)
-		db.commit()
-		# now get the dns id
-		dnsId = cx.lastrowid
-		if dnsId is None:
-			cx.close()
-			return False
-		else:
-			self.id = dnsId
-			cx.close()
-
-		# all fine! set the state!
-		self.setState(Dns.STATE_OK)
-
-	def update(self):
-		# is it valid?
-		retCode = True
-		state, msg = self.validate()
-		if not state:
-			raise ValueError('No valid Dns Entry!!!')
-
-		db = MailDatabase.getInstance()
-		cx = db.getCursor()
-		query = (
-			'UPDATE dns' \
-			'SET dns_key = %s,' \
-			'	dns_type = %s,' \
-			'	dns_prio = %s,' \
-			'	dns_value = %s,' \
-			'	dns_weight = %s,' \
-			'	dns_port = %s,' \
-			'	dns_admin = %s,' \
-			'	dns_refresh = %s,' \
-			'	dns_retry = %s,' \
-			'	dns_expire = %s,' \
-			'	dns_ttl = %s', \
-			'	status = %s' \
-			'WHERE dns_id = %s'
-		)
-		try:
-			cx.execute(
-				query,
-				(
-					self.key, self.type, self.prio, self.value, self.weight, self.port, self.dnsAdmin,
-					self.refreshRate, self.retryRate, self.expireTime, self.ttl, self.state, self.id
-				)
-			)
-		except Exception as e:
-			log = logging.getLogger('flscp')
-			log.warning('Could not save the dns entry %s (%s)' % (self.id, str(e)))
-			retCode = False
-		else:
-			db.commit()
-		finally:
-			cx.close()
-
-		# all fine! set the state!
-		self.setState(Dns.STATE_OK)
-
-		return retCode
-
-	def delete(self):
-		state = True
-		db = MailDatabase.getInstance()
-		cx = db.getCursor()
-		query = (
-			'DELETE FROM dns WHERE dns_id = %s'
-		)
-		try:
-			cx.execute(query, (self.id,))
-		except:
-			state = False
-		db.commit()
-		cx.close()
-
-		return state
-
-	def exists(self):
-		exists = False
-		db = MailDatabase.getInstance()
-		cx = db.getCursor()
-		# should be only called for SOA-Type
-		query = ('SELECT dns_id FROM dns WHERE dns_type = %s and domain_id = %s')
-		cx.execute(query, (self.type, self.domainId))
-		exists = len(cx.fetchall()) > 0
-		cx.close()
-		return exists
-
-	def load(self):
-		if self.id is None:
-			return False
-
-		state = False
-
-		db = MailDatabase.getInstance()
-		cx = db.getCursor()
-		query = (
-			'SELECT dns_id, domain_id, dns_key, dns_type, dns_value, dns_prio, dns_weight, dns_port, dns_admin, dns_refresh,' \
-			'dns_retry, dns_expire, dns_ttl, status FROM dns WHERE dns_id = %s LIMIT 1'
-		)
-		try:
-			cx.execute(query, (self.id,))
-			(
-				self.id, 
-				self.domainId,
-				self.key,
-				self.type,
-				self.value,
-				self.prio,
-				self.weight,
-				self.port, 
-				self.dnsAdmin,
-				self.refreshRate,
-				self.retryRate,
-				self.expireTime,
-				self.ttl,
-				self.state
-			) = cx.fetchone()
-
-		except Exception:
-			state = False
-		else:
-			state = True
-		finally:
-			cx.close()
-
-		return state
-
 	def validate(self):
 		state = True
 		msg = {}
@@ -340,63 +178,11 @@ class Dns(QtCore.QObject):
 
 		return state, msg
 
-	def generateDnsEntry(self, dl):
-		content = []
-		# get Domain!
-		try:
-			d = dl.findById(self.domainId)
-			if d is None:
-				d = Domain(self.domainId)
-				d.load()
-				dl.add(d)
-		except KeyError:
-			raise
-		else:
-			if d is False or d is None:
-				raise KeyError('Domain for DNS does not exist. Abort!')
-
-		if self.type == Dns.TYPE_SOA:
-			from datetime import datetime
-			timestamp = datetime.fromtimestamp(int(d.modified)).strftime('%Y%m%d%H%M%S')
-			formattedDnsAdmin = self.dnsAdmin.replace('@', '.')
-			content.append('%s.\tSOA\t%s\t%s. (' % (d.getFullDomain(dl), self.value, formattedDnsAdmin))
-			content.append('\t%s\t; Serial' % (timestamp,))
-			content.append('\t%ss\t; Refresh' % (self.refreshRate,))
-			content.append('\t%ss\t; Retry' % (self.retryRate,))
-			content.append('\t%ss\t; Expire' % (self.expireTime,))
-			content.append('\t%ss\t; Min. TTL' % (self.ttl,))
-			content.append(')')
-		elif self.type == Dns.TYPE_MX:
-			content.append('%s\tMX\t%i\t%s' % (self.key, self.prio, self.value))
-		elif self.type == Dns.TYPE_SRV:
-			content.append('%s\t%i\tIN\t%s\t%i\t%i\t%i\t%s' % (
-				self.key, self.ttl, self.type, self.prio, self.weight, self.port, self.value
-			))
-		else:
-			dnsValue = self.value
-			if self.type == Dns.TYPE_TXT or self.type == Dns.TYPE_SPF:
-				if dnsValue[0] != '"':
-					dnsValue = '"%s"' % (dnsValue,)
-			content.append('%s\tIN\t%s\t%s' % (self.key, self.type, dnsValue))
-
-		return content
-
 	# Call ONLY ON CLIENT SIDE!!!
 	def changeState(self, state):
 		self.state = state
 		self.stateChanged.emit(state)
 
-	# Call ONLY ON SERVER SIDE!!!
-	def setState(self, state):
-		db = MailDatabase.getInstance()
-		cx = db.getCursor()
-		query = ('UPDATE dns SET status = %s WHERE dns_id = %s')
-		cx.execute(query, (state, self.id))
-		db.commit()
-		cx.close()
-
-		self.state = state
-
 	def getValidCombination(self):
 		visibleList = ['key', 'type', 'value', 'ttl']
 		if self.type == Dns.TYPE_A:
@@ -460,55 +246,6 @@ class Dns(QtCore.QObject):
 
 		return d
 
-	@classmethod
-	def getSoaForDomain(dom, domainId):
-		log = logging.getLogger('flscp')
-		db = MailDatabase.getInstance()
-		cx = db.getCursor()
-		query = ('SELECT dns_id, domain_id FROM dns WHERE domain_id = %s AND dns_type = %s LIMIT 1')
-		try:
-			cx.execute(query, (domainId, Dns.TYPE_SOA,))
-			(dns_id, domain_id) = cx.fetchone()
-			dom = Dns(dns_id)
-			dom.load()
-		except Exception:
-			dom = None
-			log.warning('Could not find Dns SOA-Entry.')
-			raise KeyError('Dns-Entry "SOA" could not be found!')
-		finally:
-			cx.close()
-
-		self = dom
-		return self
-
-	@staticmethod
-	def getDnsForDomain(domainId):
-		log = logging.getLogger('flscp')
-		db = MailDatabase.getInstance()
-		cx = db.getCursor()
-		dnsses = []
-		dnsId = []
-		query = ('SELECT dns_id, domain_id FROM dns WHERE domain_id = %s AND dns_type != %s')
-		try:
-			cx.execute(query, (domainId, Dns.TYPE_SOA))
-			for (dns_id, domain_id,) in cx:
-				dnsId.append(dns_id)
-		except Exception as e:
-			dom = None
-			log.warning('Could not find Dns entries for domain [%s] ' % (str(e),))
-		finally:
-			cx.close()
-
-		for dns_id in dnsId:
-			try:
-				dom = Dns(dns_id)
-				if dom.load():
-					dnsses.append(dom)
-			except Exception as e:
-				log.warning('Could not load the dns with dns_id = %s [%s]' % (dns_id, str(e)))
-
-		return dnsses
-
 	@classmethod
 	def fromDict(ma, data):
 		self = ma()
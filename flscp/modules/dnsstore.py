@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import logging
+from database import MailDatabase
+from modules import dns
+from modules.domainstore import Domain
+
+class DNSList(dns.DNSList):
+	"""
+	Server side of modules.dns.DNSList (database access).
+	"""
+
+	def save(self):
+		"""
+		Saves all created, changed and deleted entries with one transaction.
+		Returns False (nothing is saved) if the database refused a change.
+		"""
+		log = logging.getLogger('flscp')
+		creates = [f for f in self._items if f.state == Dns.STATE_CREATE]
+		updates = [f for f in self._items if f.state == Dns.STATE_CHANGE]
+		deletes = [f for f in self._items if f.state == Dns.STATE_DELETE]
+		if len(creates) + len(updates) + len(deletes) <= 0:
+			return True
+
+		for f in creates + updates:
+			state, msg = f.validate()
+			if not state:
+				raise ValueError('No valid Dns Entry!!!')
+
+		# SOA entries are only allowed ONCE per domain!
+		soaDomains = [f.domainId for f in creates if f.type == Dns.TYPE_SOA]
+		if len(soaDomains) != len(set(soaDomains)):
+			raise ValueError('Entry has to be UNIQUE!')
+
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		try:
+			if len(deletes) > 0:
+				cx.executemany('DELETE FROM dns WHERE dns_id = %s', [(f.id,) for f in deletes])
+
+			if len(soaDomains) > 0:
+				cx.execute(
+					'SELECT domain_id FROM dns WHERE dns_type = %%s AND domain_id IN (%s)' %
+					(', '.join(['%s'] * len(soaDomains)),),
+					[Dns.TYPE_SOA] + soaDomains
+				)
+				if len(cx.fetchall()) > 0:
+					raise ValueError('Entry has to be UNIQUE!')
+
+			if len(updates) > 0:
+				cx.executemany(
+					'UPDATE dns SET dns_key = %s, dns_type = %s, dns_prio = %s, dns_value = %s, dns_weight = %s, ' \
+					'dns_port = %s, dns_admin = %s, dns_refresh = %s, dns_retry = %s, dns_expire = %s, dns_ttl = %s, ' \
+					'status = %s WHERE dns_id = %s',
+					[
+						(
+							f.key, f.type, f.prio, f.value, f.weight, f.port, f.dnsAdmin,
+							f.refreshRate, f.retryRate, f.expireTime, f.ttl, Dns.STATE_OK, f.id
+						) for f in updates
+					]
+				)
+
+			if len(creates) > 0:
+				cx.executemany(
+					'INSERT INTO dns (domain_id, dns_key, dns_type, dns_prio, dns_value, dns_weight, dns_port, dns_admin,' \
+					'dns_refresh, dns_retry, dns_expire, dns_ttl, status) ' \
+					'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+					[
+						(
+							f.domainId, f.key, f.type, f.prio, f.value, f.weight, f.port, f.dnsAdmin,
+							f.refreshRate, f.retryRate, f.expireTime, f.ttl, Dns.STATE_OK
+						) for f in creates
+					]
+				)
+
+			db.commit()
+		except ValueError:
+			db.rollback()
+			raise
+		except Exception as e:
+			db.rollback()
+			log.warning('Could not save the dns entries (%s)' % (str(e),))
+			return False
+		finally:
+			cx.close()
+
+		log.debug(
+			'Saved dns entries: %i created, %i changed, %i deleted' % (len(creates), len(updates), len(deletes))
+		)
+		for f in creates + updates:
+			f.state = Dns.STATE_OK
+
+		return True
+
+class Dns(dns.Dns):
+	"""
+	Server side of modules.dns.Dns (database access and bind entries).
+	"""
+
+	def save(self):
+		if self.state == Dns.STATE_CREATE:
+			return self.create()
+		elif self.state == Dns.STATE_CHANGE:
+			return self.update()
+		elif self.state == Dns.STATE_DELETE:
+			return self.delete()
+
+	def create(self):
+		# SOA entries are only allowed ONCE!
+		if self.type == Dns.TYPE_SOA and self.exists():
+			raise ValueError('Entry has to be UNIQUE!')
+
+		# is it a valid domain?
+		state, msg = self.validate()
+		if not state:
+			raise ValueError('No valid data given!')
+
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		self.state = Dns.STATE_CREATE
+		query = (
+			'INSERT INTO dns (domain_id, dns_key, dns_type, dns_prio, dns_value, dns_weight, dns_port, dns_admin,' \
+			'dns_refresh, dns_retry, dns_expire, dns_ttl, status)' \
+			'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'
+		)
+		cx.execute(
+			query, 
+			(
+				self.domainId, self.key, self.type, self.prio, self.value, self.weight, self.port, self.dnsAdmin,
+				self.refreshRate, self.retryRate, self.expireTime, self.ttl, self.state
+			)
+		)
+		db.commit()
+		# now get the dns id
+		dnsId = cx.lastrowid
+		if dnsId is None:
+			cx.close()
+			return False
+		else:
+			self.id = dnsId
+			cx.close()
+
+		# all fine! set the state!
+		self.setState(Dns.STATE_OK)
+
+	def update(self):
+		# is it valid?
+		retCode = True
+		state, msg = self.validate()
+		if not state:
+			raise ValueError('No valid Dns Entry!!!')
+
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = (
+			'UPDATE dns' \
+			'SET dns_key = %s,' \
+			'	dns_type = %s,' \
+			'	dns_prio = %s,' \
+			'	dns_value = %s,' \
+			'	dns_weight = %s,' \
+			'	dns_port = %s,' \
+			'	dns_admin = %s,' \
+			'	dns_refresh = %s,' \
+			'	dns_retry = %s,' \
+			'	dns_expire = %s,' \
+			'	dns_ttl = %s', \
+			'	status = %s' \
+			'WHERE dns_id = %s'
+		)
+		try:
+			cx.execute(
+				query,
+				(
+					self.key, self.type, self.prio, self.value, self.weight, self.port, self.dnsAdmin,
+					self.refreshRate, self.retryRate, self.expireTime, self.ttl, self.state, self.id
+				)
+			)
+		except Exception as e:
+			log = logging.getLogger('flscp')
+			log.warning('Could not save the dns entry %s (%s)' % (self.id, str(e)))
+			retCode = False
+		else:
+			db.commit()
+		finally:
+			cx.close()
+
+		# all fine! set the state!
+		self.setState(Dns.STATE_OK)
+
+		return retCode
+
+	def delete(self):
+		state = True
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = (
+			'DELETE FROM dns WHERE dns_id = %s'
+		)
+		try:
+			cx.execute(query, (self.id,))
+		except:
+			state = False
+		db.commit()
+		cx.close()
+
+		return state
+
+	def exists(self):
+		exists = False
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		# should be only called for SOA-Type
+		query = ('SELECT dns_id FROM dns WHERE dns_type = %s and domain_id = %s')
+		cx.execute(query, (self.type, self.domainId))
+		exists = len(cx.fetchall()) > 0
+		cx.close()
+		return exists
+
+	def load(self):
+		if self.id is None:
+			return False
+
+		state = False
+
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = (
+			'SELECT dns_id, domain_id, dns_key, dns_type, dns_value, dns_prio, dns_weight, dns_port, dns_admin, dns_refresh,' \
+			'dns_retry, dns_expire, dns_ttl, status FROM dns WHERE dns_id = %s LIMIT 1'
+		)
+		try:
+			cx.execute(query, (self.id,))
+			(
+				self.id, 
+				self.domainId,
+				self.key,
+				self.type,
+				self.value,
+				self.prio,
+				self.weight,
+				self.port, 
+				self.dnsAdmin,
+				self.refreshRate,
+				self.retryRate,
+				self.expireTime,
+				self.ttl,
+				self.state
+			) = cx.fetchone()
+
+		except Exception:
+			state = False
+		else:
+			state = True
+		finally:
+			cx.close()
+
+		return state
+
+	def generateDnsEntry(self, dl, serial = None):
+		content = []
+		# get Domain!
+		try:
+			d = dl.findById(self.domainId)
+			if d is None:
+				d = Domain(self.domainId)
+				d.load()
+				dl.add(d)
+		except KeyError:
+			raise
+		else:
+			if d is False or d is None:
+				raise KeyError('Domain for DNS does not exist. Abort!')
+
+		if self.type == Dns.TYPE_SOA:
+			if serial is None:
+				serial = d.serial
+			formattedDnsAdmin = self.dnsAdmin.replace('@', '.')
+			content.append('%s.\tSOA\t%s\t%s. (' % (d.getFullDomain(dl), self.value, formattedDnsAdmin))
+			content.append('\t%i\t; Serial' % (serial,))
+			content.append('\t%ss\t; Refresh' % (self.refreshRate,))
+			content.append('\t%ss\t; Retry' % (self.retryRate,))
+			content.append('\t%ss\t; Expire' % (self.expireTime,))
+			content.append('\t%ss\t; Min. TTL' % (self.ttl,))
+			content.append(')')
+		elif self.type == Dns.TYPE_MX:
+			content.append('%s\tMX\t%i\t%s' % (self.key, self.prio, self.value))
+		elif self.type == Dns.TYPE_SRV:
+			content.append('%s\t%i\tIN\t%s\t%i\t%i\t%i\t%s' % (
+				self.key, self.ttl, self.type, self.prio, self.weight, self.port, self.value
+			))
+		else:
+			dnsValue = self.value
+			if self.type == Dns.TYPE_TXT or self.type == Dns.TYPE_SPF:
+				if dnsValue[0] != '"':
+					dnsValue = '"%s"' % (dnsValue,)
+			content.append('%s\tIN\t%s\t%s' % (self.key, self.type, dnsValue))
+
+		return content
+
+	def setState(self, state):
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = ('UPDATE dns SET status = %s WHERE dns_id = %s')
+		cx.execute(query, (state, self.id))
+		db.commit()
+		cx.close()
+
+		self.state = state
+
+	@classmethod
+	def getSoaForDomain(dom, domainId):
+		log = logging.getLogger('flscp')
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = ('SELECT dns_id, domain_id FROM dns WHERE domain_id = %s AND dns_type = %s LIMIT 1')
+		try:
+			cx.execute(query, (domainId, Dns.TYPE_SOA,))
+			(dns_id, domain_id) = cx.fetchone()
+			dom = Dns(dns_id)
+			dom.load()
+		except Exception:
+			dom = None
+			log.warning('Could not find Dns SOA-Entry.')
+			raise KeyError('Dns-Entry "SOA" could not be found!')
+		finally:
+			cx.close()
+
+		self = dom
+		return self
+
+	@staticmethod
+	def getDnsForDomain(domainId):
+		log = logging.getLogger('flscp')
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		dnsses = []
+		dnsId = []
+		query = ('SELECT dns_id, domain_id FROM dns WHERE domain_id = %s AND dns_type != %s')
+		try:
+			cx.execute(query, (domainId, Dns.TYPE_SOA))
+			for (dns_id, domain_id,) in cx:
+				dnsId.append(dns_id)
+		except Exception as e:
+			dom = None
+			log.warning('Could not find Dns entries for domain [%s] ' % (str(e),))
+		finally:
+			cx.close()
+
+		for dns_id in dnsId:
+			try:
+				dom = Dns(dns_id)
+				if dom.load():
+					dnsses.append(dom)
+			except Exception as e:
+				log.warning('Could not load the dns with dns_id = %s [%s]' % (dns_id, str(e)))
+
+		return dnsses
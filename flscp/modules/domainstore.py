@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import logging
+import time
+import hashlib
+import os
+import os.path
+from database import MailDatabase
+from modules import domain
+
+class DomainList(domain.DomainList):
+	"""
+	Server side of modules.domain.DomainList (database access).
+	"""
+
+	@classmethod
+	def loadAll(dl):
+		self = dl()
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = (
+			'SELECT domain_id, domain_parent, domain_name, ipv6, ipv4, domain_gid, domain_uid, domain_srvpath, ' \
+			'domain_created, domain_last_modified, domain_status FROM domain'
+		)
+		try:
+			cx.execute(query)
+			for (did, parent, domain_name, ipv6, ipv4, gid, uid, srvpath, created, modified, state) in cx:
+				d = Domain(did)
+				d.parent = parent
+				d.name = domain_name
+				d.ipv6 = ipv6
+				d.ipv4 = ipv4
+				d.gid = gid
+				d.uid = uid
+				d.srvpath = srvpath
+				d.created = created
+				d.modified = modified
+				d.state = state
+				self.add(d)
+		finally:
+			cx.close()
+
+		return self
+
+	def save(self, current):
+		"""
+		Saves all created, changed and deleted domains with one transaction.
+		current is the DomainList of the stored domains (see loadAll). No
+		filesystem work is done here (see Domain.provision).
+		"""
+		creates = [f for f in self._items if f.state == Domain.STATE_CREATE]
+		updates = [f for f in self._items if f.state == Domain.STATE_CHANGE]
+		deletes = [f for f in self._items if f.state == Domain.STATE_DELETE]
+		if len(creates) + len(updates) + len(deletes) <= 0:
+			return
+
+		for f in creates + updates:
+			if len(f.name) <= 0:
+				raise ValueError('No valid domain given!')
+		for f in creates:
+			if len([d for d in current if d.name == f.name and d.parent == f.parent]) > 0:
+				raise KeyError('Domain "%s" already exists!' % (f.name,))
+
+		now = time.time()
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		try:
+			if len(deletes) > 0:
+				ids = [(f.id,) for f in deletes]
+				cx.executemany('DELETE FROM dns WHERE domain_id = %s', ids)
+				cx.executemany('DELETE FROM domain WHERE domain_id = %s', ids)
+
+			if len(updates) > 0:
+				cx.executemany(
+					'UPDATE domain SET ipv6 = %s, ipv4 = %s, domain_gid = %s, domain_uid = %s, domain_last_modified = %s, ' \
+					'domain_srvpath = %s, domain_status = %s WHERE domain_id = %s',
+					[(f.ipv6, f.ipv4, f.gid, f.uid, now, f.srvpath, Domain.STATE_OK, f.id) for f in updates]
+				)
+
+			if len(creates) > 0:
+				cx.executemany(
+					'INSERT INTO domain (domain_parent, domain_name, ipv6, ipv4, domain_gid, domain_uid, domain_created, ' \
+					'domain_last_modified, domain_srvpath, domain_status) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+					[
+						(f.parent, f.name, f.ipv6, f.ipv4, f.gid, f.uid, now, now, f.srvpath, Domain.STATE_CREATE)
+						for f in creates
+					]
+				)
+
+			db.commit()
+		except:
+			db.rollback()
+			raise
+		finally:
+			cx.close()
+
+		for f in creates:
+			f.created = now
+			f.modified = now
+		for f in updates:
+			f.modified = now
+			f.state = Domain.STATE_OK
+
+class Domain(domain.Domain):
+	"""
+	Server side of modules.domain.Domain (database access, provisioning and
+	bind files).
+	"""
+
+	def load(self):
+		log = logging.getLogger('flscp')
+		if self.id is None:
+			log.info('Can not load data for a domain with no id!')
+			return False
+
+		state = False
+
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = (
+			'SELECT domain_id, domain_parent, domain_name, ipv6, ipv4, domain_gid, domain_uid, domain_srvpath, ' \
+			'domain_created, domain_last_modified, domain_status FROM domain WHERE domain_id = %s LIMIT 1'
+		)
+		try:
+			cx.execute(query, (self.id,))
+			for (did, parent, domain_name, ipv6, ipv4, gid, uid, srvpath, created, modified, state) in cx:
+				self.id = did
+				self.parent = parent
+				self.name = domain_name
+				self.ipv6 = ipv6
+				self.ipv4 = ipv4
+				self.gid = gid
+				self.uid = uid
+				self.srvpath = srvpath
+				self.created = created
+				self.modified = modified
+				self.state = state
+		except Exception as e:
+			log.warning('Could not load the domain %s because of %s' % (self.id, str(e)))
+			state = False
+		else:
+			state = True
+		finally:
+			cx.close()
+
+		return state
+
+	def getParent(self, domainList = None):
+		if domainList is not None:
+			return domainList.findById(self.parent)
+
+		parent = Domain(self.parent)
+		if not parent.load():
+			log = logging.getLogger('flscp')
+			log.warning('Could not get the parent with did = %s' % (self.parent,))
+			parent = None
+
+		return parent
+
+	def save(self, oldDomain = None):
+		if self.state == Domain.STATE_CREATE:
+			self.create()
+		elif self.state == Domain.STATE_DELETE:
+			self.delete(oldDomain)
+		elif self.state == Domain.STATE_CHANGE:
+			self.update(oldDomain)
+
+	def create(self):
+		# 1. create entry in domain
+		# 2. insert the things in domain file of postfix
+		# 3. hash the domain file
+		# 4. create default dns entries?
+		# 5. generate a bind file
+		# 6. reload bind
+		if self.exists():
+			raise KeyError('Domain "%s" already exists!' % (self.name,))
+
+		# is it a valid domain?
+		if len(self.name) <= 0:
+			raise ValueError('No valid domain given!')
+
+		self.created = time.time()
+		self.modified = time.time()
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		self.state = Domain.STATE_CREATE
+		query = (
+			'INSERT INTO domain (domain_parent, domain_name, ipv6, ipv4, domain_gid, domain_uid, domain_created,' \
+			'domain_last_modified, domain_srvpath, domain_status) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'
+		)
+		cx.execute(
+			query, 
+			(
+				self.parent, self.name, self.ipv6, self.ipv4, self.gid, self.uid, 
+				self.created, self.modified, self.srvpath, self.state
+			)
+		)
+		db.commit()
+
+	def update(self, oldDomain = None):
+		# is it a valid domain?
+		if len(self.name) <= 0:
+			raise ValueError('No valid domain given!')
+
+		self.modified = time.time()
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		self.state = Domain.STATE_OK
+		query = (
+			'UPDATE domain SET ipv6 = %s, ipv4 = %s, domain_gid = %s, domain_uid = %s, domain_last_modified = %s,' \
+			'domain_srvpath = %s, domain_status = %s WHERE domain_id = %s'
+		)
+		cx.execute(
+			query, 
+			(
+				self.ipv6, self.ipv4, self.gid, self.uid, 
+				self.modified, self.srvpath, self.state, self.id
+			)
+		)
+		db.commit()
+
+		self.provision(oldDomain)
+
+	def provision(self, oldDomain = None):
+		# if we have updated, we now have to move the data folder?
+		if oldDomain is not None and oldDomain.srvpath != self.srvpath and len(oldDomain.srvpath) > 0 \
+			and len(self.srvpath) > 0 and os.path.exists(oldDomain.srvpath):
+			parentFolder = self.srvpath
+			if parentFolder == '/':
+				parentFolder = parentFolder[:-1]
+			parentFolderSplit = parentFolder.split('/')
+			parentFolder = '/'.join(parentFolderSplit[:-1])
+			if not os.path.exists(parentFolder):
+				os.makedirs(parentFolder)
+
+			os.rename(oldDomain.srvpath, self.srvpath)
+		elif len(self.srvpath) > 0:
+			if not os.path.exists(self.srvpath):
+				os.makedirs(self.srvpath)
+				os.chmod(self.srvpath, 0o750)
+				os.chown(self.srvpath, self.uid, self.gid)
+
+				# now create the default structure
+				os.makedirs(os.path.join(self.srvpath, 'htdocs'))
+				os.chmod(os.path.join(self.srvpath, 'htdocs'), 0o750)
+				os.chown(os.path.join(self.srvpath, 'htdocs'), self.uid, self.gid)
+
+	def delete(self, oldDomain = None):
+		# delete first all dns entries!
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = (
+			'DELETE FROM dns WHERE domain_id = %s'
+		)
+		cx.execute(query, (self.id,))
+		query = (
+			'DELETE FROM domain WHERE domain_id = %s'
+		)
+		cx.execute(query, (self.id,))
+		db.commit()
+
+	def exists(self):
+		exists = False
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = ('SELECT domain_id FROM domain WHERE domain_name = %s and domain_parent = %s')
+		cx.execute(query, (self.name, self.parent))
+		exists = len(cx.fetchall()) > 0
+		cx.close()
+		return exists
+
+	def generateBindFile(self):
+		# the domain itself is already loaded - the dns entries need no
+		# further query for it.
+		dl = DomainList()
+		dl.add(self)
+		# get soa entry.
+		from modules.dnsstore import Dns
+		soa = Dns.getSoaForDomain(self.id)
+		if soa is None:
+			raise ValueError('Missing SOA-Entry. Cannot generatee Bind-File before!')
+		dnsList = Dns.getDnsForDomain(self.id)
+
+		# the serial is only increased, if anything else of the zone changed.
+		serial = self.nextSerial(self.getZoneHash(dl, soa, dnsList))
+
+		return self.renderBindFile(dl, soa, dnsList, serial)
+
+	def renderBindFile(self, dl, soa, dnsList, serial):
+		content = []
+		content.append('$ORIGIN .')
+		content.append('$TTL %is' % (self.ttl,))
+		content.extend(soa.generateDnsEntry(dl, serial))
+
+		# first add all entries, which have no key!
+		for dns in dnsList:
+			if len(dns.key.strip()) <= 0:
+				content.extend(dns.generateDnsEntry(dl))
+
+		content.append('$ORIGIN %s.' % (self.getFullDomain(dl),))
+		# now the rest
+		for dns in dnsList:
+			if len(dns.key.strip()) > 0:
+				content.extend(dns.generateDnsEntry(dl))
+
+		return '\n'.join(content)
+
+	def getZoneHash(self, dl, soa, dnsList):
+		return hashlib.sha256(self.renderBindFile(dl, soa, dnsList, 0).encode('utf-8')).hexdigest()
+
+	def nextSerial(self, zoneHash):
+		"""
+		Returns the SOA serial for the zone with the given content hash. The
+		serial is increased (at least to YYYYMMDD00) only if the hash differs
+		from the last generated zone.
+		"""
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		try:
+			cx.execute(
+				'SELECT domain_serial, domain_zone_hash FROM domain WHERE domain_id = %s FOR UPDATE',
+				(self.id,)
+			)
+			(serial, lastHash) = cx.fetchone()
+			serial = int(serial)
+			if lastHash != zoneHash:
+				serial = max(serial + 1, int(time.strftime('%Y%m%d00')))
+				cx.execute(
+					'UPDATE domain SET domain_serial = %s, domain_zone_hash = %s WHERE domain_id = %s',
+					(serial, zoneHash, self.id)
+				)
+			db.commit()
+		except:
+			db.rollback()
+			raise
+		finally:
+			cx.close()
+
+		self.serial = serial
+		return serial
+
+	def setState(self, state):
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = ('UPDATE domain SET domain_status = %s WHERE domain_id = %s')
+		cx.execute(query, (state, self.id))
+		db.commit()
+		cx.close()
+
+		self.state = state
+
+	@classmethod
+	def getByName(dom, name):
+		log = logging.getLogger('flscp')
+		db = MailDatabase.getInstance()
+		cx = db.getCursor()
+		query = ('SELECT domain_id, domain_name FROM domain WHERE domain_name = %s')
+		try:
+			cx.execute(query, (name,))
+			(domain_id, domain_name) = cx.fetchone()
+			dom = Domain()
+			dom.id = domain_id
+			dom.name = domain_name
+		except Exception:
+			dom = None
+			log.warning('Could not find domain.')
+			raise KeyError('Domain "%s" could not be found!' % (name,))
+		finally:
+			cx.close()
+
+		self = dom
+		return self
+
+	@classmethod
+	def getById(dom, did):
+		dom = Domain(did)
+		if dom.load():
+			self = dom
+		else:
+			raise KeyError('Domain with this id does not exist!')
+
+		return self
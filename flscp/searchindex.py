@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import threading
+
+# length of the n-grams in the index
+NGRAM = 3
+# the cancel callback is asked after this number of checked documents
+CANCEL_CHECK = 2000
+
+class SearchCancelled(Exception):
+	pass
+
+class SearchIndex:
+	"""
+	Case insensitive substring search over documents with several fields
+	(every field has a list of values). The values are indexed by their
+	n-grams; the candidates of a term are verified against the values.
+
+	Queries are a list of terms separated by spaces, all terms have to
+	match. A term can be bound to a field with "<field>:<term>".
+	"""
+
+	def __init__(self, fields, aliases = None):
+		self.fields = list(fields)
+		self.aliases = aliases if aliases is not None else {}
+		self.lock = threading.Lock()
+		# (field, n-gram) -> set of document ids
+		self.grams = {}
+		# document id -> {field: [lower case values]}
+		self.docs = {}
+
+	def getGrams(self, value):
+		return set(value[i:i + NGRAM] for i in range(len(value) - NGRAM + 1))
+
+	def add(self, docId, doc):
+		"""
+		Adds the document or replaces the document with the same id.
+		"""
+		values = {}
+		for field in self.fields:
+			values[field] = [str(f).lower() for f in doc.get(field, []) if f is not None and len(str(f)) > 0]
+
+		with self.lock:
+			self.__remove(docId)
+			self.docs[docId] = values
+			for (field, fieldValues) in values.items():
+				for value in fieldValues:
+					for gram in self.getGrams(value):
+						self.grams.setdefault((field, gram), set()).add(docId)
+
+	def remove(self, docId):
+		with self.lock:
+			self.__remove(docId)
+
+	def __remove(self, docId):
+		values = self.docs.pop(docId, None)
+		if values is None:
+			return
+
+		for (field, fieldValues) in values.items():
+			for value in fieldValues:
+				for gram in self.getGrams(value):
+					ids = self.grams.get((field, gram))
+					if ids is not None:
+						ids.discard(docId)
+						if len(ids) <= 0:
+							del(self.grams[(field, gram)])
+
+	def __len__(self):
+		return len(self.docs)
+
+	def parse(self, query):
+		"""
+		Returns the terms of the query as list of (field or None, term).
+		"""
+		terms = []
+		for token in query.lower().split():
+			field = None
+			if ':' in token:
+				(name, term) = token.split(':', 1)
+				name = self.aliases.get(name, name)
+				if name in self.fields:
+					field = name
+					token = term
+			if len(token) > 0:
+				terms.append((field, token))
+
+		return terms
+
+	def search(self, query, isCancelled = None):
+		"""
+		Returns the set of matching document ids or None for an empty query.
+		Raises SearchCancelled if isCancelled() returns True meanwhile.
+		"""
+		terms = self.parse(query)
+		if len(terms) <= 0:
+			return None
+
+		result = None
+		# rare terms first: the candidates get small fast.
+		for (field, term) in sorted(terms, key=lambda t: -len(t[1])):
+			matches = set()
+			for name in ([field] if field is not None else self.fields):
+				matches.update(self.__searchField(name, term, result, isCancelled))
+			result = matches if result is None else result & matches
+			if len(result) <= 0:
+				break
+
+		return result
+
+	def __searchField(self, field, term, limit, isCancelled):
+		# only the candidates are taken under the lock, they are checked
+		# without it (add and remove replace the value lists, but never
+		# change them).
+		with self.lock:
+			candidates = self.__getCandidates(field, term, limit)
+
+		matches = set()
+		for (nr, (docId, values)) in enumerate(candidates):
+			if isCancelled is not None and nr % CANCEL_CHECK == 0 and isCancelled():
+				raise SearchCancelled()
+			if any(term in value for value in values):
+				matches.add(docId)
+
+		return matches
+
+	def __getCandidates(self, field, term, limit):
+		if len(term) >= NGRAM:
+			candidates = None
+			for gram in sorted(self.getGrams(term), key=lambda g: len(self.grams.get((field, g), ()))):
+				ids = self.grams.get((field, gram))
+				if ids is None:
+					return []
+				candidates = set(ids) if candidates is None else candidates & ids
+				if len(candidates) <= 0:
+					return []
+		else:
+			candidates = self.docs.keys()
+
+		return [(f, self.docs[f][field]) for f in candidates if limit is None or f in limit]
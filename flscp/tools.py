@@ -24,3 +24,19 @@ def hashPostFile(postFile, postMap):
 			state = False
 
 	return state
+
+def runCommand(cmdLine):
+	log = logging.getLogger('flscp')
+
+	state = True
+	cmd = shlex.split(cmdLine)
+	with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as p:
+		out = p.stdout.read()
+		err = p.stderr.read()
+		if len(out) > 0:
+			log.info(out)
+		if len(err) > 0:
+			log.warning(err)
+			state = False
+
+	return state
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import os, os.path
+import io
+import zipfile
+import hashlib
+import logging
+import time
+import threading
+
+# size of one chunk of the update sent to the client
+CHUNK_SIZE = 512 * 1024
+CHUNK_MAX = 4 * 1024 * 1024
+# the tree is checked for changes at most every x seconds
+REFRESH_CHECK = 5
+
+class UpdateBundle:
+	"""
+	The zipped client which is sent for updates. It is only built again
+	if any file of the tree changed (path, size or mtime); the tree is
+	checked at most every REFRESH_CHECK seconds. The previous bundle is
+	kept for downloads which started before it was replaced.
+	"""
+	__instance = None
+
+	def __init__(self):
+		UpdateBundle.__instance = self
+		self.log = logging.getLogger('flscp')
+		self.lock = threading.Lock()
+		self.signature = None
+		self.data = b''
+		self.hash = ''
+		self.checked = 0
+		# (hash, data) of the replaced bundle
+		self.previous = (None, b'')
+
+	@staticmethod
+	def getInstance():
+		if UpdateBundle.__instance is None:
+			UpdateBundle()
+
+		return UpdateBundle.__instance
+
+	def getBase(self):
+		# check if we have build directory or not
+		if os.path.exists('build' + os.sep):
+			return 'build' + os.sep
+		else:
+			return ''
+
+	def listFiles(self, fdir):
+		files = []
+		for f in sorted(os.listdir(fdir if len(fdir) > 0 else '.')):
+			p = os.path.join(fdir, f)
+			if os.path.isdir(p):
+				if f not in ['.', '..', 'certs']:
+					files.extend(self.listFiles(p))
+			else:
+				files.append(p)
+
+		return files
+
+	def getSignature(self, files):
+		sig = hashlib.sha1()
+		for p in files:
+			st = os.stat(p)
+			sig.update(('%s\0%i\0%i\n' % (p, st.st_size, st.st_mtime)).encode('utf-8'))
+
+		return sig.hexdigest()
+
+	def refresh(self, force = False):
+		now = time.time()
+		with self.lock:
+			if not force and self.signature is not None and now - self.checked < REFRESH_CHECK:
+				return
+			self.checked = now
+
+		files = self.listFiles(self.getBase())
+		signature = self.getSignature(files)
+		with self.lock:
+			if signature == self.signature:
+				return
+
+			buf = io.BytesIO()
+			with zipfile.ZipFile(buf, 'w') as verzip:
+				for p in files:
+					arcname = p.replace('build' + os.sep + 'flscp' + os.sep, '')
+					if p.endswith('.ini'):
+						arcname = arcname + '.example'
+					verzip.write(p, arcname)
+
+			if self.signature is not None:
+				self.previous = (self.hash, self.data)
+			self.data = buf.getvalue()
+			self.hash = hashlib.sha256(self.data).hexdigest()
+			self.signature = signature
+			self.log.info('Built new update bundle %s (%i bytes)' % (self.hash, len(self.data)))
+
+	def getInfo(self):
+		self.refresh()
+		with self.lock:
+			return {'hash': self.hash, 'size': len(self.data)}
+
+	def getData(self):
+		self.refresh()
+		with self.lock:
+			return self.data
+
+	def getChunk(self, bundleHash, offset, length = CHUNK_SIZE):
+		"""
+		Returns a part of the bundle with the given hash (the current or the
+		previous one). None is returned for older bundles, the client has to
+		restart then.
+		"""
+		length = max(1, min(int(length), CHUNK_MAX))
+		with self.lock:
+			if bundleHash == self.hash:
+				data = self.data
+			elif bundleHash == self.previous[0]:
+				data = self.previous[1]
+			else:
+				return None
+			return data[offset:offset + length]
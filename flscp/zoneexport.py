@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: fenc=utf-8:ts=8:sw=8:si:sta:noet
+import os, os.path
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from database import MailDatabase
+from modules.domainstore import Domain, DomainList
+from modules.dnsstore import Dns
+import bindconfig
+
+# number of threads writing the zone files
+WORKERS = 4
+
+def loadZones():
+	"""
+	Loads all domains with their dns entries with one query. Returns the
+	DomainList and a dict domain id -> list of Dns.
+	"""
+	dl = DomainList()
+	dnsByDomain = {}
+	db = MailDatabase.getInstance()
+	cx = db.getCursor()
+	query = (
+		'SELECT d.domain_id, d.domain_parent, d.domain_name, d.ipv6, d.ipv4, d.domain_gid, d.domain_uid, ' \
+		'd.domain_srvpath, d.domain_created, d.domain_last_modified, d.domain_status, d.domain_serial, ' \
+		'd.domain_zone_hash, n.dns_id, n.dns_key, n.dns_type, n.dns_value, n.dns_prio, n.dns_weight, n.dns_port, ' \
+		'n.dns_admin, n.dns_refresh, n.dns_retry, n.dns_expire, n.dns_ttl, n.status ' \
+		'FROM domain d LEFT JOIN dns n ON n.domain_id = d.domain_id ORDER BY d.domain_id, n.dns_id FOR UPDATE'
+	)
+	try:
+		cx.execute(query)
+		dom = None
+		for row in cx:
+			if dom is None or dom.id != row[0]:
+				dom = Domain(row[0])
+				(
+					dom.id, dom.parent, dom.name, dom.ipv6, dom.ipv4, dom.gid, dom.uid, dom.srvpath,
+					dom.created, dom.modified, dom.state, dom.serial, dom.zoneHash
+				) = row[:13]
+				dl.add(dom)
+				dnsByDomain[dom.id] = []
+
+			if row[13] is None:
+				continue
+
+			dns = Dns(row[13])
+			dns.domainId = dom.id
+			(
+				dns.key, dns.type, dns.value, dns.prio, dns.weight, dns.port, dns.dnsAdmin,
+				dns.refreshRate, dns.retryRate, dns.expireTime, dns.ttl, dns.state
+			) = row[14:]
+			dnsByDomain[dom.id].append(dns)
+	finally:
+		cx.close()
+
+	return (dl, dnsByDomain)
+
+def exportZones(cacheDir, zoneConfig = None, check = False, workers = WORKERS):
+	"""
+	Renders the zone files of all domains and writes the changed ones into
+	cacheDir. Returns a report with the timing of every zone (in seconds).
+	"""
+	log = logging.getLogger('flscp')
+	start = time.time()
+	report = {'zones': [], 'written': 0, 'errors': 0}
+
+	db = MailDatabase.getInstance()
+	try:
+		(dl, dnsByDomain) = loadZones()
+		report['load'] = time.time() - start
+
+		serials = []
+		rendered = []
+		for dom in dl:
+			renderStart = time.time()
+			fqdn = dom.getFullDomain(dl)
+			entry = {
+				'zone': fqdn, 'file': os.path.join(cacheDir, '%s.db' % (fqdn,)), 'serial': 0,
+				'written': False, 'errors': [], 'render': 0.0, 'check': 0.0, 'write': 0.0
+			}
+			report['zones'].append(entry)
+
+			soa = [f for f in dnsByDomain[dom.id] if f.type == Dns.TYPE_SOA]
+			if len(soa) <= 0:
+				entry['errors'].append('missing SOA-Entry')
+				continue
+			dnsList = [f for f in dnsByDomain[dom.id] if f.type != Dns.TYPE_SOA]
+
+			zoneHash = dom.getZoneHash(dl, soa[0], dnsList)
+			serial = int(dom.serial)
+			if zoneHash != dom.zoneHash:
+				serial = max(serial + 1, int(time.strftime('%Y%m%d00')))
+			entry['serial'] = serial
+			content = dom.renderBindFile(dl, soa[0], dnsList, serial)
+			entry['render'] = time.time() - renderStart
+
+			if check:
+				checkStart = time.time()
+				entry['errors'].extend(bindconfig.checkZone(content, fqdn))
+				entry['check'] = time.time() - checkStart
+				if len(entry['errors']) > 0:
+					continue
+
+			# only zones which are written get the new serial.
+			if zoneHash != dom.zoneHash:
+				dom.serial = serial
+				serials.append((serial, zoneHash, dom.id))
+			rendered.append((entry, content))
+
+		if len(serials) > 0:
+			cx = db.getCursor()
+			try:
+				cx.executemany(
+					'UPDATE domain SET domain_serial = %s, domain_zone_hash = %s WHERE domain_id = %s',
+					serials
+				)
+			finally:
+				cx.close()
+		db.commit()
+	except:
+		db.rollback()
+		raise
+
+	def write(item):
+		(entry, content) = item
+		writeStart = time.time()
+		try:
+			entry['written'] = bindconfig.ZoneFiles.getInstance().write(entry['file'], content)
+		except OSError as e:
+			entry['errors'].append('could not write %s (%s)' % (entry['file'], e))
+		entry['write'] = time.time() - writeStart
+
+	with ThreadPoolExecutor(max_workers = max(1, workers)) as executor:
+		list(executor.map(write, rendered))
+
+	changed = []
+	zoneChanges = zoneConfig.begin() if zoneConfig is not None else None
+	for entry in report['zones']:
+		if len(entry['errors']) > 0:
+			report['errors'] += 1
+			log.warning('Zone %s: %s' % (entry['zone'], '; '.join(entry['errors'])))
+			continue
+
+		if zoneChanges is not None and entry['zone'] not in zoneChanges:
+			zoneChanges.add(entry['zone'], entry['file'])
+		if entry['written']:
+			report['written'] += 1
+			changed.append(entry['zone'])
+
+	reconfig = False
+	if zoneChanges is not None:
+		reconfig = zoneChanges.hasChanges()
+		zoneChanges.save()
+	reloader = bindconfig.DnsReloader.getInstance()
+	if reloader is not None and (len(changed) > 0 or reconfig):
+		reloader.schedule(changed, reconfig)
+
+	report['total'] = time.time() - start
+	log.info(
+		'Exported %i zones (%i written, %i with errors) in %.3fs' %
+		(len(report['zones']), report['written'], report['errors'], report['total'])
+	)
+
+	return report
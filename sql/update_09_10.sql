@@ -0,0 +1,103 @@
+--
+-- Table structure for table `domain`
+--
+ALTER TABLE `domain` 
+	ADD COLUMN `domain_serial` int(10) unsigned NOT NULL DEFAULT '0', 
+	ADD COLUMN `domain_zone_hash` varchar(64) CHARACTER SET utf8 NOT NULL DEFAULT '' AFTER `domain_last_modified`;
+
+
+--
+-- Change tracking for the delta sync of the client: every change of
+-- mail_users, domain and dns gets the next value of the global revision,
+-- deleted rows are kept in deleted_rows.
+--
+CREATE TABLE `revision` (
+  `revision_name` varchar(20) CHARACTER SET utf8 NOT NULL,
+  `revision_value` bigint(20) unsigned NOT NULL DEFAULT '0',
+  PRIMARY KEY (`revision_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
+
+INSERT INTO `revision` (`revision_name`, `revision_value`) VALUES ('global', 0);
+
+CREATE TABLE `deleted_rows` (
+  `table_name` varchar(20) CHARACTER SET utf8 NOT NULL,
+  `row_id` int(10) unsigned NOT NULL,
+  `domain_id` int(10) unsigned DEFAULT NULL,
+  `revision` bigint(20) unsigned NOT NULL,
+  KEY `table_revision` (`table_name`, `revision`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
+
+ALTER TABLE `mail_users` 
+	ADD COLUMN `revision` bigint(20) unsigned NOT NULL DEFAULT '0',
+	ADD KEY `revision` (`revision`);
+
+ALTER TABLE `domain` 
+	ADD COLUMN `revision` bigint(20) unsigned NOT NULL DEFAULT '0',
+	ADD KEY `revision` (`revision`);
+
+ALTER TABLE `dns` 
+	ADD COLUMN `revision` bigint(20) unsigned NOT NULL DEFAULT '0',
+	ADD KEY `domain_revision` (`domain_id`, `revision`);
+
+DELIMITER ;;
+CREATE TRIGGER `mail_users_insert_revision` BEFORE INSERT ON `mail_users` FOR EACH ROW BEGIN
+	UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+	SET NEW.`revision` = (SELECT `revision_value` FROM `revision` WHERE `revision_name` = 'global');
+END ;;
+CREATE TRIGGER `mail_users_update_revision` BEFORE UPDATE ON `mail_users` FOR EACH ROW BEGIN
+	UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+	SET NEW.`revision` = (SELECT `revision_value` FROM `revision` WHERE `revision_name` = 'global');
+END ;;
+CREATE TRIGGER `mail_users_delete_revision` AFTER DELETE ON `mail_users` FOR EACH ROW BEGIN
+	UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+	INSERT INTO `deleted_rows` (`table_name`, `row_id`, `domain_id`, `revision`) 
+		SELECT 'mail_users', OLD.`mail_id`, OLD.`domain_id`, `revision_value` FROM `revision` WHERE `revision_name` = 'global';
+END ;;
+CREATE TRIGGER `domain_insert_revision` BEFORE INSERT ON `domain` FOR EACH ROW BEGIN
+	UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+	SET NEW.`revision` = (SELECT `revision_value` FROM `revision` WHERE `revision_name` = 'global');
+END ;;
+CREATE TRIGGER `domain_update_revision` BEFORE UPDATE ON `domain` FOR EACH ROW BEGIN
+	-- serial and zone hash are changed by every zone rendering, the
+	-- clients do not need them.
+	IF NOT (NEW.`domain_parent` <=> OLD.`domain_parent` AND NEW.`domain_name` <=> OLD.`domain_name`
+			AND NEW.`ipv6` <=> OLD.`ipv6` AND NEW.`ipv4` <=> OLD.`ipv4`
+			AND NEW.`domain_gid` <=> OLD.`domain_gid` AND NEW.`domain_uid` <=> OLD.`domain_uid`
+			AND NEW.`domain_srvpath` <=> OLD.`domain_srvpath` AND NEW.`domain_created` <=> OLD.`domain_created`
+			AND NEW.`domain_last_modified` <=> OLD.`domain_last_modified` AND NEW.`domain_status` <=> OLD.`domain_status`) THEN
+		UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+		SET NEW.`revision` = (SELECT `revision_value` FROM `revision` WHERE `revision_name` = 'global');
+	END IF;
+END ;;
+CREATE TRIGGER `domain_delete_revision` AFTER DELETE ON `domain` FOR EACH ROW BEGIN
+	UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+	INSERT INTO `deleted_rows` (`table_name`, `row_id`, `domain_id`, `revision`) 
+		SELECT 'domain', OLD.`domain_id`, OLD.`domain_id`, `revision_value` FROM `revision` WHERE `revision_name` = 'global';
+END ;;
+CREATE TRIGGER `dns_insert_revision` BEFORE INSERT ON `dns` FOR EACH ROW BEGIN
+	UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+	SET NEW.`revision` = (SELECT `revision_value` FROM `revision` WHERE `revision_name` = 'global');
+END ;;
+CREATE TRIGGER `dns_update_revision` BEFORE UPDATE ON `dns` FOR EACH ROW BEGIN
+	UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+	SET NEW.`revision` = (SELECT `revision_value` FROM `revision` WHERE `revision_name` = 'global');
+END ;;
+CREATE TRIGGER `dns_delete_revision` AFTER DELETE ON `dns` FOR EACH ROW BEGIN
+	UPDATE `revision` SET `revision_value` = `revision_value` + 1 WHERE `revision_name` = 'global';
+	INSERT INTO `deleted_rows` (`table_name`, `row_id`, `domain_id`, `revision`) 
+		SELECT 'dns', OLD.`dns_id`, OLD.`domain_id`, `revision_value` FROM `revision` WHERE `revision_name` = 'global';
+END ;;
+-- the quota usage (written by dovecot) is sent with the mail: a change
+-- gives the mail a new revision (through mail_users_update_revision).
+CREATE TRIGGER `quota_dovecot_insert_revision` AFTER INSERT ON `quota_dovecot` FOR EACH ROW BEGIN
+	UPDATE `mail_users` SET `revision` = 0 WHERE `mail_addr` = NEW.`username`;
+END ;;
+CREATE TRIGGER `quota_dovecot_update_revision` AFTER UPDATE ON `quota_dovecot` FOR EACH ROW BEGIN
+	IF NOT (NEW.`bytes` <=> OLD.`bytes`) OR NOT (NEW.`username` <=> OLD.`username`) THEN
+		UPDATE `mail_users` SET `revision` = 0 WHERE `mail_addr` IN (NEW.`username`, OLD.`username`);
+	END IF;
+END ;;
+CREATE TRIGGER `quota_dovecot_delete_revision` AFTER DELETE ON `quota_dovecot` FOR EACH ROW BEGIN
+	UPDATE `mail_users` SET `revision` = 0 WHERE `mail_addr` = OLD.`username`;
+END ;;
+DELIMITER ;